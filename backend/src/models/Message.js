@@ -8,6 +8,13 @@ const messageSchema = new mongoose.Schema({
   delivered: { type: Boolean, default: false },
   read: { type: Boolean, default: false },
   sent_at: { type: Date, default: Date.now },
+  // message_id сообщения участника в Telegram — ключ идемпотентности для повторов из бота
+  telegram_message_id: { type: Number, default: null },
 }, { timestamps: true });
 
+messageSchema.index(
+  { target_telegram_id: 1, telegram_message_id: 1 },
+  { unique: true, partialFilterExpression: { telegram_message_id: { $type: 'number' } } }
+);
+
 module.exports = mongoose.model('Message', messageSchema);
@@ -5,6 +5,8 @@ const photoReportSchema = new mongoose.Schema({
   user_id: { type: mongoose.Schema.Types.ObjectId, ref: 'User', required: true },
   clue_index: { type: Number, required: true },
   telegram_file_id: { type: String, required: true },
+  // message_id фото в Telegram — ключ идемпотентности: повтор из очереди бота не создаёт второй отчёт
+  telegram_message_id: { type: Number, default: null },
   status: { type: String, enum: ['pending', 'approved', 'rejected'], default: 'pending' },
   admin_comment: { type: String, default: '' },
   submitted_at: { type: Date, default: Date.now },
@@ -12,5 +14,9 @@ const photoReportSchema = new mongoose.Schema({
 }, { timestamps: true });
 
 photoReportSchema.index({ team_id: 1, status: 1 });
+photoReportSchema.index(
+  { user_id: 1, telegram_message_id: 1 },
+  { unique: true, partialFilterExpression: { telegram_message_id: { $type: 'number' } } }
+);
 
 module.exports = mongoose.model('PhotoReport', photoReportSchema);
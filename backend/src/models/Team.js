@@ -5,6 +5,8 @@ const teamSchema = new mongoose.Schema({
   color: { type: String, default: '#3B82F6' },
   members: [{ type: mongoose.Schema.Types.ObjectId, ref: 'User' }],
   current_clue_index: { type: Number, default: 0 },
+  // Когда команда прошла последнюю станцию (null — ещё в пути)
+  finished_at: { type: Date, default: null },
 }, { timestamps: true });
 
 module.exports = mongoose.model('Team', teamSchema);
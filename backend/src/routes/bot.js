@@ -1,4 +1,5 @@
 const express = require('express');
+const mongoose = require('mongoose');
 const { User, PhotoReport, Team, Quest, Song, Voting, Vote } = require('../models');
 const config = require('../config');
 const spotify = require('../services/spotify');
@@ -10,6 +11,18 @@ function isValidLatLng(lat, lng) {
   return lat >= -90 && lat <= 90 && lng >= -180 && lng <= 180;
 }
 
+function normalizeAnswer(answer) {
+  return String(answer).trim().toLowerCase();
+}
+
+// Все допустимые варианты ответа (разбиваем каждый элемент по запятой на случай если ответы слиплись в одну строку)
+function normalizeClueAnswers(clue) {
+  return (clue.answers || [])
+    .flatMap((a) => a.split(','))
+    .map(normalizeAnswer)
+    .filter(Boolean);
+}
+
 // POST /api/bot/register — регистрация участника из бота
 router.post('/register', async (req, res) => {
   try {
@@ -37,47 +50,146 @@ router.post('/register', async (req, res) => {
   }
 });
 
+// Участник, его команда и текущая станция для фото-отчёта; при ошибке — { status, error }
+async function resolvePhotoTarget(telegram_id) {
+  const user = await User.findOne({ telegram_id });
+  if (!user) return { status: 404, error: 'Участник не найден' };
+  if (!user.team_id) return { status: 400, error: 'Участник не в команде' };
+
+  const team = await Team.findById(user.team_id);
+  if (!team) return { status: 404, error: 'Команда не найдена' };
+
+  const activeQuest = await Quest.findOne({ status: 'active' }).select('clues').sort({ updatedAt: -1 });
+  if (!activeQuest || !activeQuest.clues?.length) {
+    return { status: 400, error: 'Активный квест не найден' };
+  }
+
+  return { user, team };
+}
+
+// Станция, к которой относится фото: бот присылает номер станции на момент отправки —
+// отложенное и повторённое позже фото не должно попасть на следующую станцию
+function photoClueIndex(team, clue_index) {
+  const index = Number(clue_index);
+  if (Number.isInteger(index) && index >= 0 && index <= team.current_clue_index) return index;
+  return team.current_clue_index;
+}
+
+function isMessageId(value) {
+  return Number.isInteger(value) && value > 0;
+}
+
+// Создать документ, если записи с этим ключом ещё нет; повтор возвращает уже созданную
+async function upsertOnce(Model, key, doc) {
+  const result = await Model.findOneAndUpdate(key, { $setOnInsert: doc }, {
+    upsert: true, new: true, setDefaultsOnInsert: true, includeResultMetadata: true,
+  });
+  return { doc: result.value, created: !result.lastErrorObject?.updatedExisting };
+}
+
 // POST /api/bot/photo — фото-отчёт из бота
 router.post('/photo', async (req, res) => {
   try {
-    const { telegram_id, file_id } = req.body;
+    const { telegram_id, file_id, message_id, clue_index } = req.body;
     if (!telegram_id || !file_id) {
       return res.status(400).json({ error: 'telegram_id и file_id обязательны' });
     }
 
-    const user = await User.findOne({ telegram_id });
-    if (!user) return res.status(404).json({ error: 'Участник не найден' });
-    if (!user.team_id) return res.status(400).json({ error: 'Участник не в команде' });
-
-    const team = await Team.findById(user.team_id);
-    if (!team) return res.status(404).json({ error: 'Команда не найдена' });
-
-    const activeQuest = await Quest.findOne({ status: 'active' }).select('clues').sort({ updatedAt: -1 });
-    if (!activeQuest || !activeQuest.clues?.length) {
-      return res.status(400).json({ error: 'Активный квест не найден' });
-    }
+    const target = await resolvePhotoTarget(telegram_id);
+    if (target.error) return res.status(target.status).json({ error: target.error });
+    const { user, team } = target;
 
-    const report = await PhotoReport.create({
+    const doc = {
       team_id: team._id,
       user_id: user._id,
-      clue_index: team.current_clue_index,
+      clue_index: photoClueIndex(team, clue_index),
       telegram_file_id: file_id,
-    });
+    };
+    let report = null;
+    let created = true;
+    if (isMessageId(message_id)) {
+      ({ doc: report, created } = await upsertOnce(
+        PhotoReport, { user_id: user._id, telegram_message_id: message_id }, doc
+      ));
+    } else {
+      report = await PhotoReport.create(doc);
+    }
 
     const populated = await PhotoReport.findById(report._id)
       .populate('team_id', 'name color')
       .populate('user_id', 'telegram_id telegram_username first_name');
 
+    // Повтор уже принятого фото организатору второй раз не показываем
     const io = req.app.get('io');
-    if (io) io.emit('new_photo', populated);
+    if (io && created) io.emit('new_photo', populated);
 
-    res.status(201).json(populated);
+    res.status(created ? 201 : 200).json(populated);
   } catch (err) {
     console.error('Bot photo error:', err);
     res.status(500).json({ error: 'Ошибка сервера' });
   }
 });
 
+// POST /api/bot/photo/batch — альбом фото одним отчётом
+router.post('/photo/batch', async (req, res) => {
+  try {
+    const { telegram_id, file_ids, message_ids, clue_index } = req.body;
+    if (!telegram_id || !Array.isArray(file_ids) || file_ids.length === 0) {
+      return res.status(400).json({ error: 'telegram_id и file_ids обязательны' });
+    }
+    const keyed = Array.isArray(message_ids) && message_ids.length === file_ids.length
+      && message_ids.every(isMessageId);
+
+    const target = await resolvePhotoTarget(telegram_id);
+    if (target.error) return res.status(target.status).json({ error: target.error });
+    const { user, team } = target;
+
+    const base = {
+      team_id: team._id,
+      user_id: user._id,
+      clue_index: photoClueIndex(team, clue_index),
+    };
+    let ids;
+    if (keyed) {
+      // Каждое фото альбома — отдельное сообщение со своим message_id: повтор альбома
+      // создаёт только те отчёты, которых ещё нет
+      const seen = new Set();
+      const items = file_ids
+        .map((file_id, i) => ({ file_id, message_id: message_ids[i] }))
+        .filter(({ message_id }) => !seen.has(message_id) && seen.add(message_id));
+      const result = await PhotoReport.bulkWrite(items.map(({ file_id, message_id }) => ({
+        updateOne: {
+          filter: { user_id: user._id, telegram_message_id: message_id },
+          update: { $setOnInsert: { ...base, telegram_file_id: file_id } },
+          upsert: true,
+        },
+      })), { ordered: false });
+      ids = Object.values(result.upsertedIds || {});
+    } else {
+      const created = await PhotoReport.insertMany([...new Set(file_ids)].map((file_id) => ({
+        ...base,
+        telegram_file_id: file_id,
+      })));
+      ids = created.map((r) => r._id);
+    }
+
+    const populated = await PhotoReport.find({ _id: { $in: ids } })
+      .sort({ _id: 1 })
+      .populate('team_id', 'name color')
+      .populate('user_id', 'telegram_id telegram_username first_name');
+
+    const io = req.app.get('io');
+    if (io) {
+      for (const report of populated) io.emit('new_photo', report);
+    }
+
+    res.status(201).json({ reports: populated, count: populated.length });
+  } catch (err) {
+    console.error('Bot photo batch error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
 // POST /api/bot/location — обновление геопозиции
 router.post('/location', async (req, res) => {
   try {
@@ -114,26 +226,97 @@ router.post('/location', async (req, res) => {
   }
 });
 
+// POST /api/bot/locations — пачка геопозиций от агрегатора live-location
+router.post('/locations', async (req, res) => {
+  try {
+    const { locations } = req.body;
+    if (!Array.isArray(locations)) {
+      return res.status(400).json({ error: 'locations должен быть массивом' });
+    }
+
+    // Последняя точка на каждого участника, невалидные отбрасываем
+    const latest = new Map();
+    for (const loc of locations) {
+      const lat = Number(loc?.lat);
+      const lng = Number(loc?.lng);
+      if (!loc?.telegram_id || !isValidLatLng(lat, lng)) continue;
+      const at = loc.at ? new Date(loc.at) : new Date();
+      latest.set(Number(loc.telegram_id), {
+        lat,
+        lng,
+        updated_at: Number.isNaN(at.getTime()) ? new Date() : at,
+      });
+    }
+
+    if (latest.size === 0) return res.json({ ok: true, updated: 0 });
+
+    // Точки из очереди бота могут прийти позже более свежих — старыми не затираем
+    const ops = [...latest].map(([telegram_id, location]) => ({
+      updateOne: {
+        filter: {
+          telegram_id,
+          $or: [
+            { 'last_location.updated_at': { $exists: false } },
+            { 'last_location.updated_at': { $lte: location.updated_at } },
+          ],
+        },
+        update: { last_location: location },
+      },
+    }));
+    await User.bulkWrite(ops, { ordered: false });
+
+    const users = await User.find({ telegram_id: { $in: [...latest.keys()] } })
+      .select('telegram_id first_name team_id last_location');
+
+    const io = req.app.get('io');
+    if (io) {
+      for (const user of users) {
+        io.emit('location_update', {
+          user_id: user._id,
+          telegram_id: user.telegram_id,
+          first_name: user.first_name,
+          team_id: user.team_id,
+          location: user.last_location,
+        });
+      }
+    }
+
+    res.json({ ok: true, updated: users.length });
+  } catch (err) {
+    console.error('Bot locations error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
 // POST /api/bot/message — сообщение от участника
 router.post('/message', async (req, res) => {
   try {
-    const { telegram_id, text } = req.body;
+    const { telegram_id, text, message_id } = req.body;
     const user = await User.findOne({ telegram_id });
     if (!user) return res.status(404).json({ error: 'Участник не найден' });
 
     const { Message } = require('../models');
-    const msg = await Message.create({
+    const doc = {
       target_user_id: user._id,
       target_telegram_id: telegram_id,
       text,
       from_admin: false,
       delivered: true,
-    });
+    };
+    let msg;
+    let created = true;
+    if (isMessageId(message_id)) {
+      ({ doc: msg, created } = await upsertOnce(
+        Message, { target_telegram_id: telegram_id, telegram_message_id: message_id }, doc
+      ));
+    } else {
+      msg = await Message.create(doc);
+    }
 
     const io = req.app.get('io');
-    if (io) io.emit('new_message', { ...msg.toObject(), user });
+    if (io && created) io.emit('new_message', { ...msg.toObject(), user });
 
-    res.status(201).json(msg);
+    res.status(created ? 201 : 200).json(msg);
   } catch (err) {
     console.error('Bot message error:', err);
     res.status(500).json({ error: 'Ошибка сервера' });
@@ -165,14 +348,10 @@ router.post('/check-answer', async (req, res) => {
       return res.json({ matched: false });
     }
 
-    // Собираем все допустимые варианты (разбиваем каждый элемент по запятой на случай если ответы слиплись в одну строку)
-    const validAnswers = clue.answers
-      .flatMap((a) => a.split(','))
-      .map((a) => a.trim().toLowerCase())
-      .filter(Boolean);
+    const validAnswers = normalizeClueAnswers(clue);
 
     // Проверка ответа (регистронезависимо, пробелы убираем)
-    const normalized = answer.trim().toLowerCase();
+    const normalized = normalizeAnswer(answer);
     const isCorrect = validAnswers.includes(normalized);
 
     if (!isCorrect) {
@@ -197,6 +376,8 @@ router.post('/check-answer', async (req, res) => {
       return res.json({ matched: true, correct: true, next_index: nextIndex });
     } else {
       // Квест завершён
+      team.finished_at = new Date();
+      await team.save();
       for (const member of team.members) {
         try {
           await telegram.sendMessage(member.telegram_id, '🎉 <b>Поздравляем! Вы прошли все станции квеста!</b>');
@@ -213,20 +394,134 @@ router.post('/check-answer', async (req, res) => {
   }
 });
 
+// GET /api/bot/answers — допустимые ответы текущей станции команды (для локальной проверки в боте)
+router.get('/answers', async (req, res) => {
+  try {
+    const { telegram_id } = req.query;
+    if (!telegram_id) return res.status(400).json({ error: 'telegram_id обязателен' });
+
+    const user = await User.findOne({ telegram_id: Number(telegram_id) }).select('team_id');
+    if (!user || !user.team_id) return res.json({ team_id: null, answers: [] });
+
+    const team = await Team.findById(user.team_id).select('current_clue_index');
+    if (!team) return res.json({ team_id: null, answers: [] });
+
+    const quest = await Quest.findOne({ status: 'active' }).select('clues updatedAt').sort({ updatedAt: -1 });
+    const clueIndex = team.current_clue_index;
+    if (!quest || clueIndex >= quest.clues.length) {
+      return res.json({ team_id: team._id, clue_index: clueIndex, version: null, answers: [] });
+    }
+
+    res.json({
+      team_id: team._id,
+      clue_index: clueIndex,
+      version: `${quest._id}:${quest.updatedAt.getTime()}:${clueIndex}`,
+      answers: normalizeClueAnswers(quest.clues[clueIndex]),
+    });
+  } catch (err) {
+    console.error('Bot answers error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
+// GET /api/bot/geofences — станции активного квеста с координатами и радиусом (геозоны для бота)
+router.get('/geofences', async (req, res) => {
+  try {
+    const quest = await Quest.findOne({ status: 'active' }).select('clues updatedAt').sort({ updatedAt: -1 }).lean();
+    if (!quest) return res.json({ version: null, stations: [] });
+
+    const stations = quest.clues
+      .map((clue, index) => ({
+        index,
+        lat: clue.location?.lat,
+        lng: clue.location?.lng,
+        radius: clue.radius_meters || 100,
+      }))
+      .filter((s) => s.lat != null && s.lng != null && isValidLatLng(s.lat, s.lng));
+
+    res.json({ version: `${quest._id}:${new Date(quest.updatedAt).getTime()}`, stations });
+  } catch (err) {
+    console.error('Bot geofences error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
+// POST /api/bot/geofence — входы/выходы участников в геозоны станций, найденные ботом
+// { events: [{ telegram_id, station, type: 'enter' | 'exit', at }] }
+router.post('/geofence', async (req, res) => {
+  try {
+    const { events } = req.body;
+    if (!Array.isArray(events) || events.length === 0) {
+      return res.status(400).json({ error: 'events должен быть непустым массивом' });
+    }
+
+    const valid = events.filter((e) => e && e.telegram_id && Number.isInteger(e.station)
+      && (e.type === 'enter' || e.type === 'exit'));
+    const users = await User.find({ telegram_id: { $in: valid.map((e) => Number(e.telegram_id)) } })
+      .select('telegram_id first_name team_id')
+      .lean();
+    const byTelegramId = new Map(users.map((u) => [u.telegram_id, u]));
+
+    const io = req.app.get('io');
+    let accepted = 0;
+    for (const e of valid) {
+      const user = byTelegramId.get(Number(e.telegram_id));
+      if (!user) continue;
+      accepted += 1;
+      if (io) io.emit('geofence', {
+        user_id: user._id,
+        telegram_id: user.telegram_id,
+        first_name: user.first_name,
+        team_id: user.team_id,
+        station: e.station,
+        type: e.type,
+        at: e.at ? new Date(e.at) : new Date(),
+      });
+    }
+
+    res.json({ ok: true, accepted });
+  } catch (err) {
+    console.error('Bot geofence error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
+// GET /api/bot/snapshot — компактный снимок участников, команд и квеста для read model бота;
+// дальше бот обновляет его сам по событиям Socket.IO
+router.get('/snapshot', async (req, res) => {
+  try {
+    const [users, teams, quest] = await Promise.all([
+      User.find().select('telegram_id first_name telegram_username team_id lives level is_active').lean(),
+      Team.find().select('name current_clue_index finished_at').lean(),
+      Quest.findOne({ status: 'active' }).select('title clues.order').sort({ updatedAt: -1 }).lean(),
+    ]);
+
+    res.json({
+      users,
+      teams: teams.map(({ finished_at, ...team }) => ({ ...team, finished: Boolean(finished_at) })),
+      quest: quest ? { _id: quest._id, title: quest.title, clues_total: quest.clues.length } : null,
+    });
+  } catch (err) {
+    console.error('Bot snapshot error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
 // POST /api/bot/song/search — поиск песни на Spotify (без добавления)
 router.post('/song/search', async (req, res) => {
   try {
-    const { query: songQuery } = req.body;
+    const { query: songQuery, limit } = req.body;
     if (!songQuery) {
       return res.status(400).json({ error: 'query обязателен' });
     }
 
-    const track = await spotify.searchTrack(songQuery);
-    if (!track) {
+    // Несколько вариантов, чтобы бот мог листать их без повторного поиска
+    const tracks = await spotify.searchTracks(songQuery, Math.min(Math.max(Number(limit) || 1, 1), 10));
+    if (tracks.length === 0) {
       return res.status(404).json({ error: 'not_found', message: 'Песня не найдена на Spotify' });
     }
 
-    res.json({ track });
+    res.json({ track: tracks[0], tracks });
   } catch (err) {
     console.error('Bot song search error:', err);
     res.status(500).json({ error: 'Ошибка сервера' });
@@ -361,7 +656,7 @@ router.post('/profile/name', async (req, res) => {
 router.get('/leaderboard', async (req, res) => {
   try {
     const users = await User.find({ is_active: true })
-      .select('first_name telegram_username lives level')
+      .select('telegram_id first_name telegram_username lives level')
       .sort({ lives: -1, level: -1 })
       .limit(20);
     res.json(users);
@@ -389,13 +684,15 @@ router.get('/voting/active', async (req, res) => {
 router.get('/voting/candidates', async (req, res) => {
   try {
     const { telegram_id } = req.query;
-    if (!telegram_id) return res.status(400).json({ error: 'telegram_id обязателен' });
 
-    // Все активные пользователи кроме самого голосующего
-    const candidates = await User.find({
-      is_active: true,
-      telegram_id: { $ne: Number(telegram_id) },
-    }).select('_id first_name telegram_username telegram_id');
+    // Все активные пользователи кроме самого голосующего; без telegram_id — общий список,
+    // который бот кэширует один на всё голосование и сам убирает из него голосующего
+    const filter = { is_active: true };
+    if (telegram_id) filter.telegram_id = { $ne: Number(telegram_id) };
+    const candidates = await User.find(filter)
+      .select('_id first_name telegram_username telegram_id')
+      .sort({ first_name: 1, _id: 1 })
+      .lean();
 
     res.json(candidates);
   } catch (err) {
@@ -460,4 +757,115 @@ router.post('/voting/vote', async (req, res) => {
   }
 });
 
+// POST /api/bot/voting/votes — пачка голосов от бота, накопленная за короткое окно
+router.post('/voting/votes', async (req, res) => {
+  try {
+    const { votes } = req.body;
+    if (!Array.isArray(votes)) {
+      return res.status(400).json({ error: 'votes должен быть массивом' });
+    }
+
+    const voting = await Voting.findOne({ status: 'active' });
+    if (!voting) return res.status(400).json({ error: 'Нет активного голосования' });
+
+    const telegramIds = [...new Set(votes.map((v) => Number(v?.telegram_id)).filter(Boolean))];
+    const voters = await User.find({ telegram_id: { $in: telegramIds } }).select('_id telegram_id');
+    const voterByTelegramId = new Map(voters.map((u) => [u.telegram_id, u]));
+
+    // Кто уже голосовал — одним запросом на всю пачку
+    const existing = await Vote.find({
+      voting_id: voting._id,
+      voter_id: { $in: voters.map((u) => u._id) },
+    }).select('voter_id category');
+    const taken = new Set(existing.map((v) => `${v.voter_id}:${v.category}`));
+
+    const results = [];
+    const docs = [];
+    // Ответ на каждый принятый в пачку голос — по ключу голосующий:категория (в пачке он уникален)
+    const resultByKey = new Map();
+    for (const v of votes) {
+      const telegram_id = Number(v?.telegram_id);
+      const { candidate_id, category } = v || {};
+      const result = { telegram_id, category };
+      results.push(result);
+
+      const voter = voterByTelegramId.get(telegram_id);
+      if (!voter) { result.error = 'Участник не найден'; continue; }
+      if (!['best', 'worst'].includes(category) || !mongoose.isValidObjectId(candidate_id)) {
+        result.error = 'Неверный голос';
+        continue;
+      }
+      if (voter._id.toString() === String(candidate_id)) { result.error = 'Нельзя голосовать за себя'; continue; }
+
+      const key = `${voter._id}:${category}`;
+      if (taken.has(key)) { result.error = 'already_voted'; continue; }
+      taken.add(key);
+      resultByKey.set(key, result);
+
+      docs.push({
+        voting_id: voting._id,
+        voter_telegram_id: telegram_id,
+        voter_id: voter._id,
+        candidate_id,
+        category,
+      });
+      result.ok = true;
+    }
+
+    if (docs.length) {
+      try {
+        await Vote.insertMany(docs, { ordered: false });
+      } catch (err) {
+        // Гонка с одиночным /voting/vote: дубли отбрасываются уникальным индексом
+        if (err.code !== 11000 && !err.writeErrors) throw err;
+        // Отклонённый документ берём из самой ошибки, а не по позиции в docs
+        for (const we of err.writeErrors || []) {
+          const doc = we.getOperation?.() || we.err?.op;
+          const result = doc && resultByKey.get(`${doc.voter_id}:${doc.category}`);
+          if (result) {
+            delete result.ok;
+            result.error = we.code === 11000 ? 'already_voted' : 'Голос не сохранён';
+          }
+        }
+      }
+
+      const accepted = results.filter((r) => r.ok);
+      const castBy = new Map();
+      for (const r of accepted) castBy.set(r.telegram_id, (castBy.get(r.telegram_id) || 0) + 1);
+      if (castBy.size) {
+        await User.bulkWrite([...castBy].map(([telegram_id, n]) => ({
+          updateOne: { filter: { telegram_id }, update: { $inc: { 'stats.votes_cast': n } } },
+        })));
+      }
+
+      const io = req.app.get('io');
+      if (io) {
+        for (const r of accepted) io.emit('new_vote', { voting_id: voting._id, category: r.category });
+      }
+    }
+
+    res.json({ voting_id: voting._id, results });
+  } catch (err) {
+    console.error('Bot votes batch error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
+// GET /api/bot/voting/voters — кто уже голосовал в активном голосовании, по категориям
+router.get('/voting/voters', async (req, res) => {
+  try {
+    const voting = await Voting.findOne({ status: 'active' });
+    if (!voting) return res.json({ voting_id: null, best: [], worst: [] });
+
+    const votes = await Vote.find({ voting_id: voting._id }).select('voter_telegram_id category').lean();
+    const voters = { best: [], worst: [] };
+    for (const v of votes) voters[v.category]?.push(v.voter_telegram_id);
+
+    res.json({ voting_id: voting._id, ...voters });
+  } catch (err) {
+    console.error('Bot voting voters error:', err);
+    res.status(500).json({ error: 'Ошибка сервера' });
+  }
+});
+
 module.exports = router;
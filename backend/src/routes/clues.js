@@ -19,6 +19,7 @@ router.post('/send-first/:teamId', async (req, res) => {
     if (!quest || !quest.clues.length) return res.status(400).json({ error: 'В квесте нет станций' });
 
     team.current_clue_index = 0;
+    team.finished_at = null;
     await team.save();
 
     await sendStationToTeam(team, quest.clues[0], 0, quest.clues.length, '🚀 <b>Квест начался!</b>\n\n');
@@ -150,6 +150,8 @@ router.patch('/:id', async (req, res) => {
             if (io) io.emit('clue_approved', { team_id: team._id, clue_index: nextIndex });
           } else {
             // Квест завершён для этой команды
+            team.finished_at = new Date();
+            await team.save();
             for (const member of team.members) {
               try {
                 await telegram.sendMessage(member.telegram_id, '🎉 <b>Поздравляем! Вы прошли все точки квеста!</b>');
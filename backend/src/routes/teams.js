@@ -37,7 +37,11 @@ router.patch('/:id', async (req, res) => {
     const update = {};
     if (name !== undefined) update.name = name;
     if (color !== undefined) update.color = color;
-    if (current_clue_index !== undefined) update.current_clue_index = current_clue_index;
+    if (current_clue_index !== undefined) {
+      // Организатор вернул команду на станцию — квест для неё снова не пройден
+      update.current_clue_index = current_clue_index;
+      update.finished_at = null;
+    }
 
     const team = await Team.findByIdAndUpdate(req.params.id, update, { new: true })
       .populate('members', 'telegram_id telegram_username first_name last_location is_active');
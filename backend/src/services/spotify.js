@@ -60,11 +60,24 @@ async function getUserAccessToken() {
   return resp.data.access_token;
 }
 
+function toTrack(track) {
+  return {
+    spotify_id: track.id,
+    spotify_uri: track.uri,
+    name: track.name,
+    artist: track.artists.map((a) => a.name).join(", "),
+    album: track.album?.name || "",
+    cover_url: track.album?.images?.[0]?.url || "",
+    preview_url: track.preview_url || "",
+    external_url: track.external_urls?.spotify || "",
+  };
+}
+
 /**
- * Search for a track on Spotify by name.
- * Returns the first matching track or null.
+ * Search for tracks on Spotify by name.
+ * Returns up to `limit` matching tracks, best match first.
  */
-async function searchTrack(query) {
+async function searchTracks(query, limit = 5) {
   const token = await getAccessToken();
 
   const resp = await axios.get("https://api.spotify.com/v1/search", {
@@ -72,24 +85,20 @@ async function searchTrack(query) {
     params: {
       q: query,
       type: "track",
-      limit: 1,
+      limit,
     },
   });
 
-  const tracks = resp.data.tracks?.items;
-  if (!tracks || tracks.length === 0) return null;
+  return (resp.data.tracks?.items || []).map(toTrack);
+}
 
-  const track = tracks[0];
-  return {
-    spotify_id: track.id,
-    spotify_uri: track.uri,
-    name: track.name,
-    artist: track.artists.map((a) => a.name).join(", "),
-    album: track.album?.name || "",
-    cover_url: track.album?.images?.[0]?.url || "",
-    preview_url: track.preview_url || "",
-    external_url: track.external_urls?.spotify || "",
-  };
+/**
+ * Search for a track on Spotify by name.
+ * Returns the first matching track or null.
+ */
+async function searchTrack(query) {
+  const tracks = await searchTracks(query, 1);
+  return tracks[0] || null;
 }
 
 /**
@@ -137,6 +146,7 @@ async function removeTrackFromPlaylist(spotifyUri) {
 
 module.exports = {
   searchTrack,
+  searchTracks,
   addTrackToPlaylist,
   removeTrackFromPlaylist,
 };
@@ -0,0 +1,99 @@
+"""Микробенчмарк распознавания кнопок в тексте сообщения.
+
+Сравнивает прежнюю схему из handlers/messages.py (до трёх проходов _EMOJI_RE на сообщение
+плюс списки строк в фильтрах каждого роутера) с реестром keyboards.main.resolve_button.
+
+Запуск из каталога bot/:
+    python -m benchmarks.buttons
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyboards.main import BUTTONS, PHOTO, STATUS, _EMOJI_RE, _resolve_slow, resolve_button  # noqa: E402
+
+# ---- прежняя реализация ----
+
+_OLD_BUTTON_TEXTS = {
+    "отправить фото", "поделиться геопозицией",
+    "добавить песню", "мои песни",
+    "профиль", "топ игроков",
+    "голосовать", "мой статус",
+    "изменить имя",
+}
+_OLD_ROUTER_FILTERS = [
+    ["🗳 Голосовать", "Голосовать"],
+    ["👤 Профиль", "Профиль"],
+    ["🏆 Топ игроков", "Топ игроков"],
+    ["🎵 Добавить песню", "Добавить песню"],
+    ["📋 Мои песни", "Мои песни"],
+]
+
+
+def _strip_emoji(text: str) -> str:
+    return _EMOJI_RE.sub('', text).strip()
+
+
+def old_dispatch(text: str):
+    for options in _OLD_ROUTER_FILTERS:
+        if text in options:
+            return 'router'
+    if text == "📸 Отправить фото" or _strip_emoji(text).lower() == "отправить фото":
+        return PHOTO
+    if text == "ℹ️ Мой статус" or _strip_emoji(text).lower() == "мой статус":
+        return STATUS
+    if _strip_emoji(text).lower() in _OLD_BUTTON_TEXTS:
+        return 'button'
+    return None
+
+
+# ---- новая реализация: как это видит цепочка роутеров ----
+
+_ROUTER_ACTIONS = ['vote', 'profile', 'leaderboard', 'add_song', 'my_songs']
+
+
+def new_dispatch(text: str):
+    # Каждый роутер вызывает resolve_button в своём фильтре — повторы обслуживает кэш
+    for action in _ROUTER_ACTIONS:
+        if resolve_button(text) == action:
+            return 'router'
+    return resolve_button(text)
+
+
+CORPUS = (
+    list(BUTTONS)  # нажатия кнопок
+    + ['голосовать', 'Мой статус', '📸отправить фото']  # кнопки, набранные руками
+    + ['Москва', 'кремль', 'Красная площадь', 'ответ 42', 'Мы у фонтана, ждём подсказку!']  # ответы
+    + ['Ребята, мы потерялись, подскажите пожалуйста куда идти дальше, мы уже полчаса ищем 🙏']  # сообщения
+) * 50
+
+
+def bench(func, number: int) -> float:
+    total = timeit.timeit(lambda: [func(t) for t in CORPUS], number=number)
+    return total / (number * len(CORPUS)) * 1e9
+
+
+def main():
+    number = 200
+    assert [old_dispatch(t) is None for t in CORPUS] == [new_dispatch(t) is None for t in CORPUS]
+
+    old_ns = bench(old_dispatch, number)
+    _resolve_slow.cache_clear()
+    new_ns = bench(new_dispatch, number)
+    _resolve_slow.cache_clear()
+    cold_ns = bench(lambda t: (_resolve_slow.cache_clear(), new_dispatch(t)), number)
+    regex = re.compile(_EMOJI_RE.pattern)
+    regex_ns = bench(lambda t: regex.sub('', t), number)
+
+    print(f"messages: {len(CORPUS)} x {number}")
+    print(f"  one _EMOJI_RE pass:          {regex_ns:8.0f} ns/msg")
+    print(f"  old (strip up to 3 times):   {old_ns:8.0f} ns/msg")
+    print(f"  registry, cold cache:        {cold_ns:8.0f} ns/msg")
+    print(f"  registry, warm cache:        {new_ns:8.0f} ns/msg  (x{old_ns / new_ns:.1f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Микробенчмарк таблицы лидеров: сортировка на каждый запрос против services.ranking.RankIndex.
+
+Сортировка — то, что делает бэкенд на каждое нажатие «🏆 Топ игроков» (и что пришлось бы
+делать боту, чтобы найти место участника). RankIndex обновляется по событию за O(log n)
+и отвечает «топ + моё место + соседи» за O(log n + k).
+
+Запуск из каталога bot/:
+    python -m benchmarks.leaderboard
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ranking import RankIndex, rank_key  # noqa: E402
+
+TOP = 10
+
+
+def sorted_view(users: dict[int, tuple[int, int]], telegram_id: int):
+    order = sorted(users, key=lambda t: rank_key(t, *users[t]))
+    rank = order.index(telegram_id)
+    return order[:TOP], rank, order[max(0, rank - 1):rank + 2]
+
+
+def index_view(index: RankIndex, telegram_id: int):
+    rank = index.rank(telegram_id)
+    return list(index.range(0, TOP)), rank, list(index.range(rank - 1, rank + 2))
+
+
+def main():
+    number = 200
+    for n in (100, 1000, 10000):
+        rng = random.Random(n)
+        users = {t: (rng.randrange(10), rng.randrange(5)) for t in range(n)}
+        index = RankIndex()
+        for t, (lives, level) in users.items():
+            index.set(t, lives, level)
+        probes = [rng.randrange(n) for _ in range(number)]
+
+        top, rank, around = sorted_view(users, probes[0])
+        assert ([t for _, t in index_view(index, probes[0])[0]], index.rank(probes[0])) == (top, rank)
+
+        sort_us = timeit.timeit(lambda: [sorted_view(users, t) for t in probes], number=1) / number * 1e6
+        index_us = timeit.timeit(lambda: [index_view(index, t) for t in probes], number=1) / number * 1e6
+
+        def update():
+            t = rng.randrange(n)
+            index.set(t, rng.randrange(10), rng.randrange(5))
+        update_us = timeit.timeit(update, number=number) / number * 1e6
+
+        print(f"users: {n}")
+        print(f"  sort per request:   {sort_us:10.1f} us")
+        print(f"  RankIndex query:    {index_us:10.1f} us  (x{sort_us / index_us:.0f})")
+        print(f"  RankIndex update:   {update_us:10.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Локальные заглушки Telegram Bot API и бэкенда /api/bot/* для нагрузочных прогонов."""
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from benchmarks.scenarios import BASE_LAT, BASE_LNG
+
+
+async def _start(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+class MockTelegram:
+    """Отвечает на любой метод Bot API правдоподобным результатом после задержки."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+        self._runner: web.AppRunner | None = None
+        self.url = ''
+
+    def _message(self, form) -> dict:
+        chat_id = int(form.get('chat_id') or 0)
+        return {
+            'message_id': int(form.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': form.get('text', ''),
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] += 1
+        form = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        lowered = method.lower()
+        if lowered == 'getme':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'Bench'}
+        elif lowered.startswith('send') or lowered.startswith('edit'):
+            result = self._message(form)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner, self.url = await _start(app)
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class MockBackend:
+    """Имитирует /api/bot/* Node.js бэкенда с настраиваемой задержкой."""
+
+    def __init__(self, latency: float = 0.0, candidates: int = 30, answers: tuple = ('москва',)):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.answers = list(answers)
+        self.candidates = [
+            {'_id': f'{i:024x}', 'first_name': f'Игрок {i}', 'telegram_username': f'player{i}', 'telegram_id': 10_000 + i}
+            for i in range(candidates)
+        ]
+        self._runner: web.AppRunner | None = None
+        self.url = ''
+
+    def respond(self, method: str, endpoint: str, body: dict, query: dict):
+        telegram_id = body.get('telegram_id') or query.get('telegram_id')
+        if endpoint == 'register':
+            return {'user': {'telegram_id': telegram_id}, 'created': False}
+        if endpoint in ('location', 'profile/name'):
+            return {'ok': True, 'first_name': body.get('first_name', '')}
+        if endpoint == 'locations':
+            return {'ok': True, 'updated': len(body.get('locations', []))}
+        if endpoint == 'message':
+            return {'_id': 'm1', 'text': body.get('text', '')}
+        if endpoint == 'photo':
+            return {'_id': 'p1'}
+        if endpoint == 'photo/batch':
+            return {'reports': [], 'count': len(body.get('file_ids', []))}
+        if endpoint == 'answers':
+            return {'team_id': 't1', 'clue_index': 0, 'version': 'q1:0:0', 'answers': self.answers}
+        if endpoint == 'check-answer':
+            correct = str(body.get('answer', '')).strip().lower() in self.answers
+            return {'matched': True, 'correct': correct}
+        if endpoint == 'song/search':
+            query_text = body.get('query', '')
+            tracks = [
+                {
+                    'spotify_id': f'{abs(hash(query_text))}-{i}', 'spotify_uri': f'spotify:track:{i}',
+                    'name': query_text, 'artist': f'Bench Artist {i}', 'external_url': 'https://open.spotify.com/track/x',
+                }
+                for i in range(int(body.get('limit') or 1))
+            ]
+            return {'track': tracks[0], 'tracks': tracks}
+        if endpoint == 'song':
+            return {'song': body.get('track', {})}
+        if endpoint == 'songs':
+            songs = [{'name': f'Song {i}', 'artist': 'Artist', 'external_url': ''} for i in range(20)]
+            return {'songs': songs, 'count': len(songs)}
+        if endpoint == 'profile':
+            return {
+                'first_name': 'Bench', 'team_id': {'name': 'Команда'}, 'lives': 3,
+                'stats': {'photos_sent': 1}, 'teammates': [{'first_name': 'Друг'}],
+            }
+        if endpoint == 'leaderboard':
+            return [{'first_name': f'Игрок {i}', 'lives': 5 - i % 5, 'level': 1} for i in range(20)]
+        if endpoint == 'voting/active':
+            return {'voting': {'_id': 'v1', 'title': 'Лучший игрок дня'}}
+        if endpoint == 'voting/candidates':
+            return [c for c in self.candidates if c['telegram_id'] != int(telegram_id or 0)]
+        if endpoint == 'voting/vote':
+            return {'ok': True}
+        if endpoint == 'geofences':
+            # Сетка станций вокруг точки старта location_storm
+            stations = [
+                {'index': i, 'lat': BASE_LAT + (i // 5 - 2) * 0.004, 'lng': BASE_LNG + (i % 5 - 2) * 0.004, 'radius': 150}
+                for i in range(25)
+            ]
+            return {'version': 'bench', 'stations': stations}
+        if endpoint == 'geofence':
+            return {'ok': True, 'accepted': len(body.get('events', []))}
+        if endpoint == 'voting/votes':
+            results = [
+                {'telegram_id': v['telegram_id'], 'category': v['category'], 'ok': True}
+                for v in body.get('votes', [])
+            ]
+            return {'voting_id': 'v1', 'results': results}
+        if endpoint == 'voting/voters':
+            return {'voting_id': 'v1', 'best': [], 'worst': []}
+        return {'ok': True}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        endpoint = request.match_info['endpoint']
+        self.calls[endpoint] += 1
+        body = await request.json() if request.can_read_body else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response(self.respond(request.method, endpoint, body, dict(request.query)))
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_route('*', '/api/bot/{endpoint:.+}', self.handle)
+        self._runner, self.url = await _start(app)
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,64 @@
+"""Микробенчмарк списка «📋 Мои песни»: конкатенация в цикле против rendering.Template + split_message.
+
+Прежний my_songs_handler собирал текст через += без экранирования и одним сообщением —
+на длинных списках Telegram отклонял его (больше 4096 символов).
+
+Запуск из каталога bot/:
+    python -m benchmarks.rendering
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.song import SONGS_HEADER, render_songs  # noqa: E402
+from rendering import MESSAGE_LIMIT, split_message  # noqa: E402
+
+
+def old_render(songs: list[dict]) -> str:
+    text = f"🎵 <b>Твои песни ({len(songs)}):</b>\n\n"
+    for i, song in enumerate(songs, 1):
+        name = song.get('name', '?')
+        artist = song.get('artist', '?')
+        url = song.get('external_url', '')
+        if url:
+            text += f"{i}. <a href=\"{url}\">{name}</a> — {artist}\n"
+        else:
+            text += f"{i}. {name} — {artist}\n"
+    return text
+
+
+def new_render(songs: list[dict]) -> list[str]:
+    return split_message(render_songs(songs), header=SONGS_HEADER.render(count=len(songs)))
+
+
+def make_songs(n: int) -> list[dict]:
+    return [
+        {
+            'name': f'Song <{i}> & "Friends"',
+            'artist': 'Artist & Co',
+            'external_url': f'https://open.spotify.com/track/{i:022d}' if i % 4 else '',
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    for n in (20, 200, 2000):
+        songs = make_songs(n)
+        number = max(1, 20000 // n)
+        old_us = timeit.timeit(lambda: old_render(songs), number=number) / number * 1e6
+        new_us = timeit.timeit(lambda: new_render(songs), number=number) / number * 1e6
+        old_len = len(old_render(songs))
+        messages = new_render(songs)
+        assert all(len(m) <= MESSAGE_LIMIT for m in messages)
+
+        print(f"songs: {n}")
+        print(f"  old (+=, no escaping):   {old_us:10.1f} us  {old_len} chars in 1 message"
+              f"{'  <- over the limit' if old_len > MESSAGE_LIMIT else ''}")
+        print(f"  Template + split:        {new_us:10.1f} us  {len(messages)} message(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Нагрузочный прогон бота на заглушках Telegram и бэкенда.
+
+Настоящий Dispatcher из main.create_dispatcher() получает синтетические апдейты,
+исходящие запросы уходят в локальный mock Bot API, запросы к /api/bot/* — в mock бэкенда.
+
+Запуск из каталога bot/:
+    python -m benchmarks.run --users 200 --updates 20 --backend-latency 0.02
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mocks import MockBackend, MockTelegram  # noqa: E402
+from benchmarks.scenarios import SCENARIOS, Scenario  # noqa: E402
+
+BENCH_TOKEN = '123456:BENCHMARK-TOKEN'
+
+
+def _configure_env(args):
+    # config читает окружение при импорте, поэтому всё выставляем до импорта main
+    os.environ['FSM_STORAGE'] = 'memory'
+    os.environ['METRICS_ENABLED'] = '1'
+    os.environ['THROTTLE_ENABLED'] = '1' if args.throttle else '0'
+    os.environ['MAX_CONCURRENT_UPDATES'] = str(args.concurrency)
+    # У мок-бэкенда нет Socket.IO — read model остаётся пустой, хендлеры идут на бэкенд
+    os.environ['BACKEND_EVENTS_ENABLED'] = '0'
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _handler_totals() -> dict[str, tuple[int, float]]:
+    from services.metrics import HANDLER_DURATION
+    return {key[0]: totals for key, totals in HANDLER_DURATION.totals().items()}
+
+
+async def run_scenario(bot, dp, scenario: Scenario, concurrency: int, trace_memory: bool) -> dict:
+    from aiogram.types import Update
+    from services.location import aggregator
+    from services.media_group import media_groups
+    from services.outbound import drain
+    from services.geofence import geofences
+    from services.voting import vote_batcher
+
+    latencies: list[float] = []
+    errors = 0
+    limiter = asyncio.Semaphore(concurrency)
+    handlers_before = _handler_totals()
+
+    async def play(session: list[dict]):
+        nonlocal errors
+        for raw in session:
+            update = Update.model_validate(raw, context={'bot': bot})
+            async with limiter:
+                start = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(play(session) for session in scenario.sessions))
+    # Недособранные альбомы, фоновые ответы и накопленные геопозиции — тоже часть работы сценария
+    await media_groups.stop()
+    await drain(timeout=30)
+    await aggregator.flush(force=True)
+    await vote_batcher.stop()
+    await geofences.stop()
+    elapsed = time.perf_counter() - started
+    peak_kb = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_kb = round(peak / 1024, 1)
+
+    handlers = {}
+    for name, (count, total) in _handler_totals().items():
+        prev_count, prev_total = handlers_before.get(name, (0, 0.0))
+        if count > prev_count:
+            handlers[name] = {
+                'calls': count - prev_count,
+                'mean_ms': round((total - prev_total) / (count - prev_count) * 1000, 3),
+            }
+
+    return {
+        'updates': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        # None — память не замерялась (нет --trace-memory)
+        'peak_traced_kb': peak_kb,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'handlers': handlers,
+    }
+
+
+async def run(args) -> dict:
+    _configure_env(args)
+
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+
+    import main
+    from services.api import BackendClient, set_client
+    from services.geofence import geofences
+    from services.outbound import OutboundScheduler
+
+    telegram = MockTelegram(latency=args.telegram_latency)
+    backend_mock = MockBackend(latency=args.backend_latency, candidates=args.candidates)
+    await telegram.start()
+    await backend_mock.start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(telegram.url))
+    bot = Bot(token=BENCH_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    if args.outbound_limits:
+        bot.session.middleware(OutboundScheduler())
+
+    backend = BackendClient(base_url=backend_mock.url)
+    set_client(backend)
+    dp = main.create_dispatcher()
+    # Геозоны станций мок-бэкенда — location_storm проверяет каждую точку
+    await geofences.load()
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            random.seed(args.seed)
+            scenario = SCENARIOS[name](args.users, args.updates, args.candidates)
+            backend_mock.calls.clear()
+            telegram.calls.clear()
+            result = await run_scenario(bot, dp, scenario, args.concurrency, args.trace_memory)
+            result['backend_calls'] = dict(backend_mock.calls)
+            result['telegram_calls'] = dict(telegram.calls)
+            results[name] = result
+    finally:
+        await dp.storage.close()
+        await backend.close()
+        await bot.session.close()
+        await telegram.stop()
+        await backend_mock.stop()
+    return results
+
+
+def _or_dash(value) -> str:
+    return '-' if value is None else str(value)
+
+
+def print_report(results: dict):
+    header = f"{'scenario':<16}{'updates':>9}{'err':>6}{'upd/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak KB':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<16}{r['updates']:>9}{r['errors']:>6}{r['updates_per_sec']:>10}"
+            f"{r['p50_ms']:>10}{r['p99_ms']:>10}{_or_dash(r['peak_traced_kb']):>10}"
+        )
+    for name, r in results.items():
+        print(f"\n[{name}] backend: {r['backend_calls']}  telegram: {r['telegram_calls']}")
+        for handler, stats in sorted(r['handlers'].items()):
+            print(f"  {handler:<40}{stats['calls']:>8} calls {stats['mean_ms']:>10} ms avg")
+    print(f"\nmax RSS: {max((r['max_rss_kb'] for r in results.values()), default=0)} KB")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Сравнить с сохранённым прогоном; вернуть список регрессий."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if r['updates_per_sec'] < base['updates_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: upd/s {base['updates_per_sec']} -> {r['updates_per_sec']}")
+        if r['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {base['p99_ms']} ms -> {r['p99_ms']} ms")
+        # Старые прогоны без --trace-memory сохраняли 0 — с ними пик не сравниваем
+        if r.get('peak_traced_kb') and base.get('peak_traced_kb') \
+                and r['peak_traced_kb'] > base['peak_traced_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak {base['peak_traced_kb']} KB -> {r['peak_traced_kb']} KB")
+        if base.get('max_rss_kb') and r['max_rss_kb'] > base['max_rss_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: max RSS {base['max_rss_kb']} KB -> {r['max_rss_kb']} KB")
+        if r['errors'] > base['errors']:
+            regressions.append(f"{name}: errors {base['errors']} -> {r['errors']}")
+        for handler, stats in r['handlers'].items():
+            base_stats = base.get('handlers', {}).get(handler)
+            if base_stats and stats['mean_ms'] > base_stats['mean_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: {handler} {base_stats['mean_ms']} ms -> {stats['mean_ms']} ms")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=20, help='апдейтов на участника')
+    parser.add_argument('--candidates', type=int, default=30)
+    parser.add_argument('--concurrency', type=int, default=100, help='апдейтов в обработке одновременно')
+    parser.add_argument('--backend-latency', type=float, default=0.01, help='секунды')
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help='секунды')
+    parser.add_argument('--throttle', action='store_true', help='включить ThrottlingMiddleware')
+    parser.add_argument('--outbound-limits', action='store_true', help='включить лимиты исходящих запросов')
+    parser.add_argument('--trace-memory', action='store_true', help='замерять пик памяти через tracemalloc')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='сравнить с сохранёнными результатами')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+def cli(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print_report(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nРегрессии:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
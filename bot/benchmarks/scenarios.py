@@ -0,0 +1,170 @@
+"""Синтетические потоки апдейтов для нагрузочных прогонов.
+
+Сценарий — это набор «сессий»: апдейты одной сессии подаются строго по очереди
+(как их прислал бы один участник), разные сессии идут параллельно.
+"""
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+
+BASE_USER_ID = 10_000
+BASE_LAT, BASE_LNG = 55.7558, 37.6173
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+@dataclass
+class Scenario:
+    name: str
+    sessions: list[list[dict]] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return sum(len(s) for s in self.sessions)
+
+
+def _user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'Игрок {user_id - BASE_USER_ID}'}
+
+
+def _chat(user_id: int) -> dict:
+    return {'id': user_id, 'type': 'private'}
+
+
+def message(
+    user_id: int,
+    text: str | None = None,
+    location: tuple | None = None,
+    edited: bool = False,
+    photo: str | None = None,
+    media_group_id: str | None = None,
+) -> dict:
+    now = int(time.time())
+    msg = {
+        'message_id': next(_message_ids),
+        'date': now,
+        'chat': _chat(user_id),
+        'from': _user(user_id),
+    }
+    if text is not None:
+        msg['text'] = text
+    if location is not None:
+        lat, lng = location
+        msg['location'] = {'latitude': lat, 'longitude': lng, 'live_period': 3600}
+    if photo is not None:
+        msg['photo'] = [
+            {'file_id': f'{photo}-s', 'file_unique_id': f'{photo}-s', 'width': 90, 'height': 90},
+            {'file_id': photo, 'file_unique_id': photo, 'width': 1280, 'height': 960},
+        ]
+    if media_group_id is not None:
+        msg['media_group_id'] = media_group_id
+    if edited:
+        msg['edit_date'] = now
+        return {'update_id': next(_update_ids), 'edited_message': msg}
+    return {'update_id': next(_update_ids), 'message': msg}
+
+
+def callback(user_id: int, data: str) -> dict:
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': next(_message_ids),
+                'date': int(time.time()),
+                'chat': _chat(user_id),
+                'text': '...',
+            },
+        },
+    }
+
+
+def location_storm(users: int, updates_per_user: int) -> Scenario:
+    """Live-трансляции: первая точка обычным сообщением, дальше поток edited_message."""
+    scenario = Scenario('location_storm')
+    for i in range(users):
+        user_id = BASE_USER_ID + i
+        lat, lng = BASE_LAT + random.uniform(-0.01, 0.01), BASE_LNG + random.uniform(-0.01, 0.01)
+        session = [message(user_id, location=(lat, lng))]
+        for _ in range(updates_per_user - 1):
+            lat += random.uniform(-0.0003, 0.0003)
+            lng += random.uniform(-0.0003, 0.0003)
+            session.append(message(user_id, location=(lat, lng), edited=True))
+        scenario.sessions.append(session)
+    return scenario
+
+
+def answer_bursts(users: int, updates_per_user: int, correct_ratio: float = 0.1) -> Scenario:
+    """Команды перебирают варианты ответа на загадку; изредка попадают в правильный."""
+    words = ['Кремль', 'мост', 'фонтан', 'памятник', 'Арбат', 'метро', 'парк', 'театр']
+    scenario = Scenario('answer_bursts')
+    for i in range(users):
+        user_id = BASE_USER_ID + i
+        session = []
+        for _ in range(updates_per_user):
+            text = 'Москва' if random.random() < correct_ratio else random.choice(words)
+            session.append(message(user_id, text=text))
+        scenario.sessions.append(session)
+    return scenario
+
+
+def voting_rush(users: int, candidates: int) -> Scenario:
+    """Все открывают голосование одновременно и сразу голосуют за лучшего и худшего."""
+    scenario = Scenario('voting_rush')
+    for i in range(users):
+        user_id = BASE_USER_ID + i
+        best = random.randrange(candidates)
+        worst = random.randrange(candidates)
+        scenario.sessions.append([
+            message(user_id, text='🗳 Голосовать'),
+            callback(user_id, f'vt:c:b:{best:024x}'),
+            callback(user_id, f'vt:c:w:{worst:024x}'),
+        ])
+    return scenario
+
+
+def song_searches(users: int, updates_per_user: int) -> Scenario:
+    """Кнопка «Добавить песню», запрос, иногда другой вариант, подтверждение; популярные запросы повторяются."""
+    queries = [
+        'Imagine Dragons - Believer', 'Queen - Bohemian Rhapsody', 'Кино - Группа крови',
+        'The Weeknd - Blinding Lights', 'Земфира - Искала', 'Daft Punk - Get Lucky',
+    ]
+    scenario = Scenario('song_searches')
+    for i in range(users):
+        user_id = BASE_USER_ID + i
+        session = []
+        for _ in range(max(1, updates_per_user // 3)):
+            session.append(message(user_id, text='🎵 Добавить песню'))
+            session.append(message(user_id, text=random.choice(queries)))
+            if random.random() < 0.3:
+                # Первый вариант не тот — листаем дальше
+                session.append(callback(user_id, 'song_retry'))
+            session.append(callback(user_id, 'song_confirm'))
+        scenario.sessions.append(session)
+    return scenario
+
+
+def photo_albums(users: int, album_size: int = 10) -> Scenario:
+    """Команды отправляют фото-отчёты альбомами."""
+    scenario = Scenario('photo_albums')
+    for i in range(users):
+        user_id = BASE_USER_ID + i
+        group = f'album-{user_id}'
+        scenario.sessions.append([
+            message(user_id, photo=f'photo-{user_id}-{n}', media_group_id=group) for n in range(album_size)
+        ])
+    return scenario
+
+
+SCENARIOS = {
+    'location_storm': lambda users, n, candidates: location_storm(users, n),
+    'answer_bursts': lambda users, n, candidates: answer_bursts(users, n),
+    'voting_rush': lambda users, n, candidates: voting_rush(users, candidates),
+    'song_searches': lambda users, n, candidates: song_searches(users, n),
+    'photo_albums': lambda users, n, candidates: photo_albums(users, min(n, 10)),
+}
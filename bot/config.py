@@ -6,3 +6,119 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 BOT_TOKEN = os.getenv('BOT_TOKEN', '')
 API_URL = os.getenv('BACKEND_URL', 'http://localhost:3001')
 API_SECRET_KEY = os.getenv('API_SECRET_KEY', 'dev-api-key')
+
+# Пул соединений к бэкенду
+BACKEND_POOL_LIMIT = int(os.getenv('BACKEND_POOL_LIMIT', '100'))
+BACKEND_POOL_LIMIT_PER_HOST = int(os.getenv('BACKEND_POOL_LIMIT_PER_HOST', '30'))
+BACKEND_KEEPALIVE_TIMEOUT = float(os.getenv('BACKEND_KEEPALIVE_TIMEOUT', '30'))
+BACKEND_TIMEOUT = float(os.getenv('BACKEND_TIMEOUT', '10'))
+BACKEND_CONNECT_TIMEOUT = float(os.getenv('BACKEND_CONNECT_TIMEOUT', '3'))
+
+# Устойчивость клиента к бэкенду: повторы, предохранитель, лимит запросов в работе
+BACKEND_MAX_IN_FLIGHT = int(os.getenv('BACKEND_MAX_IN_FLIGHT', '50'))
+BACKEND_RETRIES = int(os.getenv('BACKEND_RETRIES', '2'))
+BACKEND_RETRY_BACKOFF = float(os.getenv('BACKEND_RETRY_BACKOFF', '0.3'))
+BACKEND_BREAKER_THRESHOLD = int(os.getenv('BACKEND_BREAKER_THRESHOLD', '5'))
+BACKEND_BREAKER_COOLDOWN = float(os.getenv('BACKEND_BREAKER_COOLDOWN', '15'))
+
+# Read model участников по событиям Socket.IO бэкенда; снимок перечитывается раз в RESYNC секунд
+BACKEND_EVENTS_ENABLED = os.getenv('BACKEND_EVENTS_ENABLED', '1') == '1'
+BACKEND_EVENTS_RESYNC = float(os.getenv('BACKEND_EVENTS_RESYNC', '300'))
+
+# Агрегация live-location
+LOCATION_MIN_DISTANCE_M = float(os.getenv('LOCATION_MIN_DISTANCE_M', '15'))
+LOCATION_MIN_INTERVAL = float(os.getenv('LOCATION_MIN_INTERVAL', '5'))
+LOCATION_MAX_SILENCE = float(os.getenv('LOCATION_MAX_SILENCE', '120'))
+LOCATION_FLUSH_INTERVAL = float(os.getenv('LOCATION_FLUSH_INTERVAL', '3'))
+LOCATION_BATCH_SIZE = int(os.getenv('LOCATION_BATCH_SIZE', '200'))
+
+# Геозоны станций: бот сам определяет вход/выход участника; выход — дальше радиуса плюс запас
+GEOFENCE_ENABLED = os.getenv('GEOFENCE_ENABLED', '1') == '1'
+GEOFENCE_EXIT_MARGIN_M = float(os.getenv('GEOFENCE_EXIT_MARGIN_M', '20'))
+GEOFENCE_REFRESH = float(os.getenv('GEOFENCE_REFRESH', '60'))
+
+# Локальная проверка ответов на станции
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '15'))
+# Снимку старше стольких секунд не верим на слово «неверно», если станции не отслеживаются
+# по событиям бэкенда, — сначала перечитываем ответы
+ANSWER_WRONG_MAX_AGE = float(os.getenv('ANSWER_WRONG_MAX_AGE', '3'))
+
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', '8081'))
+
+# Сколько апдейтов обрабатывается одновременно (0 — без ограничения)
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '100'))
+# Полосы планировщика: сколько апдейтов каждой полосы обрабатывается одновременно
+# (0 — до общего MAX_CONCURRENT_UPDATES). Свободный слот получает сначала интерактив
+LANE_INTERACTIVE_WORKERS = int(os.getenv('LANE_INTERACTIVE_WORKERS', '0'))
+LANE_MEDIA_WORKERS = int(os.getenv('LANE_MEDIA_WORKERS', '30'))
+LANE_TELEMETRY_WORKERS = int(os.getenv('LANE_TELEMETRY_WORKERS', '20'))
+# Сколько участников может ждать слота с точкой live-location: у каждого ждёт только
+# последняя, при полной очереди новая точка отбрасывается (0 — без ограничения)
+LANE_TELEMETRY_QUEUE = int(os.getenv('LANE_TELEMETRY_QUEUE', '200'))
+
+# Что делать с апдейтами, накопившимися за время простоя: collapse, skip или keep
+BACKLOG_POLICY = os.getenv('BACKLOG_POLICY', 'collapse').lower()
+# Апдейты старше стольких секунд не обрабатываются (0 — без ограничения)
+BACKLOG_MAX_AGE = float(os.getenv('BACKLOG_MAX_AGE', '600'))
+# Сколько последних update_id помнить для защиты от повторной доставки
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '10000'))
+
+# FSM-хранилище: memory или sqlite
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory').lower()
+FSM_DB_PATH = os.getenv('FSM_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'fsm.sqlite3'))
+FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', '1'))
+FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', '86400'))
+
+# Очередь записей на диске на время недоступности бэкенда
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', os.path.join(os.path.dirname(__file__), 'data', 'outbox.jsonl'))
+OUTBOX_RETRY_INTERVAL = float(os.getenv('OUTBOX_RETRY_INTERVAL', '5'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_MAX_ENTRIES = int(os.getenv('OUTBOX_MAX_ENTRIES', '10000'))
+
+# Число процессов-воркеров (1 — всё в одном процессе)
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+
+# Кэш ответов бэкенда (число записей)
+API_CACHE_SIZE = int(os.getenv('API_CACHE_SIZE', '2048'))
+
+# Ограничение частоты апдейтов от одного участника: (апдейтов в секунду, размер всплеска)
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_LIMITS = {
+    'location': (float(os.getenv('THROTTLE_LOCATION_RATE', '1')), int(os.getenv('THROTTLE_LOCATION_BURST', '5'))),
+    'text': (float(os.getenv('THROTTLE_TEXT_RATE', '1')), int(os.getenv('THROTTLE_TEXT_BURST', '5'))),
+    'callback': (float(os.getenv('THROTTLE_CALLBACK_RATE', '2')), int(os.getenv('THROTTLE_CALLBACK_BURST', '6'))),
+    'photo': (float(os.getenv('THROTTLE_PHOTO_RATE', '0.5')), int(os.getenv('THROTTLE_PHOTO_BURST', '10'))),
+}
+
+# Кэш поиска песен: общий для всех участников, ключ — нормализованный запрос
+SONG_SEARCH_CACHE_SIZE = int(os.getenv('SONG_SEARCH_CACHE_SIZE', '512'))
+SONG_SEARCH_CACHE_TTL = float(os.getenv('SONG_SEARCH_CACHE_TTL', '3600'))
+SONG_SEARCH_LIMIT = int(os.getenv('SONG_SEARCH_LIMIT', '5'))
+
+# Кандидатов на одной странице клавиатуры голосования
+VOTING_PAGE_SIZE = int(os.getenv('VOTING_PAGE_SIZE', '8'))
+
+# Голоса копятся окно в несколько сотен миллисекунд и уходят на бэкенд пачкой
+VOTE_BATCH_WINDOW = float(os.getenv('VOTE_BATCH_WINDOW', '0.5'))
+VOTE_BATCH_SIZE = int(os.getenv('VOTE_BATCH_SIZE', '100'))
+
+# Сколько секунд ждать остальные фото альбома после последнего полученного
+MEDIA_GROUP_WINDOW = float(os.getenv('MEDIA_GROUP_WINDOW', '1.0'))
+
+# Лимиты исходящих сообщений в Telegram
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_INTERVAL = float(os.getenv('OUTBOUND_CHAT_INTERVAL', '1'))
+OUTBOUND_GROUP_INTERVAL = float(os.getenv('OUTBOUND_GROUP_INTERVAL', '3'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+# HTTP-эндпоинт с метриками (у воркеров порт METRICS_PORT + номер воркера)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
@@ -1,7 +1,10 @@
 from aiogram import Router, F
 from aiogram.types import Message
 
-from services.api import api_post
+from services.outbox import post_or_queue
+from services.outbound import send_later
+from services.location import aggregator
+from services.geofence import geofences
 
 router = Router()
 
@@ -11,8 +14,10 @@ async def handle_location(message: Message):
     """Обработка геопозиции (обычной и live)."""
     lat = message.location.latitude
     lng = message.location.longitude
+    geofences.observe(message.from_user.id, lat, lng)
 
-    result = await api_post('location', {
+    # Первую точку отправляем сразу — участнику нужен ответ
+    result = await post_or_queue('location', {
         'telegram_id': message.from_user.id,
         'lat': lat,
         'lng': lng,
@@ -20,21 +25,20 @@ async def handle_location(message: Message):
 
     # Не спамим ответом при каждом live-location update
     # Только при первом сообщении (не edited_message)
-    if not hasattr(message, '_edited') and result.get('ok'):
-        await message.answer(
+    # Отложенная в outbox точка уйдёт на бэкенд, когда он оживёт, — участнику отвечаем сразу
+    if not hasattr(message, '_edited') and (result.get('ok') or result.get('queued')):
+        aggregator.mark_sent(message.from_user.id, lat, lng)
+        send_later(message.answer(
             "📍 Геопозиция получена! Если ты включил(а) трансляцию — мы будем видеть тебя на карте в реальном времени.",
-        )
+        ))
 
 
 @router.edited_message(F.location)
 async def handle_live_location_update(message: Message):
     """Обработка обновлений live location (edited_message)."""
+    # Молча копим: агрегатор оставит последнюю точку и отправит её пачкой,
+    # а геозоны сразу проверяются локально — на бэкенд уходят только входы и выходы
     lat = message.location.latitude
     lng = message.location.longitude
-
-    await api_post('location', {
-        'telegram_id': message.from_user.id,
-        'lat': lat,
-        'lng': lng,
-    })
-    # Молча обновляем, не шлём ответ
+    geofences.observe(message.from_user.id, lat, lng)
+    aggregator.submit(message.from_user.id, lat, lng)
@@ -1,88 +1,122 @@
-import re
+import time
 
 from aiogram import Router, F
 from aiogram.types import Message
 
-from services.api import api_post
+from keyboards.main import PHOTO, STATUS, resolve_button
+from rendering import Template
+from services.api import BACKEND_UNAVAILABLE, api_post
+from services.outbox import post_or_queue
+from services.outbound import send_later
+from services.answers import answer_matcher, NO_TASK, WRONG
+from services.players import Player, players
 
 router = Router()
 
-# Тексты кнопок без эмодзи — чтобы не пересылать организатору при вводе текстом
-BUTTON_TEXTS = {
-    "отправить фото", "поделиться геопозицией",
-    "добавить песню", "мои песни",
-    "профиль", "топ игроков",
-    "голосовать", "мой статус",
-    "изменить имя",
-}
-
-_EMOJI_RE = re.compile(
-    r'[\U0001F000-\U0001FFFF\u2600-\u27BF\uFE0F\u200D\u20E3\u2702-\u27B0\u24C2'
-    r'\U0001F1E0-\U0001F1FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF'
-    r'\u2139\u2194-\u21AA\u231A-\u231B\u23E9-\u23F3\u23F8-\u23FA\u25AA-\u25FE'
-    r'\u2600-\u26FF\u2700-\u27BF\u2934-\u2935\u2B05-\u2B07\u2B1B-\u2B1C\u2B50\u2B55'
-    r'\u3030\u303D\u3297\u3299\uFE0F\u200D]+',
-    flags=re.UNICODE,
-)
-
-
-def _strip_emoji(text: str) -> str:
-    return _EMOJI_RE.sub('', text).strip()
-
-
-def _is_button_text(text: str) -> bool:
-    """Проверяет, является ли текст названием кнопки (с или без эмодзи)."""
-    stripped = _strip_emoji(text).lower()
-    return stripped in BUTTON_TEXTS
-
 
 @router.message(F.text & ~F.text.startswith('/'))
 async def handle_text_message(message: Message):
     """Обработка текстовых сообщений от участника."""
     text = message.text
+    action = resolve_button(text)
 
     # Обработка кнопки «Отправить фото»
-    if text == "📸 Отправить фото" or _strip_emoji(text).lower() == "отправить фото":
-        await message.answer(
+    if action == PHOTO:
+        send_later(message.answer(
             "📸 Просто отправь фото в этот чат и я передам его организатору!",
-        )
+        ))
         return
 
     # Обработка кнопки «Мой статус»
-    if text == "ℹ️ Мой статус" or _strip_emoji(text).lower() == "мой статус":
-        await message.answer(
+    if action == STATUS:
+        # Статус собирается из read model без запроса к бэкенду
+        player = players.get(message.from_user.id)
+        if player is not None:
+            send_later(message.answer(_status_text(player), parse_mode='HTML'))
+            return
+        send_later(message.answer(
             "📊 Твой статус: <i>ожидай подсказку от организатора</i>\n\n"
             "Если тебя уже добавили в команду — скоро придёт первая подсказка!",
             parse_mode='HTML',
-        )
+        ))
         return
 
     # Не пересылать организатору если это текст кнопки без иконки
-    if _is_button_text(text):
+    if action is not None:
         return
 
-    # Проверяем, может это ответ на задание квеста
-    answer_result = await api_post('check-answer', {
-        'telegram_id': message.from_user.id,
-        'answer': text,
-    })
+    # Проверяем, может это ответ на задание квеста: сначала по локальному кэшу ответов,
+    # на бэкенд идём только с похожими на правильный ответами
+    verdict = await answer_matcher.classify(message.from_user.id, text)
 
-    if answer_result.get('matched'):
-        if answer_result.get('correct'):
-            # Ответ правильный — бэкенд уже отправил следующую станцию
-            return
-        else:
-            # Ответ неправильный — сообщаем и НЕ пересылаем организатору
-            await message.answer("❌ Неправильный ответ. Попробуй ещё раз!")
-            return
+    if verdict == WRONG:
+        send_later(message.answer("❌ Неправильный ответ. Попробуй ещё раз!"))
+        return
+
+    # Ответ не удалось проверить: сервер недоступен — текст всё равно не теряем
+    unchecked = False
+    if verdict != NO_TASK:
+        checked_at = time.monotonic()
+        answer_result = await api_post('check-answer', {
+            'telegram_id': message.from_user.id,
+            'answer': text,
+        })
+        # Команда прошла станцию или кэш разошёлся с бэкендом — снимок устарел
+        answer_matcher.confirmed(message.from_user.id, answer_result, checked_at)
+
+        # Без бэкенда кэш ответов обычно тоже пуст, и обычное сообщение сюда попадает
+        # как возможный ответ — дальше оно уходит организатору через outbox
+        unchecked = answer_result.get('error') == BACKEND_UNAVAILABLE
+
+        if answer_result.get('matched'):
+            if answer_result.get('correct'):
+                # Ответ правильный — бэкенд уже отправил следующую станцию
+                return
+            else:
+                # Ответ неправильный — сообщаем и НЕ пересылаем организатору
+                send_later(message.answer("❌ Неправильный ответ. Попробуй ещё раз!"))
+                return
 
     # Пересылка текстового сообщения организатору
-    result = await api_post('message', {
+    result = await post_or_queue('message', {
         'telegram_id': message.from_user.id,
         'text': text,
+        # Ключ идемпотентности: повтор из outbox не создаст второе сообщение
+        'message_id': message.message_id,
     })
 
-    if 'error' not in result:
-        await message.answer("📨 Сообщение передано организатору!")
+    if result.get('queued') and unchecked:
+        send_later(message.answer(
+            "📥 Сервер квеста временно недоступен — сообщение сохранено и уйдёт организатору, "
+            "как только он оживёт. Если это ответ на станцию, отправь его ещё раз через минуту.",
+        ))
+    elif result.get('queued'):
+        send_later(message.answer("📥 Сообщение сохранено и уйдёт организатору, как только сервер станет доступен."))
+    elif 'error' not in result:
+        send_later(message.answer("📨 Сообщение передано организатору!"))
     else:
-        await message.answer("❌ Не удалось отправить сообщение. Попробуй позже.")
+        send_later(message.answer("❌ Не удалось отправить сообщение. Попробуй позже."))
+
+
+STATUS_TEAM = Template("📊 Команда: <b>{team}</b>")
+STATUS_STATION = Template("📍 Станция: {station} из {total}")
+STATUS_LIVES = Template("❤️ Жизни: {lives}")
+
+
+def _status_text(player: Player) -> str:
+    team = players.team(player.team_id)
+    if team is None:
+        return (
+            "📊 Твой статус: <i>ты пока не в команде</i>\n\n"
+            "Дождись, пока организатор добавит тебя — сразу придёт первая подсказка!"
+        )
+
+    lines = [STATUS_TEAM.render(team=team.name)]
+    if team.finished:
+        lines.append("🏁 Все станции пройдены!")
+    elif players.clues_total:
+        lines.append(STATUS_STATION.render(
+            station=min(team.clue_index + 1, players.clues_total), total=players.clues_total,
+        ))
+    lines.append(STATUS_LIVES.render(lives=player.lives))
+    return "\n".join(lines)
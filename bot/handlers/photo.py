@@ -1,31 +1,83 @@
 from aiogram import Router, F
 from aiogram.types import Message
 
-from services.api import api_post
+from services.api import BACKEND_UNAVAILABLE
+from services.media_group import media_groups
+from services.outbox import post_or_queue
+from services.outbound import send_later
+from services.players import players
 
 router = Router()
 
+NOT_IN_TEAM = "⚠️ Ты ещё не в команде. Дождись, пока организатор добавит тебя."
+
 
 @router.message(F.photo)
 async def handle_photo(message: Message):
     """Обработка фото-отчёта от участника."""
-    # Берём самое большое фото (последнее в массиве)
-    file_id = message.photo[-1].file_id
+    # Участника без команды видно по read model — не гоняем фото на бэкенд ради отказа
+    player = players.get(message.from_user.id)
+    if player is not None and player.team_id is None:
+        if message.media_group_id:
+            # На альбом — один ответ, а не по одному на каждое фото
+            media_groups.add(message, _reject_album)
+        else:
+            send_later(message.answer(NOT_IN_TEAM))
+        return
+
+    if message.media_group_id:
+        # Альбом приходит по одному фото на апдейт — собираем и отправляем одним отчётом
+        media_groups.add(message, _submit_album)
+        return
+
+    await _submit(message, [message])
+
+
+async def _reject_album(messages: list[Message]):
+    send_later(messages[0].answer(NOT_IN_TEAM))
+
 
-    result = await api_post('photo', {
-        'telegram_id': message.from_user.id,
-        'file_id': file_id,
-    })
+async def _submit_album(messages: list[Message]):
+    await _submit(messages[0], messages)
 
-    if 'error' in result:
+
+def _clue_index(telegram_id: int) -> int | None:
+    # Станция команды на момент отправки: фото, отложенное в outbox, не должно
+    # попасть на следующую станцию, если команда успеет её открыть
+    player = players.get(telegram_id)
+    team = players.team(player.team_id) if player is not None else None
+    return team.clue_index if team is not None else None
+
+
+async def _submit(message: Message, photos: list[Message]):
+    # message_id — ключ идемпотентности: повтор того же фото бэкенд не запишет дважды.
+    # Берём самое большое фото (последнее в массиве)
+    data = {'telegram_id': message.from_user.id, 'clue_index': _clue_index(message.from_user.id)}
+    if len(photos) == 1:
+        data.update(file_id=photos[0].photo[-1].file_id, message_id=photos[0].message_id)
+        result = await post_or_queue('photo', data)
+        what = "Фото"
+    else:
+        data.update(
+            file_ids=[m.photo[-1].file_id for m in photos],
+            message_ids=[m.message_id for m in photos],
+        )
+        result = await post_or_queue('photo/batch', data)
+        what = f"Фото ({len(photos)} шт.)"
+
+    if result.get('queued'):
+        send_later(message.answer(
+            f"📥 {what} сохранено! Сервер квеста сейчас недоступен — передадим организатору, как только он оживёт.",
+        ))
+    elif 'error' in result:
         error_msg = result['error']
-        if 'не в команде' in error_msg.lower():
-            await message.answer(
-                "⚠️ Ты ещё не в команде. Дождись, пока организатор добавит тебя.",
-            )
+        if error_msg == BACKEND_UNAVAILABLE:
+            send_later(message.answer("⏳ Сервер квеста временно недоступен. Отправь фото ещё раз через минуту."))
+        elif 'не в команде' in error_msg.lower():
+            send_later(message.answer(NOT_IN_TEAM))
         else:
-            await message.answer(f"❌ Ошибка: {error_msg}")
+            send_later(message.answer(f"❌ Ошибка: {error_msg}"))
     else:
-        await message.answer(
-            "✅ Фото принято! Ожидай подтверждения от организатора.",
-        )
+        send_later(message.answer(
+            f"✅ {what} принято! Ожидай подтверждения от организатора.",
+        ))
@@ -1,10 +1,13 @@
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from services.api import api_get, api_post
+from keyboards.main import LEADERBOARD, PROFILE, button
+from rendering import Template
+from services.api import BACKEND_UNAVAILABLE, api_get, api_post
+from services.players import Player, display_name, players
 
 router = Router()
 
@@ -13,11 +16,32 @@ class ProfileStates(StatesGroup):
     waiting_new_name = State()
 
 
-@router.message(F.text.in_(["👤 Профиль", "Профиль"]))
+PROFILE_CARD = Template(
+    "👤 <b>Профиль</b>\n"
+    "━━━━━━━━━━━━━━━━━━\n"
+    "📛 <b>{name}</b>\n"
+    "🚗 Команда: <b>{team}</b>\n\n"
+    "❤️ Жизни: {hearts} ({lives})\n\n"
+)
+TEAMMATES_HEADER = Template("👥 <b>Твоя команда:</b>\n")
+TEAMMATE = Template("  • {name}\n")
+PROFILE_STATS = Template(
+    "📊 <b>Статистика:</b>\n"
+    "  📸 Фото отправлено: {photos}\n"
+    "  💬 Сообщений: {messages}\n"
+    "  🎵 Песен: {songs}\n"
+)
+NAME_CHANGED = Template("✅ Имя изменено на <b>{name}</b>")
+
+
+@router.message(button(PROFILE))
 async def show_profile(message: Message):
     """Показать профиль игрока."""
     result = await api_get('profile', {'telegram_id': message.from_user.id})
 
+    if result.get('error') == BACKEND_UNAVAILABLE:
+        await message.answer("⏳ Сервер квеста временно недоступен. Попробуй через минуту.")
+        return
     if result.get('error'):
         await message.answer("❌ Не удалось загрузить профиль. Попробуй /start")
         return
@@ -29,31 +53,27 @@ async def show_profile(message: Message):
     lives = user.get('lives', 0)
     lives_display = '❤️' * lives + '🖤' * max(0, 1 - lives)
 
-    text = (
-        f"👤 <b>Профиль</b>\n"
-        f"━━━━━━━━━━━━━━━━━━\n"
-        f"📛 <b>{user.get('first_name', 'Без имени')}</b>\n"
-        f"🚗 Команда: <b>{team_name}</b>\n\n"
-        f"❤️ Жизни: {lives_display} ({lives})\n\n"
-    )
+    parts = [PROFILE_CARD.render(
+        name=user.get('first_name', 'Без имени'), team=team_name, hearts=lives_display, lives=lives,
+    )]
 
     # Список участников команды
     teammates = user.get('teammates', [])
     if teammates:
-        text += "👥 <b>Твоя команда:</b>\n"
-        for t in teammates:
-            name = t.get('first_name') or t.get('telegram_username') or '???'
-            text += f"  • {name}\n"
-        text += "\n"
-
-    text += (
-        f"📊 <b>Статистика:</b>\n"
-        f"  📸 Фото отправлено: {stats.get('photos_sent', 0)}\n"
-        f"  💬 Сообщений: {stats.get('messages_sent', 0)}\n"
-        f"  🎵 Песен: {stats.get('songs_added', 0)}\n"
-    )
+        parts.append(TEAMMATES_HEADER.render())
+        parts.extend(
+            TEAMMATE.render(name=t.get('first_name') or t.get('telegram_username') or '???')
+            for t in teammates
+        )
+        parts.append("\n")
+
+    parts.append(PROFILE_STATS.render(
+        photos=stats.get('photos_sent', 0),
+        messages=stats.get('messages_sent', 0),
+        songs=stats.get('songs_added', 0),
+    ))
 
-    await message.answer(text, parse_mode='HTML')
+    await message.answer(''.join(parts), parse_mode='HTML')
 
 
 @router.message(Command("name"))
@@ -78,20 +98,51 @@ async def process_new_name(message: Message, state: FSMContext):
         'first_name': new_name,
     })
 
+    if result.get('error') == BACKEND_UNAVAILABLE:
+        # Состояние не сбрасываем: можно просто прислать имя ещё раз
+        await message.answer("⏳ Сервер квеста временно недоступен. Отправь имя ещё раз через минуту.")
+        return
+
     if result.get('ok'):
-        await message.answer(
-            f"✅ Имя изменено на <b>{result['first_name']}</b>",
-            parse_mode='HTML',
-        )
+        await message.answer(NAME_CHANGED.render(name=result['first_name']), parse_mode='HTML')
     else:
         await message.answer("❌ Не удалось изменить имя. Попробуй /start сначала.")
 
     await state.clear()
 
 
-@router.message(F.text.in_(["🏆 Топ игроков", "Топ игроков"]))
+# Сколько строк топа показывать и сколько соседей вокруг участника ниже топа
+LEADERBOARD_TOP = 10
+LEADERBOARD_NEIGHBOURS = 1
+
+_MEDALS = ['🥇', '🥈', '🥉']
+LEADERBOARD_HEADER = Template("🏆 <b>Топ игроков</b>\n━━━━━━━━━━━━━━━━━━\n\n")
+LEADERBOARD_LINE = Template("{place} <b>{name}</b> — {hearts} | Ур. {level}")
+LEADERBOARD_MY_LINE = Template("👉 {place} <b>{name}</b> — {hearts} | Ур. {level} (ты)")
+MY_PLACE = Template("\n\nТвоё место: <b>{place}</b> из {total}")
+
+
+@router.message(button(LEADERBOARD))
 async def show_leaderboard(message: Message):
-    """Показать таблицу лидеров."""
+    """Показать таблицу лидеров и место самого участника."""
+    ranking = players.ranking
+    if players.ready and len(ranking):
+        # Топ и соседи берутся из локального рейтинга за O(log n), без запроса к бэкенду
+        rows = list(ranking.range(0, LEADERBOARD_TOP))
+        my_rank = ranking.rank(message.from_user.id)
+        if my_rank is not None and my_rank >= LEADERBOARD_TOP:
+            start = max(LEADERBOARD_TOP, my_rank - LEADERBOARD_NEIGHBOURS)
+            if start > LEADERBOARD_TOP:
+                rows.append(None)
+            rows.extend(ranking.range(start, my_rank + LEADERBOARD_NEIGHBOURS + 1))
+        lines = [
+            "…" if row is None else _leaderboard_line(row[0], players.players[row[1]], row[1] == message.from_user.id)
+            for row in rows
+        ]
+        footer = MY_PLACE.render(place=my_rank + 1, total=len(ranking)) if my_rank is not None else ""
+        await message.answer(LEADERBOARD_HEADER.render() + "\n".join(lines) + footer, parse_mode='HTML')
+        return
+
     result = await api_get('leaderboard')
 
     if isinstance(result, dict) and result.get('error'):
@@ -102,19 +153,26 @@ async def show_leaderboard(message: Message):
         await message.answer("📊 Пока нет данных для рейтинга.")
         return
 
-    text = "🏆 <b>Топ игроков</b>\n━━━━━━━━━━━━━━━━━━\n\n"
-
-    medals = ['🥇', '🥈', '🥉']
-    for i, user in enumerate(result[:10]):
-        medal = medals[i] if i < 3 else f"{i + 1}."
-        name = user.get('first_name') or user.get('telegram_username') or '???'
-        lives = user.get('lives', 0)
-        level = user.get('level', 1)
-        lives_hearts = '❤️' * min(lives, 5)
-        if lives > 5:
-            lives_hearts += f"+{lives - 5}"
-
-        # Highlight the current user
-        text += f"{medal} <b>{name}</b> — {lives_hearts} | Ур. {level}\n"
-
-    await message.answer(text, parse_mode='HTML')
+    lines = [
+        _leaderboard_line(
+            i,
+            Player(
+                telegram_id=user.get('telegram_id', 0), user_id=str(user.get('_id', '')),
+                first_name=user.get('first_name') or '', username=user.get('telegram_username') or '',
+                lives=user.get('lives', 0), level=user.get('level', 1),
+            ),
+            user.get('telegram_id') == message.from_user.id,
+        )
+        for i, user in enumerate(result[:LEADERBOARD_TOP])
+    ]
+    await message.answer(LEADERBOARD_HEADER.render() + "\n".join(lines), parse_mode='HTML')
+
+
+def _leaderboard_line(place: int, player: Player, is_me: bool) -> str:
+    medal = _MEDALS[place] if place < 3 else f"{place + 1}."
+    lives_hearts = '❤️' * min(player.lives, 5)
+    if player.lives > 5:
+        lives_hearts += f"+{player.lives - 5}"
+    # Строка самого участника выделяется
+    template = LEADERBOARD_MY_LINE if is_me else LEADERBOARD_LINE
+    return template.render(place=medal, name=display_name(player), hearts=lives_hearts, level=player.level)
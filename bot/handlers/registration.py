@@ -4,8 +4,9 @@ from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from services.api import api_post
+from services.api import BACKEND_UNAVAILABLE, api_post
 from keyboards.main import main_keyboard
+from rendering import Template
 
 router = Router()
 
@@ -14,6 +15,17 @@ class Registration(StatesGroup):
     waiting_name = State()
 
 
+WELCOME = Template(
+    "🎉 Добро пожаловать на квест, <b>{name}</b>!\n\n"
+    "Ты зарегистрирован(а). Скоро тебя добавят в команду и квест начнётся!\n\n"
+    "Пока можешь поделиться геопозицией, чтобы мы видели где ты."
+)
+WELCOME_BACK = Template(
+    "👋 С возвращением, <b>{name}</b>!\n\n"
+    "Ты уже зарегистрирован(а). Жди подсказку от организатора!"
+)
+
+
 @router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext):
     """Обработка команды /start — начало регистрации."""
@@ -24,18 +36,19 @@ async def cmd_start(message: Message, state: FSMContext):
         'first_name': message.from_user.first_name or '',
     })
 
+    if result.get('error') == BACKEND_UNAVAILABLE:
+        await message.answer("⏳ Не удалось связаться с сервером квеста. Попробуй /start через минуту.")
+        return
+
     if result.get('created'):
         await message.answer(
-            f"🎉 Добро пожаловать на квест, <b>{message.from_user.first_name}</b>!\n\n"
-            "Ты зарегистрирован(а). Скоро тебя добавят в команду и квест начнётся!\n\n"
-            "Пока можешь поделиться геопозицией, чтобы мы видели где ты.",
+            WELCOME.render(name=message.from_user.first_name),
             parse_mode='HTML',
             reply_markup=main_keyboard(),
         )
     else:
         await message.answer(
-            f"👋 С возвращением, <b>{message.from_user.first_name}</b>!\n\n"
-            "Ты уже зарегистрирован(а). Жди подсказку от организатора!",
+            WELCOME_BACK.render(name=message.from_user.first_name),
             parse_mode='HTML',
             reply_markup=main_keyboard(),
         )
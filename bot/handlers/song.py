@@ -1,10 +1,15 @@
+from functools import lru_cache
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from services.api import api_post, api_get
-from keyboards.main import main_keyboard
+from services.api import BACKEND_UNAVAILABLE, api_get
+from services.outbox import post_or_queue
+from services.songs import search_tracks
+from keyboards.main import ADD_SONG, MY_SONGS, button, main_keyboard
+from rendering import Markup, Template, split_message
 
 router = Router()
 
@@ -14,28 +19,71 @@ class SongStates(StatesGroup):
     waiting_confirmation = State()
 
 
-def _song_input_text():
-    return (
-        "🎵 Отправь название песни (и исполнителя), и я найду её на Spotify!\n\n"
-        "Например: <i>Imagine Dragons - Believer</i>\n\n"
-        "Для выхода нажми кнопку ниже."
-    )
-
-
+SONG_INPUT = Template(
+    "🎵 Отправь название песни (и исполнителя), и я найду её на Spotify!\n\n"
+    "Например: <i>Imagine Dragons - Believer</i>\n\n"
+    "Для выхода нажми кнопку ниже."
+)
+SEARCH_WAIT = Template("🔍 Ищу на Spotify...")
+SEARCH_WAIT_QUERY = Template("🔍 Ищу на Spotify: <i>{query}</i>...")
+NOT_FOUND = Template(
+    "😕 Не нашёл такую песню на Spotify.\n"
+    "Попробуй написать точнее — например, добавь имя исполнителя."
+)
+NOT_FOUND_QUERY = Template("😕 Не нашёл «{query}» на Spotify.\nПопробуй написать название вручную.")
+ERROR = Template("❌ Ошибка: {message}")
+
+FOUND_ONE = Template("🔍 Нашёл:\n\n")
+FOUND_VARIANT = Template("🔍 Вариант {index} из {total}:\n\n")
+TRACK = Template("🎵 <b>{name}</b>\n🎤 {artist}\n")
+TRACK_LINK = Template("🔗 <a href=\"{url}\">Открыть в Spotify</a>\n")
+QUEUED = Template(
+    "📥 <b>{name}</b> сохранена и попадёт в плейлист, как только сервер квеста станет доступен."
+)
+
+SONGS_EMPTY = Template(
+    "🎵 У тебя пока нет добавленных песен.\n"
+    "Нажми <b>🎵 Добавить песню</b> чтобы добавить!"
+)
+SONGS_HEADER = Template("🎵 <b>Твои песни ({count}):</b>\n\n")
+SONG_LINE = Template("{i}. {name} — {artist}")
+SONG_LINE_LINK = Template("{i}. <a href=\"{url}\">{name}</a> — {artist}")
+
+
+def _track_text(name: str, artist: str, url: str) -> str:
+    text = TRACK.render(name=name, artist=artist)
+    return text + TRACK_LINK.render(url=url) if url else text
+
+
+# Клавиатуры не зависят от участника — собираются один раз
+@lru_cache(maxsize=None)
 def _back_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="song_back")],
     ])
 
 
-def _confirm_kb():
+@lru_cache(maxsize=None)
+def _confirm_kb(has_more: bool = False):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Да, добавить", callback_data="song_confirm")],
-        [InlineKeyboardButton(text="🔍 Искать другую", callback_data="song_retry")],
+        [InlineKeyboardButton(
+            text="➡️ Другой вариант" if has_more else "🔍 Искать другую",
+            callback_data="song_retry",
+        )],
         [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="song_back")],
     ])
 
 
+@lru_cache(maxsize=None)
+def _not_found_kb():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔍 Попробовать снова", callback_data="song_retry")],
+        [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="song_back")],
+    ])
+
+
+@lru_cache(maxsize=None)
 def _after_add_kb():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🎵 Добавить ещё", callback_data="song_another")],
@@ -43,11 +91,11 @@ def _after_add_kb():
     ])
 
 
-@router.message(F.text.in_(["🎵 Добавить песню", "Добавить песню"]))
+@router.message(button(ADD_SONG))
 async def song_button_handler(message: Message, state: FSMContext):
     """Обработка нажатия кнопки 'Добавить песню'."""
     await state.set_state(SongStates.waiting_song)
-    await message.answer(_song_input_text(), parse_mode='HTML', reply_markup=_back_kb())
+    await message.answer(SONG_INPUT.render(), parse_mode='HTML', reply_markup=_back_kb())
 
 
 @router.message(SongStates.waiting_song, F.text == "/cancel")
@@ -65,52 +113,7 @@ async def process_song_text(message: Message, state: FSMContext):
     if song_query.startswith('/'):
         return
 
-    wait_msg = await message.answer("🔍 Ищу на Spotify...")
-
-    result = await api_post('song/search', {
-        'telegram_id': message.from_user.id,
-        'query': song_query,
-    })
-
-    if 'error' in result:
-        error = result['error']
-        if error == 'not_found':
-            await wait_msg.edit_text(
-                "😕 Не нашёл такую песню на Spotify.\n"
-                "Попробуй написать точнее — например, добавь имя исполнителя.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔍 Попробовать снова", callback_data="song_retry")],
-                    [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="song_back")],
-                ]),
-            )
-            await state.set_state(SongStates.waiting_confirmation)
-        else:
-            await wait_msg.edit_text(
-                f"❌ Ошибка: {result.get('message', result.get('error', 'Неизвестная ошибка'))}",
-                reply_markup=_back_kb(),
-            )
-            await state.set_state(SongStates.waiting_confirmation)
-        return
-
-    track = result.get('track', {})
-    name = track.get('name', 'Неизвестно')
-    artist = track.get('artist', '')
-    external_url = track.get('external_url', '')
-
-    # Store track data in FSM for confirmation
-    await state.update_data(track=track)
-    await state.set_state(SongStates.waiting_confirmation)
-
-    text = (
-        f"🔍 Нашёл:\n\n"
-        f"🎵 <b>{name}</b>\n"
-        f"🎤 {artist}\n"
-    )
-    if external_url:
-        text += f"🔗 <a href=\"{external_url}\">Открыть в Spotify</a>\n"
-    text += "\nЭто та песня?"
-
-    await wait_msg.edit_text(text, parse_mode='HTML', disable_web_page_preview=True, reply_markup=_confirm_kb())
+    await _search_and_show(message, state, song_query)
 
 
 @router.message(SongStates.waiting_song, F.audio)
@@ -133,51 +136,54 @@ async def process_song_audio(message: Message, state: FSMContext):
 
     song_query = ' - '.join(parts)
 
-    wait_msg = await message.answer(f"🔍 Ищу на Spotify: <i>{song_query}</i>...", parse_mode='HTML')
+    await _search_and_show(message, state, song_query, from_audio=True)
 
-    result = await api_post('song/search', {
-        'telegram_id': message.from_user.id,
-        'query': song_query,
-    })
+
+async def _search_and_show(message: Message, state: FSMContext, song_query: str, from_audio: bool = False):
+    """Поиск (через общий кэш) и показ первого найденного варианта.
+
+    Запрос из метаданных аудиофайла участник не набирал сам — его показываем в ответах.
+    """
+    wait_text = SEARCH_WAIT_QUERY.render(query=song_query) if from_audio else SEARCH_WAIT.render()
+    wait_msg = await message.answer(wait_text, parse_mode='HTML')
+
+    result = await search_tracks(song_query)
 
     if 'error' in result:
-        error = result['error']
-        if error == 'not_found':
+        # Варианты прошлого поиска больше не актуальны
+        await state.update_data(track=None, added_track=None, tracks=[], track_index=0)
+        await state.set_state(SongStates.waiting_confirmation)
+        if result['error'] == 'not_found':
             await wait_msg.edit_text(
-                f"😕 Не нашёл «{song_query}» на Spotify.\n"
-                "Попробуй написать название вручную.",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔍 Попробовать снова", callback_data="song_retry")],
-                    [InlineKeyboardButton(text="🔙 Назад в меню", callback_data="song_back")],
-                ]),
+                NOT_FOUND_QUERY.render(query=song_query) if from_audio else NOT_FOUND.render(),
+                parse_mode='HTML',
+                reply_markup=_not_found_kb(),
             )
-            await state.set_state(SongStates.waiting_confirmation)
         else:
             await wait_msg.edit_text(
-                f"❌ Ошибка: {result.get('message', result.get('error', 'Неизвестная ошибка'))}",
+                ERROR.render(message=result.get('message', result.get('error', 'Неизвестная ошибка'))),
+                parse_mode='HTML',
                 reply_markup=_back_kb(),
             )
-            await state.set_state(SongStates.waiting_confirmation)
         return
 
-    track = result.get('track', {})
-    name = track.get('name', 'Неизвестно')
-    artist = track.get('artist', '')
-    external_url = track.get('external_url', '')
+    tracks = result['tracks']
 
-    await state.update_data(track=track)
+    # Все варианты лежат в FSM — «Другой вариант» листает их без нового поиска
+    await state.update_data(track=tracks[0], added_track=None, tracks=tracks, track_index=0)
     await state.set_state(SongStates.waiting_confirmation)
 
-    text = (
-        f"🔍 Нашёл:\n\n"
-        f"🎵 <b>{name}</b>\n"
-        f"🎤 {artist}\n"
+    await wait_msg.edit_text(
+        _found_text(tracks, 0), parse_mode='HTML', disable_web_page_preview=True,
+        reply_markup=_confirm_kb(has_more=len(tracks) > 1),
     )
-    if external_url:
-        text += f"🔗 <a href=\"{external_url}\">Открыть в Spotify</a>\n"
-    text += "\nЭто та песня?"
 
-    await wait_msg.edit_text(text, parse_mode='HTML', disable_web_page_preview=True, reply_markup=_confirm_kb())
+
+def _found_text(tracks: list, index: int) -> str:
+    track = tracks[index]
+    head = FOUND_ONE.render() if len(tracks) == 1 else FOUND_VARIANT.render(index=index + 1, total=len(tracks))
+    body = _track_text(track.get('name', 'Неизвестно'), track.get('artist', ''), track.get('external_url', ''))
+    return head + body + "\nЭто та песня?"
 
 
 # ---- Callback handlers ----
@@ -188,6 +194,10 @@ async def confirm_song(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     track = data.get('track')
 
+    if not track and data.get('added_track'):
+        # Повторное нажатие: апдейты участника идут по очереди, первое уже забрало трек
+        await callback.answer()
+        return
     if not track:
         await callback.answer("❌ Песня не найдена, попробуй заново", show_alert=True)
         await state.clear()
@@ -196,11 +206,25 @@ async def confirm_song(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await callback.message.edit_text("⏳ Добавляю в плейлист...")
 
-    result = await api_post('song', {
+    result = await post_or_queue('song', {
         'telegram_id': callback.from_user.id,
         'track': track,
     })
 
+    if result.get('queued') or result.get('error') in (None, 'duplicate'):
+        # Трек забирается только принятый: апдейты участника идут по очереди,
+        # и повторное нажатие увидит уже added_track
+        await state.update_data(track=None, added_track=track)
+
+    if result.get('queued'):
+        await callback.message.edit_text(
+            QUEUED.render(name=track.get('name', 'Песня')),
+            parse_mode='HTML',
+            reply_markup=_after_add_kb(),
+        )
+        await state.set_state(SongStates.waiting_confirmation)
+        return
+
     if 'error' in result:
         error = result['error']
         if error == 'duplicate':
@@ -209,25 +233,22 @@ async def confirm_song(callback: CallbackQuery, state: FSMContext):
                 reply_markup=_after_add_kb(),
             )
         else:
+            # Трек остаётся в FSM — «Да, добавить» отправит его ещё раз
+            has_more = data.get('track_index', 0) + 1 < len(data.get('tracks') or [])
             await callback.message.edit_text(
-                f"❌ Ошибка: {result.get('message', result.get('error', 'Неизвестная ошибка'))}",
-                reply_markup=_after_add_kb(),
+                ERROR.render(message=result.get('message', result.get('error', 'Неизвестная ошибка'))),
+                parse_mode='HTML',
+                reply_markup=_confirm_kb(has_more=has_more),
             )
         await state.set_state(SongStates.waiting_confirmation)
         return
 
     song = result.get('song', {})
-    name = song.get('name', track.get('name', 'Неизвестно'))
-    artist = song.get('artist', track.get('artist', ''))
-    external_url = song.get('external_url', track.get('external_url', ''))
-
-    text = (
-        f"✅ Песня добавлена в плейлист!\n\n"
-        f"🎵 <b>{name}</b>\n"
-        f"🎤 {artist}\n"
+    text = "✅ Песня добавлена в плейлист!\n\n" + _track_text(
+        song.get('name', track.get('name', 'Неизвестно')),
+        song.get('artist', track.get('artist', '')),
+        song.get('external_url', track.get('external_url', '')),
     )
-    if external_url:
-        text += f"🔗 <a href=\"{external_url}\">Открыть в Spotify</a>\n"
 
     await callback.message.edit_text(
         text, parse_mode='HTML', disable_web_page_preview=True,
@@ -238,18 +259,34 @@ async def confirm_song(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "song_retry")
 async def retry_song(callback: CallbackQuery, state: FSMContext):
-    """Искать другую песню."""
+    """Показать следующий найденный вариант, а если их не осталось — искать другую песню."""
+    data = await state.get_data()
+    tracks = data.get('tracks') or []
+    index = data.get('track_index', 0) + 1
+
+    if index < len(tracks):
+        await callback.answer()
+        await state.update_data(track=tracks[index], added_track=None, track_index=index)
+        await callback.message.edit_text(
+            _found_text(tracks, index), parse_mode='HTML', disable_web_page_preview=True,
+            reply_markup=_confirm_kb(has_more=index + 1 < len(tracks)),
+        )
+        return
+
     await callback.answer()
+    await state.update_data(track=None, added_track=None)
     await state.set_state(SongStates.waiting_song)
-    await callback.message.edit_text(_song_input_text(), parse_mode='HTML', reply_markup=_back_kb())
+    await callback.message.edit_text(SONG_INPUT.render(), parse_mode='HTML', reply_markup=_back_kb())
 
 
 @router.callback_query(F.data == "song_another")
 async def another_song(callback: CallbackQuery, state: FSMContext):
     """Добавить ещё одну песню."""
     await callback.answer()
+    # Прошлая песня добавлена — сценарий начинается заново
+    await state.update_data(track=None, added_track=None)
     await state.set_state(SongStates.waiting_song)
-    await callback.message.edit_text(_song_input_text(), parse_mode='HTML', reply_markup=_back_kb())
+    await callback.message.edit_text(SONG_INPUT.render(), parse_mode='HTML', reply_markup=_back_kb())
 
 
 @router.callback_query(F.data == "song_back")
@@ -261,11 +298,14 @@ async def back_to_menu(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer("Главное меню:", reply_markup=main_keyboard())
 
 
-@router.message(F.text.in_(["📋 Мои песни", "Мои песни"]))
+@router.message(button(MY_SONGS))
 async def my_songs_handler(message: Message):
     """Показать список добавленных песен."""
     result = await api_get('songs', {'telegram_id': message.from_user.id})
 
+    if result.get('error') == BACKEND_UNAVAILABLE:
+        await message.answer("⏳ Сервер квеста временно недоступен. Попробуй через минуту.")
+        return
     if 'error' in result:
         await message.answer("❌ Сначала зарегистрируйся командой /start")
         return
@@ -274,21 +314,18 @@ async def my_songs_handler(message: Message):
     count = result.get('count', 0)
 
     if count == 0:
-        await message.answer(
-            "🎵 У тебя пока нет добавленных песен.\n"
-            "Нажми <b>🎵 Добавить песню</b> чтобы добавить!",
-            parse_mode='HTML',
-        )
+        await message.answer(SONGS_EMPTY.render(), parse_mode='HTML')
         return
 
-    text = f"🎵 <b>Твои песни ({count}):</b>\n\n"
-    for i, song in enumerate(songs, 1):
-        name = song.get('name', '?')
-        artist = song.get('artist', '?')
-        url = song.get('external_url', '')
-        if url:
-            text += f"{i}. <a href=\"{url}\">{name}</a> — {artist}\n"
-        else:
-            text += f"{i}. {name} — {artist}\n"
+    # Длинный список уходит несколькими сообщениями — у Telegram предел 4096 символов
+    for text in split_message(render_songs(songs), header=SONGS_HEADER.render(count=count)):
+        await message.answer(text, parse_mode='HTML', disable_web_page_preview=True)
+
 
-    await message.answer(text, parse_mode='HTML', disable_web_page_preview=True)
+def render_songs(songs: list[dict]) -> list[Markup]:
+    return [
+        SONG_LINE_LINK.render(i=i, url=song['external_url'], name=song.get('name', '?'), artist=song.get('artist', '?'))
+        if song.get('external_url') else
+        SONG_LINE.render(i=i, name=song.get('name', '?'), artist=song.get('artist', '?'))
+        for i, song in enumerate(songs, 1)
+    ]
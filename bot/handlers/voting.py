@@ -1,100 +1,202 @@
 from aiogram import Router, F
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from services.api import api_get, api_post
+from keyboards.main import VOTE, button, resolve_button
+from rendering import Template
+from services.api import BACKEND_UNAVAILABLE, api_get
+from services.voting import Candidate, get_candidates, paginate, vote_batcher
 
 router = Router()
 
+BEST = 'b'
+WORST = 'w'
+CATEGORIES = {BEST: 'best', WORST: 'worst'}
+
+# Действия кнопок голосования
+PICK = 'c'
+PAGE = 'p'
+SKIP = 's'
+SEARCH = 'f'
+RESET_SEARCH = 'x'
+NOOP = 'n'
+
+
+class VoteCallback(CallbackData, prefix='vt'):
+    """Компактный callback_data кнопок голосования, например «vt:c:b:65f1…»."""
+    action: str
+    category: str
+    value: str = ''
+
 
 class VotingState(StatesGroup):
     choosing_best = State()
     choosing_worst = State()
+    searching = State()
 
 
-@router.message(F.text.in_(["🗳 Голосовать", "Голосовать"]))
+_PROMPTS = {
+    BEST: "🏆 Выбери <b>лучшего</b> игрока:",
+    WORST: "👎 Теперь выбери <b>худшего</b> игрока:",
+}
+VOTING_TITLE = Template("🗳 <b>{title}</b>\n\n")
+SEARCH_FOUND = Template("🔎 «{query}»: найдено {found}.\n\n")
+SEARCH_EMPTY = Template("😕 По запросу «{query}» никого нет.\n\n")
+
+
+@router.message(button(VOTE))
 async def start_voting(message: Message, state: FSMContext):
     """Начать процесс голосования."""
     # Проверяем, есть ли активное голосование
     result = await api_get('voting/active')
+    if result.get('error') == BACKEND_UNAVAILABLE:
+        await message.answer("⏳ Сервер квеста временно недоступен. Попробуй через минуту.")
+        return
     voting = result.get('voting')
 
     if not voting:
         await message.answer("❌ Сейчас нет активного голосования.")
         return
 
-    # Получаем кандидатов
-    candidates = await api_get('voting/candidates', {'telegram_id': message.from_user.id})
-    if not candidates or len(candidates) == 0:
+    # Кандидаты общие на всё голосование и берутся из кэша
+    candidates = await get_candidates(voting['_id'])
+    if candidates is None:
+        await message.answer("⏳ Сервер квеста временно недоступен. Попробуй через минуту.")
+        return
+    if not paginate(candidates, 0, exclude_telegram_id=message.from_user.id).total:
         await message.answer("❌ Нет доступных кандидатов для голосования.")
         return
 
-    # Сохраняем данные
-    await state.update_data(
-        voting_id=voting['_id'],
-        candidates=candidates,
-    )
+    # Кто уже голосовал, бот знает сам — повторные голоса не доходят до бэкенда
+    await vote_batcher.prepare(voting['_id'])
+    if all(vote_batcher.has_voted(voting['_id'], message.from_user.id, c) for c in CATEGORIES.values()):
+        await message.answer("✅ Ты уже проголосовал в обеих категориях. Жди результатов!")
+        return
+
+    # В FSM только идентификатор голосования и строка поиска — не список кандидатов
+    await state.set_data({'voting_id': voting['_id'], 'query': ''})
 
-    # Показываем кнопки для "Лучший игрок"
-    keyboard = _build_candidates_keyboard(candidates, 'best')
     await message.answer(
-        f"🗳 <b>{voting['title']}</b>\n\n"
-        f"🏆 Выбери <b>лучшего</b> игрока:",
+        VOTING_TITLE.render(title=voting['title']) + _PROMPTS[BEST],
         parse_mode='HTML',
-        reply_markup=keyboard,
+        reply_markup=_build_candidates_keyboard(candidates, BEST, 0, message.from_user.id),
     )
     await state.set_state(VotingState.choosing_best)
 
 
-@router.callback_query(F.data.startswith("vote_best_"))
-async def handle_vote_best(callback: CallbackQuery, state: FSMContext):
-    """Обработка голоса за лучшего игрока."""
-    candidate_id = callback.data.replace("vote_best_", "")
-
-    result = await api_post('voting/vote', {
-        'telegram_id': callback.from_user.id,
-        'candidate_id': candidate_id,
-        'category': 'best',
-    })
+@router.callback_query(VoteCallback.filter(F.action == PICK))
+async def handle_vote(callback: CallbackQuery, callback_data: VoteCallback, state: FSMContext):
+    """Обработка голоса за лучшего или худшего игрока."""
+    category = callback_data.category
+    who = "лучшего" if category == BEST else "худшего"
+    data = await state.get_data()
+    voting_id = data.get('voting_id')
+    if not voting_id:
+        await callback.answer("Голосование уже закончилось.", show_alert=True)
+        return
 
-    if result.get('error') == 'already_voted':
-        await callback.answer("Ты уже голосовал за лучшего!", show_alert=True)
-    elif result.get('error'):
-        await callback.answer(f"Ошибка: {result.get('message', result['error'])}", show_alert=True)
+    # Голос уходит на бэкенд пачкой через VOTE_BATCH_WINDOW, отвечаем сразу
+    if vote_batcher.submit(voting_id, callback.from_user.id, callback_data.value, CATEGORIES[category]):
+        await callback.answer(f"✅ Голос за {who} принят!")
     else:
-        await callback.answer("✅ Голос за лучшего принят!")
+        await callback.answer(f"Ты уже голосовал за {who}!", show_alert=True)
+
+    await _next_category(callback, state, category)
+
+
+@router.callback_query(VoteCallback.filter(F.action == SKIP))
+async def handle_vote_skip(callback: CallbackQuery, callback_data: VoteCallback, state: FSMContext):
+    """Пропустить текущую категорию."""
+    await callback.answer("Пропущено")
+    await _next_category(callback, state, callback_data.category)
+
+
+@router.callback_query(VoteCallback.filter(F.action == PAGE))
+async def handle_vote_page(callback: CallbackQuery, callback_data: VoteCallback, state: FSMContext):
+    """Листание списка кандидатов."""
+    await callback.answer()
+    await _show_page(callback, state, callback_data.category, int(callback_data.value or 0))
+
+
+@router.callback_query(VoteCallback.filter(F.action == SEARCH))
+async def handle_vote_search(callback: CallbackQuery, callback_data: VoteCallback, state: FSMContext):
+    """Попросить имя для поиска кандидата."""
+    await callback.answer()
+    await state.update_data(category=callback_data.category)
+    await state.set_state(VotingState.searching)
+    await callback.message.answer("🔎 Напиши имя (или часть имени) игрока:")
+
+
+@router.callback_query(VoteCallback.filter(F.action == RESET_SEARCH))
+async def handle_vote_reset_search(callback: CallbackQuery, callback_data: VoteCallback, state: FSMContext):
+    """Сбросить поиск и показать всех кандидатов."""
+    await callback.answer()
+    await state.update_data(query='')
+    await _show_page(callback, state, callback_data.category, 0)
+
+
+@router.callback_query(VoteCallback.filter(F.action == NOOP))
+async def handle_vote_noop(callback: CallbackQuery):
+    await callback.answer()
+
 
-    # Теперь голосуем за худшего
+@router.callback_query(F.data.startswith("vote_best_") | F.data.startswith("vote_worst_") | (F.data == "vote_skip"))
+async def handle_legacy_vote(callback: CallbackQuery):
+    """Кнопки из сообщений, отправленных до смены формата callback_data."""
+    await callback.answer("Голосование обновилось, открой его заново через меню.", show_alert=True)
+
+
+@router.message(VotingState.searching, F.text & ~F.text.startswith('/') & ~F.text.func(resolve_button))
+async def process_vote_search(message: Message, state: FSMContext):
+    """Показать кандидатов, подходящих под введённое имя."""
     data = await state.get_data()
-    candidates = data.get('candidates', [])
+    category = data.get('category', BEST)
+    candidates = await get_candidates(data.get('voting_id', ''))
+    if candidates is None:
+        await message.answer("⏳ Сервер квеста временно недоступен. Попробуй через минуту.")
+        return
 
-    keyboard = _build_candidates_keyboard(candidates, 'worst')
-    await callback.message.edit_text(
-        "👎 Теперь выбери <b>худшего</b> игрока:",
+    query = message.text.strip()
+    await state.update_data(query=query)
+    await state.set_state(VotingState.choosing_best if category == BEST else VotingState.choosing_worst)
+
+    found = paginate(candidates, 0, exclude_telegram_id=message.from_user.id, query=query).total
+    text = SEARCH_FOUND.render(query=query, found=found) if found else SEARCH_EMPTY.render(query=query)
+    await message.answer(
+        text + _PROMPTS[category],
         parse_mode='HTML',
-        reply_markup=keyboard,
+        reply_markup=_build_candidates_keyboard(candidates, category, 0, message.from_user.id, query),
     )
-    await state.set_state(VotingState.choosing_worst)
 
 
-@router.callback_query(F.data.startswith("vote_worst_"))
-async def handle_vote_worst(callback: CallbackQuery, state: FSMContext):
-    """Обработка голоса за худшего игрока."""
-    candidate_id = callback.data.replace("vote_worst_", "")
+async def _show_page(callback: CallbackQuery, state: FSMContext, category: str, page: int):
+    data = await state.get_data()
+    candidates = await get_candidates(data.get('voting_id', ''))
+    if candidates is None:
+        await callback.message.edit_text("⏳ Сервер квеста временно недоступен. Попробуй через минуту.")
+        return
+    await callback.message.edit_reply_markup(
+        reply_markup=_build_candidates_keyboard(
+            candidates, category, page, callback.from_user.id, data.get('query', ''),
+        ),
+    )
 
-    result = await api_post('voting/vote', {
-        'telegram_id': callback.from_user.id,
-        'candidate_id': candidate_id,
-        'category': 'worst',
-    })
 
-    if result.get('error') == 'already_voted':
-        await callback.answer("Ты уже голосовал за худшего!", show_alert=True)
-    elif result.get('error'):
-        await callback.answer(f"Ошибка: {result.get('message', result['error'])}", show_alert=True)
-    else:
-        await callback.answer("✅ Голос за худшего принят!")
+async def _next_category(callback: CallbackQuery, state: FSMContext, category: str):
+    """После лучшего — к худшему, после худшего — завершить голосование."""
+    if category == BEST:
+        data = await state.get_data()
+        candidates = await get_candidates(data.get('voting_id', '')) or []
+        await state.update_data(query='')
+        await callback.message.edit_text(
+            _PROMPTS[WORST],
+            parse_mode='HTML',
+            reply_markup=_build_candidates_keyboard(candidates, WORST, 0, callback.from_user.id),
+        )
+        await state.set_state(VotingState.choosing_worst)
+        return
 
     await callback.message.edit_text(
         "🎉 Спасибо за участие в голосовании!\n"
@@ -104,47 +206,50 @@ async def handle_vote_worst(callback: CallbackQuery, state: FSMContext):
     await state.clear()
 
 
-@router.callback_query(F.data == "vote_skip")
-async def handle_vote_skip(callback: CallbackQuery, state: FSMContext):
-    """Пропустить текущую категорию."""
-    current_state = await state.get_state()
-
-    if current_state == VotingState.choosing_best.state:
-        # Пропустили лучшего, переходим к худшему
-        data = await state.get_data()
-        candidates = data.get('candidates', [])
-        keyboard = _build_candidates_keyboard(candidates, 'worst')
-        await callback.message.edit_text(
-            "👎 Выбери <b>худшего</b> игрока:",
-            parse_mode='HTML',
-            reply_markup=keyboard,
-        )
-        await state.set_state(VotingState.choosing_worst)
-        await callback.answer("Пропущено")
-    else:
-        await callback.message.edit_text(
-            "🎉 Спасибо за участие в голосовании!\n"
-            "Результаты будут объявлены после завершения.",
-            parse_mode='HTML',
-        )
-        await state.clear()
-        await callback.answer("Пропущено")
-
-
-def _build_candidates_keyboard(candidates: list, category: str) -> InlineKeyboardMarkup:
-    """Построить inline-клавиатуру со списком кандидатов."""
-    buttons = []
-    for c in candidates:
-        name = c.get('first_name') or c.get('telegram_username') or str(c.get('telegram_id', '?'))
-        buttons.append([
-            InlineKeyboardButton(
-                text=name,
-                callback_data=f"vote_{category}_{c['_id']}",
-            )
-        ])
+def _build_candidates_keyboard(
+    candidates: list[Candidate],
+    category: str,
+    page: int,
+    voter_telegram_id: int,
+    query: str = '',
+) -> InlineKeyboardMarkup:
+    """Построить inline-клавиатуру с одной страницей кандидатов."""
+    result = paginate(candidates, page, exclude_telegram_id=voter_telegram_id, query=query)
+
+    buttons = [
+        [InlineKeyboardButton(
+            text=c.name,
+            callback_data=VoteCallback(action=PICK, category=category, value=c.id).pack(),
+        )]
+        for c in result.items
+    ]
+
+    if result.pages > 1:
+        nav = []
+        if result.page > 0:
+            nav.append(InlineKeyboardButton(
+                text="◀️", callback_data=VoteCallback(action=PAGE, category=category, value=str(result.page - 1)).pack(),
+            ))
+        nav.append(InlineKeyboardButton(
+            text=f"{result.page + 1}/{result.pages}", callback_data=VoteCallback(action=NOOP, category=category).pack(),
+        ))
+        if result.page < result.pages - 1:
+            nav.append(InlineKeyboardButton(
+                text="▶️", callback_data=VoteCallback(action=PAGE, category=category, value=str(result.page + 1)).pack(),
+            ))
+        buttons.append(nav)
+
+    if query:
+        buttons.append([InlineKeyboardButton(
+            text="✖️ Сбросить поиск", callback_data=VoteCallback(action=RESET_SEARCH, category=category).pack(),
+        )])
+    elif result.pages > 1:
+        buttons.append([InlineKeyboardButton(
+            text="🔎 Найти по имени", callback_data=VoteCallback(action=SEARCH, category=category).pack(),
+        )])
 
     buttons.append([
-        InlineKeyboardButton(text="⏭ Пропустить", callback_data="vote_skip")
+        InlineKeyboardButton(text="⏭ Пропустить", callback_data=VoteCallback(action=SKIP, category=category).pack())
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -1,34 +1,116 @@
+import re
+from functools import lru_cache
+
+from aiogram import F
 from aiogram.types import (
     ReplyKeyboardMarkup,
     KeyboardButton,
     ReplyKeyboardRemove,
 )
 
+# Тексты кнопок главного меню — единственное место, где они записаны
+BTN_PHOTO = "📸 Отправить фото"
+BTN_LOCATION = "📍 Поделиться геопозицией"
+BTN_ADD_SONG = "🎵 Добавить песню"
+BTN_MY_SONGS = "📋 Мои песни"
+BTN_PROFILE = "👤 Профиль"
+BTN_LEADERBOARD = "🏆 Топ игроков"
+BTN_VOTE = "🗳 Голосовать"
+BTN_STATUS = "ℹ️ Мой статус"
+
+# Действия, в которые превращается текст кнопки
+PHOTO = 'photo'
+LOCATION = 'location'
+ADD_SONG = 'add_song'
+MY_SONGS = 'my_songs'
+PROFILE = 'profile'
+LEADERBOARD = 'leaderboard'
+VOTE = 'vote'
+STATUS = 'status'
+RENAME = 'rename'
+
+BUTTONS = {
+    BTN_PHOTO: PHOTO,
+    BTN_LOCATION: LOCATION,
+    BTN_ADD_SONG: ADD_SONG,
+    BTN_MY_SONGS: MY_SONGS,
+    BTN_PROFILE: PROFILE,
+    BTN_LEADERBOARD: LEADERBOARD,
+    BTN_VOTE: VOTE,
+    BTN_STATUS: STATUS,
+}
+
+_EMOJI_RE = re.compile(
+    r'[\U0001F000-\U0001FFFF\u2600-\u27BF\uFE0F\u200D\u20E3\u2702-\u27B0\u24C2'
+    r'\U0001F1E0-\U0001F1FF\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF'
+    r'\u2139\u2194-\u21AA\u231A-\u231B\u23E9-\u23F3\u23F8-\u23FA\u25AA-\u25FE'
+    r'\u2600-\u26FF\u2700-\u27BF\u2934-\u2935\u2B05-\u2B07\u2B1B-\u2B1C\u2B50\u2B55'
+    r'\u3030\u303D\u3297\u3299\uFE0F\u200D]+',
+    flags=re.UNICODE,
+)
+
+
+def normalize_button_text(text: str) -> str:
+    """Текст кнопки без эмодзи, пробелов по краям и регистра."""
+    return _EMOJI_RE.sub('', text).strip().lower()
+
+
+# Кнопку могут набрать руками без иконки — такие тексты тоже узнаём
+_NORMALIZED = {normalize_button_text(text): action for text, action in BUTTONS.items()}
+# Старая кнопка, которой больше нет в меню: текст не пересылаем организатору
+_NORMALIZED["изменить имя"] = RENAME
+
+# Текст длиннее самой длинной кнопки (с запасом на лишние эмодзи) кнопкой быть не может
+_MAX_BUTTON_LEN = max(len(text) for text in BUTTONS) + 8
+
+
+@lru_cache(maxsize=4096)
+def _resolve_slow(text: str) -> str | None:
+    return _NORMALIZED.get(normalize_button_text(text))
+
+
+def resolve_button(text: str | None) -> str | None:
+    """Действие кнопки по тексту сообщения или None, если это не кнопка."""
+    if not text:
+        return None
+    # Быстрый путь: нажатие кнопки присылает её текст как есть
+    action = BUTTONS.get(text)
+    if action is not None or len(text) > _MAX_BUTTON_LEN:
+        return action
+    return _resolve_slow(text)
+
+
+def button(action: str):
+    """Фильтр хендлера по действию кнопки: @router.message(button(VOTE))."""
+    return F.text.func(resolve_button) == action
+
 
+@lru_cache(maxsize=None)
 def main_keyboard() -> ReplyKeyboardMarkup:
-    """Основная клавиатура после регистрации."""
+    """Основная клавиатура после регистрации (одна на всех — собирается один раз)."""
     return ReplyKeyboardMarkup(
         keyboard=[
             [
-                KeyboardButton(text="📸 Отправить фото"),
-                KeyboardButton(text="📍 Поделиться геопозицией", request_location=True),
+                KeyboardButton(text=BTN_PHOTO),
+                KeyboardButton(text=BTN_LOCATION, request_location=True),
             ],
             [
-                KeyboardButton(text="🎵 Добавить песню"),
-                KeyboardButton(text="📋 Мои песни"),
+                KeyboardButton(text=BTN_ADD_SONG),
+                KeyboardButton(text=BTN_MY_SONGS),
             ],
             [
-                KeyboardButton(text="👤 Профиль"),
-                KeyboardButton(text="🏆 Топ игроков"),
+                KeyboardButton(text=BTN_PROFILE),
+                KeyboardButton(text=BTN_LEADERBOARD),
             ],
             [
-                KeyboardButton(text="🗳 Голосовать"),
-                KeyboardButton(text="ℹ️ Мой статус"),
+                KeyboardButton(text=BTN_VOTE),
+                KeyboardButton(text=BTN_STATUS),
             ],
         ],
         resize_keyboard=True,
     )
 
 
+@lru_cache(maxsize=None)
 def remove_keyboard() -> ReplyKeyboardRemove:
     return ReplyKeyboardRemove()
@@ -1,12 +1,57 @@
 import asyncio
 import logging
+import os
+import secrets
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    MAX_CONCURRENT_UPDATES,
+    LANE_INTERACTIVE_WORKERS,
+    LANE_MEDIA_WORKERS,
+    LANE_TELEMETRY_WORKERS,
+    LANE_TELEMETRY_QUEUE,
+    BACKLOG_POLICY,
+    FSM_STORAGE,
+    FSM_DB_PATH,
+    OUTBOX_PATH,
+    BOT_WORKERS,
+    THROTTLE_ENABLED,
+    OUTBOUND_GLOBAL_RATE,
+    METRICS_ENABLED,
+    METRICS_HOST,
+    METRICS_PORT,
+)
 from handlers import registration, photo, location, messages, song, voting, profile
+from middlewares.concurrency import INTERACTIVE, MEDIA, TELEMETRY, ConcurrencyLimitMiddleware
+from middlewares.dedup import DedupMiddleware
+from middlewares.metrics import HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from middlewares.throttling import ThrottlingMiddleware
+from services import metrics
+from services.api import BackendClient, set_client
+from services.backlog import take_backlog
+from services.geofence import geofences
+from services.location import aggregator as location_aggregator
+from services.media_group import media_groups
+from services.outbound import OutboundScheduler, drain as drain_outbound
+from services.outbox import outbox
+from services.players import backend_events
+from services.storage import SQLiteStorage
+from services.voting import vote_batcher
 
 logging.basicConfig(
     level=logging.INFO,
@@ -14,17 +59,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ALLOWED_UPDATES = [
+    'message',
+    'edited_message',
+    'callback_query',
+]
 
-async def main():
-    if not BOT_TOKEN:
-        logger.error("BOT_TOKEN не задан! Укажи его в .env файле.")
-        return
 
+def create_bot() -> Bot:
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher()
+    # Все исходящие запросы идут через планировщик с лимитами Telegram;
+    # общий лимит делится между процессами-воркерами
+    scheduler = OutboundScheduler(global_rate=OUTBOUND_GLOBAL_RATE / max(1, BOT_WORKERS))
+    bot.session.middleware(scheduler)
+    metrics.gauge('bot_outbound_queued', 'Исходящие запросы в ожидании слота', function=lambda: scheduler.queued)
+    metrics.counter('bot_outbound_retries_total', 'Повторы после Telegram 429', function=lambda: scheduler.retries)
+    return bot
+
+
+def worker_path(path: str, worker: int | None) -> str:
+    # У каждого воркера свой файл: пользователь всегда попадает в один и тот же воркер
+    if worker is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{worker}{ext}"
+
+
+def create_storage(worker: int | None = None) -> BaseStorage:
+    if FSM_STORAGE == 'sqlite':
+        return SQLiteStorage(path=worker_path(FSM_DB_PATH, worker))
+    return MemoryStorage()
+
+
+def create_dispatcher(storage: BaseStorage | None = None) -> Dispatcher:
+    # Хранилище FSM закрывается (и сбрасывается на диск) самим Dispatcher при остановке
+    dp = Dispatcher(storage=storage or create_storage())
+
+    if METRICS_ENABLED:
+        dp.update.outer_middleware(UpdateMetricsMiddleware())
+        handler_metrics = HandlerMetricsMiddleware()
+        dp.message.middleware(handler_metrics)
+        dp.edited_message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
+
+    # Повторы и устаревшие апдейты отсекаются до того, как займут слот обработки
+    dp.update.outer_middleware(DedupMiddleware())
+
+    # Апдейты участника — строго по очереди, разные участники — параллельно до лимита;
+    # интерактив, медиа и live-location идут своими полосами, интерактив — первым
+    scheduler = ConcurrencyLimitMiddleware(
+        MAX_CONCURRENT_UPDATES,
+        workers={
+            INTERACTIVE: LANE_INTERACTIVE_WORKERS,
+            MEDIA: LANE_MEDIA_WORKERS,
+            TELEMETRY: LANE_TELEMETRY_WORKERS,
+        },
+        queues={TELEMETRY: LANE_TELEMETRY_QUEUE},
+    )
+    dp.update.outer_middleware(scheduler)
+    metrics.gauge(
+        'bot_scheduler_waiting_user', 'Апдейты, ждущие предыдущих апдейтов того же участника',
+        function=lambda: scheduler.waiting_user,
+    )
+    metrics.gauge(
+        'bot_scheduler_waiting_slot', 'Апдейты, ждущие слота своей полосы или MAX_CONCURRENT_UPDATES',
+        function=lambda: scheduler.waiting_slot,
+    )
+    metrics.gauge('bot_scheduler_active', 'Апдейты в обработке планировщиком', function=lambda: scheduler.active)
+    metrics.gauge(
+        'bot_scheduler_lane_waiting', 'Апдейты, ждущие слота, по полосам', ('lane',),
+        function=scheduler.lane_waiting,
+    )
+    metrics.gauge(
+        'bot_scheduler_lane_active', 'Апдейты в обработке по полосам', ('lane',),
+        function=scheduler.lane_active,
+    )
+    metrics.gauge('bot_scheduler_users', 'Участники с апдейтами в работе', function=lambda: scheduler.users)
+    metrics.gauge(
+        'bot_scheduler_longest_queue', 'Самая длинная очередь апдейтов одного участника',
+        function=lambda: scheduler.longest_queue,
+    )
+
+    if THROTTLE_ENABLED:
+        # Один экземпляр на все типы апдейтов — общие корзины и счётчики
+        throttling = ThrottlingMiddleware()
+        dp.message.outer_middleware(throttling)
+        dp.edited_message.outer_middleware(throttling)
+        dp.callback_query.outer_middleware(throttling)
+        metrics.counter(
+            'bot_throttled_updates_total', 'Апдейты, прошедшие через троттлинг', ('category', 'action'),
+            function=lambda: dict(throttling.stats),
+        )
 
     # Регистрация роутеров (порядок важен!)
     dp.include_router(registration.router)
@@ -35,15 +163,126 @@ async def main():
     dp.include_router(location.router)
     dp.include_router(messages.router)  # текст — в конце, как fallback
 
+    return dp
+
+
+async def start_services(worker: int | None = None) -> BackendClient:
+    if METRICS_ENABLED:
+        await metrics.start_server(METRICS_HOST, METRICS_PORT + (worker or 0))
+
+    # Общий HTTP-клиент к бэкенду для всех хендлеров
+    backend = BackendClient()
+    set_client(backend)
+
+    # Индекс участников и команд по событиям бэкенда — для ответов без запросов к нему
+    await backend_events.start()
+
+    # Записи, которые бэкенд не принял из-за простоя, ждут на диске и отправляются заново
+    await outbox.start(worker_path(OUTBOX_PATH, worker))
+
+    # Live-location копится в памяти и уходит на бэкенд пачками
+    location_aggregator.start()
+    # Вход/выход участников в геозоны станций определяется здесь же, по каждой точке
+    geofences.start()
+    return backend
+
+
+async def stop_services(backend: BackendClient):
+    await media_groups.stop()
+    await location_aggregator.stop()
+    await geofences.stop()
+    await vote_batcher.stop()
+    await outbox.stop()
+    await backend_events.stop()
+    await backend.close()
+    await drain_outbound()
+    await metrics.stop_server()
+
+
+async def run_polling(bot: Bot, dp: Dispatcher):
+    # Если раньше был включён webhook, getUpdates вернёт конфликт
+    await bot.delete_webhook()
+
+    # Хвост апдейтов за время простоя разбираем сами: свежие нажатия не ждут
+    # сотни устаревших геопозиций
+    backlog = await take_backlog(bot, ALLOWED_UPDATES)
+    backlog_task = asyncio.create_task(_feed_backlog(bot, dp, backlog)) if backlog else None
+
     logger.info("🤖 Бот запущен (polling mode)")
+    try:
+        await dp.start_polling(bot, allowed_updates=ALLOWED_UPDATES)
+    finally:
+        if backlog_task is not None:
+            backlog_task.cancel()
+
+
+async def _feed_backlog(bot: Bot, dp: Dispatcher, updates: list):
+    results = await asyncio.gather(*(dp.feed_update(bot, update) for update in updates), return_exceptions=True)
+    for update, result in zip(updates, results):
+        if isinstance(result, Exception):
+            logger.error("Ошибка обработки накопившегося апдейта %s: %s", update.update_id, result)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    if not WEBHOOK_BASE_URL:
+        logger.error("WEBHOOK_BASE_URL не задан! Укажи публичный адрес бота в .env файле.")
+        return
+
+    # Без заданного секрета генерируем свой на каждый запуск — webhook всё равно переустанавливается
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT)
+    await site.start()
+
+    await bot.set_webhook(
+        url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=secret,
+        allowed_updates=ALLOWED_UPDATES,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        # Накопившиеся апдейты придут на webhook; устаревшие и повторы отсечёт DedupMiddleware
+        drop_pending_updates=BACKLOG_POLICY == 'skip',
+    )
+
+    logger.info(f"🤖 Бот запущен (webhook mode) на {WEBAPP_HOST}:{WEBAPP_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def main():
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN не задан! Укажи его в .env файле.")
+        return
+
+    if BOT_WORKERS > 1:
+        # Апдейты принимает супервизор и раздаёт воркерам по from_user.id
+        from sharding import run_supervisor
+        await run_supervisor(BOT_WORKERS)
+        return
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    backend = await start_services()
 
     try:
-        await dp.start_polling(bot, allowed_updates=[
-            'message',
-            'edited_message',
-            'callback_query',
-        ])
+        if BOT_MODE == 'webhook':
+            await run_webhook(bot, dp)
+        else:
+            await run_polling(bot, dp)
     finally:
+        await stop_services(backend)
         await bot.session.close()
 
 
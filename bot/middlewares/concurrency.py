@@ -0,0 +1,211 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from middlewares.dedup import DROPPED
+
+INTERACTIVE = 'interactive'
+MEDIA = 'media'
+TELEMETRY = 'telemetry'
+# Порядок — приоритет: освободившийся слот получает первая полоса, где есть ожидающие
+LANES = (INTERACTIVE, MEDIA, TELEMETRY)
+
+_MEDIA_FIELDS = ('photo', 'video', 'document', 'animation', 'video_note', 'voice', 'audio')
+
+
+def classify(update: Update) -> str:
+    """Полоса апдейта: правки live-location — телеметрия, фото и файлы — медиа, остальное — интерактив."""
+    edited = update.edited_message
+    if edited is not None:
+        # Исправленный текст — действие участника, его нельзя отбросить
+        return TELEMETRY if edited.location is not None else INTERACTIVE
+    message = update.message
+    if message is not None:
+        for field in _MEDIA_FIELDS:
+            if getattr(message, field) is not None:
+                return MEDIA
+    return INTERACTIVE
+
+
+class _UserQueue:
+    __slots__ = ('lock', 'size')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Апдейты участника в работе и в ожидании
+        self.size = 0
+
+
+class _Waiter:
+    __slots__ = ('future', 'user_id')
+
+    def __init__(self, future: asyncio.Future, user_id: int | None):
+        # Получает True (слот выдан) или False (апдейт вытеснен)
+        self.future = future
+        self.user_id = user_id
+
+
+class _Lane:
+    __slots__ = ('name', 'workers', 'queue_size', 'waiters', 'queued', 'active')
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        # Сколько апдейтов полосы в работе одновременно (0 — до общего лимита)
+        self.workers = workers
+        # Сколько апдейтов может ждать слота (0 — без ограничения, ничего не отбрасывается)
+        self.queue_size = queue_size
+        self.waiters: deque[_Waiter] = deque()
+        # Ограниченная полоса держит в очереди не больше одного апдейта участника
+        self.queued: dict[int, _Waiter] = {}
+        self.active = 0
+
+    def forget(self, waiter: _Waiter):
+        if self.queued.get(waiter.user_id) is waiter:
+            del self.queued[waiter.user_id]
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Планировщик апдейтов: полосы с приоритетом, участник — по одному апдейту за раз.
+
+    Апдейт относится к одной из полос (classify): interactive, media или telemetry.
+    У каждой полосы свой предел одновременных апдейтов и своя очередь ожидания,
+    а все вместе — не больше limit (0 — без общего лимита). Освободившийся слот
+    всегда достаётся сначала интерактиву, потом медиа и только потом телеметрии,
+    поэтому ответ на станции или нажатие кнопки не стоят за потоком live-location.
+    Очередь телеметрии ограничена: у участника в ней ждёт только последняя точка —
+    новая заменяет его прежнюю на её месте, а если очередь полна точками других
+    участников, отбрасывается новая.
+
+    Интерактив и медиа одного участника идут строго по очереди (asyncio.Lock отдаётся
+    в порядке ожидания), поэтому двойное нажатие не прогонит FSM-сценарий дважды.
+    Слот берётся только после своей очереди — апдейты, ждущие предыдущих того же
+    участника, слотов не занимают. Телеметрия очередь участника не занимает: его
+    ответ не ждёт, пока обработаются его же точки.
+    """
+
+    def __init__(self, limit: int, workers: dict[str, int] | None = None, queues: dict[str, int] | None = None):
+        self.limit = limit
+        workers = workers or {}
+        queues = queues or {}
+        self.lanes = {name: _Lane(name, workers.get(name, 0), queues.get(name, 0)) for name in LANES}
+        self._users: dict[int, _UserQueue] = {}
+        # Ждут своей очереди у участника / ждут слота / в работе
+        self.waiting_user = 0
+        self.waiting_slot = 0
+        self.active = 0
+
+    @property
+    def users(self) -> int:
+        return len(self._users)
+
+    @property
+    def longest_queue(self) -> int:
+        return max((queue.size for queue in self._users.values()), default=0)
+
+    def lane_waiting(self) -> dict[str, int]:
+        return {name: len(lane.waiters) for name, lane in self.lanes.items()}
+
+    def lane_active(self) -> dict[str, int]:
+        return {name: lane.active for name, lane in self.lanes.items()}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        lane = self.lanes[classify(event) if isinstance(event, Update) else INTERACTIVE]
+        user: User | None = data.get('event_from_user')
+        if user is None or lane.name == TELEMETRY:
+            return await self._run(lane, handler, event, data, user.id if user else None)
+
+        queue = self._users.get(user.id)
+        if queue is None:
+            queue = self._users[user.id] = _UserQueue()
+        queue.size += 1
+        try:
+            self.waiting_user += 1
+            try:
+                await queue.lock.acquire()
+            finally:
+                self.waiting_user -= 1
+            try:
+                return await self._run(lane, handler, event, data)
+            finally:
+                queue.lock.release()
+        finally:
+            queue.size -= 1
+            if queue.size == 0:
+                del self._users[user.id]
+
+    async def _run(self, lane: _Lane, handler, event, data, user_id: int | None = None) -> Any:
+        if not await self._acquire(lane, user_id):
+            DROPPED.inc(reason='shed')
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            self._release(lane)
+
+    def _can_start(self, lane: _Lane) -> bool:
+        return (self.limit <= 0 or self.active < self.limit) and (lane.workers <= 0 or lane.active < lane.workers)
+
+    async def _acquire(self, lane: _Lane, user_id: int | None) -> bool:
+        # Вперёд уже ждущих своей полосы не проходим; более приоритетные полосы,
+        # которым можно стартовать, слоты уже забрали в _release
+        if not lane.waiters and self._can_start(lane):
+            self.active += 1
+            lane.active += 1
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = lane.queued.get(user_id) if user_id is not None else None
+        if waiter is not None:
+            # Прежняя точка участника ещё ждёт слота — новая её заменяет и занимает её место
+            if not waiter.future.done():
+                waiter.future.set_result(False)
+            waiter.future = future
+        elif lane.queue_size > 0 and len(lane.waiters) >= lane.queue_size:
+            # Очередь полна последними точками других участников — лишней оказывается новая
+            return False
+        else:
+            waiter = _Waiter(future, user_id)
+            lane.waiters.append(waiter)
+            if lane.queue_size > 0 and user_id is not None:
+                lane.queued[user_id] = waiter
+
+        self.waiting_slot += 1
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if waiter.future is future:
+                    lane.forget(waiter)
+                    if waiter in lane.waiters:
+                        lane.waiters.remove(waiter)
+            elif future.result():
+                # Слот выдали, но задачу отменили раньше, чем она его заняла
+                self._release(lane)
+            raise
+        finally:
+            self.waiting_slot -= 1
+
+    def _release(self, lane: _Lane):
+        self.active -= 1
+        lane.active -= 1
+        # Слот — первой по приоритету полосе, которой не мешает её собственный предел
+        for candidate in self.lanes.values():
+            while candidate.waiters and self._can_start(candidate):
+                waiter = candidate.waiters.popleft()
+                candidate.forget(waiter)
+                if waiter.future.done():
+                    # Отменён, но ещё не успел убрать себя из очереди
+                    continue
+                self.active += 1
+                candidate.active += 1
+                waiter.future.set_result(True)
+            if self.limit > 0 and self.active >= self.limit:
+                break
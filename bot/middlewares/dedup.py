@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import BACKLOG_MAX_AGE, DEDUP_CACHE_SIZE
+from services.backlog import is_stale
+from services.metrics import counter
+
+
+class DedupMiddleware(BaseMiddleware):
+    """Не пускает к хендлерам повторно доставленные и слишком старые апдейты.
+
+    Telegram может прислать апдейт ещё раз (повтор webhook, перезапуск воркера),
+    поэтому последние DEDUP_CACHE_SIZE update_id хранятся в LRU. Апдейт старше
+    BACKLOG_MAX_AGE тоже отбрасывается — это хвост, а не живое действие участника.
+    """
+
+    def __init__(self, size: int = DEDUP_CACHE_SIZE, max_age: float = BACKLOG_MAX_AGE):
+        self.size = size
+        self.max_age = max_age
+        self._seen: OrderedDict[int, None] = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if event.update_id in self._seen:
+            self._seen.move_to_end(event.update_id)
+            DROPPED.inc(reason='duplicate')
+            return None
+        self._seen[event.update_id] = None
+        if len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+
+        if is_stale(event, self.max_age):
+            DROPPED.inc(reason='stale')
+            return None
+        return await handler(event, data)
+
+
+DROPPED = counter('bot_updates_dropped_total', 'Апдейты, отброшенные до хендлеров', ('reason',))
@@ -0,0 +1,69 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import (
+    UPDATES,
+    UPDATES_IN_FLIGHT,
+    UPDATE_LAG,
+    HANDLER_DURATION,
+    HANDLER_IN_FLIGHT,
+    HANDLER_ERRORS,
+)
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    handler = data.get('handler')
+    callback = getattr(handler, 'callback', None)
+    if callback is None:
+        return 'unknown'
+    return f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Считает апдейты, их задержку относительно Telegram и число апдейтов в работе."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type
+        UPDATES.inc(type=update_type)
+
+        inner = event.event
+        date = getattr(inner, 'edit_date', None) or getattr(inner, 'date', None)
+        if date is not None:
+            sent_at = date if isinstance(date, (int, float)) else date.timestamp()
+            UPDATE_LAG.observe(max(0.0, time.time() - sent_at), type=update_type)
+
+        UPDATES_IN_FLIGHT.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время работы и ошибки каждого хендлера (регистрируется как inner-middleware)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = handler_name(data)
+        HANDLER_IN_FLIGHT.inc(handler=name)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - start, handler=name)
+            HANDLER_IN_FLIGHT.dec(handler=name)
@@ -0,0 +1,106 @@
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config import THROTTLE_LIMITS
+from services.geofence import geofences
+from services.location import aggregator as location_aggregator
+
+# Как часто вычищать полностью восстановившиеся корзины
+_SWEEP_EVERY = 1000
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated_at')
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def take(self, rate: float, capacity: float, now: float) -> bool:
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def event_category(event: TelegramObject) -> str | None:
+    if isinstance(event, CallbackQuery):
+        return 'callback'
+    if isinstance(event, Message):
+        if event.location:
+            return 'location'
+        if event.photo:
+            return 'photo'
+        return 'text'
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Token bucket на каждого участника и категорию апдейтов.
+
+    Лишние апдейты не доходят до хендлеров: геопозиция отдаётся агрегатору
+    (он всё равно оставит только последнюю точку), у callback-кнопок молча
+    гасится «часики», остальное просто отбрасывается. Счётчики — в self.stats.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, int]] = THROTTLE_LIMITS):
+        self.limits = limits
+        self._buckets: dict[tuple[int, str], TokenBucket] = {}
+        self._calls = 0
+        # (категория, passed / dropped / merged) -> количество
+        self.stats: Counter = Counter()
+
+    def _allow(self, user_id: int, category: str) -> bool:
+        rate, burst = self.limits[category]
+        now = time.monotonic()
+        bucket = self._buckets.get((user_id, category))
+        if bucket is None:
+            bucket = self._buckets[(user_id, category)] = TokenBucket(burst)
+        allowed = bucket.take(rate, burst, now)
+
+        self._calls += 1
+        if self._calls % _SWEEP_EVERY == 0:
+            self._sweep(now)
+        return allowed
+
+    def _sweep(self, now: float):
+        for key, bucket in list(self._buckets.items()):
+            rate, burst = self.limits[key[1]]
+            if bucket.tokens + (now - bucket.updated_at) * rate >= burst:
+                del self._buckets[key]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        category = event_category(event)
+        user = getattr(event, 'from_user', None)
+        if category not in self.limits or user is None:
+            return await handler(event, data)
+
+        if self._allow(user.id, category):
+            self.stats[(category, 'passed')] += 1
+            return await handler(event, data)
+
+        if category == 'location':
+            geofences.observe(user.id, event.location.latitude, event.location.longitude)
+            location_aggregator.submit(user.id, event.location.latitude, event.location.longitude)
+            self.stats[(category, 'merged')] += 1
+            return None
+
+        self.stats[(category, 'dropped')] += 1
+        if isinstance(event, CallbackQuery):
+            await event.answer()
+        return None
+
+    @property
+    def throttled(self) -> int:
+        return sum(count for (_, action), count in self.stats.items() if action != 'passed')
@@ -0,0 +1,140 @@
+"""Сборка текстов ответов: заранее разобранные шаблоны с экранированием и разбиение на сообщения.
+
+Шаблон пишется как обычная строка str.format, но разбирается один раз при импорте,
+а каждое подставляемое значение проходит через html.escape — имена участников и
+названия треков приходят от пользователей и Spotify и не должны ломать parse_mode='HTML'.
+Готовые куски разметки (другой отрендеренный шаблон) оборачиваются в Markup и не
+экранируются повторно.
+"""
+import html
+import re
+from functools import lru_cache
+from string import Formatter
+from typing import Iterable
+
+# Предел длины текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
+
+
+class Markup(str):
+    """Строка, которая уже является безопасной HTML-разметкой."""
+    __slots__ = ()
+
+
+# Имена, исполнители и названия команд повторяются из ответа в ответ
+_escape_str = lru_cache(maxsize=4096)(lambda text: html.escape(text, quote=True))
+
+
+def escape(value) -> str:
+    cls = type(value)
+    if cls is str:
+        return _escape_str(value)
+    if cls is int or cls is Markup:
+        # Числа экранировать нечего, Markup уже безопасен
+        return str(value) if cls is int else value
+    return _escape_str(str(value))
+
+
+class Template:
+    """Шаблон с {полями}: разбирается при создании, при render() значения экранируются.
+
+    Поддерживаются только простые поля без спецификаций формата — числа и даты
+    форматируются до подстановки.
+    """
+
+    __slots__ = ('source', 'fields', '_format', '_static')
+
+    def __init__(self, source: str):
+        self.source = source
+        fields = []
+        for _, field, spec, conversion in Formatter().parse(source):
+            if field is None:
+                continue
+            if spec or conversion or not field.isidentifier():
+                raise ValueError(f"Поле шаблона должно быть простым именем: {{{field}}}")
+            if field not in fields:
+                fields.append(field)
+        self.fields = tuple(fields)
+        self._format = source.format
+        # Шаблон без полей рендерится один раз
+        self._static = None if fields else Markup(source.format())
+
+    def render(self, **values) -> Markup:
+        if self._static is not None:
+            return self._static
+        return Markup(self._format(**{field: escape(values[field]) for field in self.fields}))
+
+
+# Тег или HTML-сущность — их резать нельзя; остальное режется по символам
+_ATOM = re.compile(r'<(/?)([a-zA-Z][\w-]*)[^>]*>|&#?\w+;|.', re.DOTALL)
+
+
+def _cut_html(text: str, limit: int) -> tuple[str, str]:
+    """Отрезать от размеченной строки начало не длиннее limit.
+
+    Режем по последнему пробелу (иначе — между тегами и символами), но не внутри
+    тега или сущности. Теги, открытые на месте разреза, закрываются в конце куска
+    и открываются заново в начале остатка, чтобы Telegram разобрал оба.
+    """
+    if len(text) <= limit:
+        return text, ''
+    stack: list[tuple[str, str]] = []
+    best_space = best_any = None
+    pos = 0
+    for match in _ATOM.finditer(text):
+        # Граница перед очередным атомом годится, если кусок с закрывающими тегами влезает
+        if pos and pos + sum(len(name) + 3 for name, _ in stack) <= limit:
+            best_any = (pos, tuple(stack))
+            if text[pos - 1].isspace():
+                best_space = best_any
+        if match.end() > limit:
+            break
+        atom = match.group()
+        name = match.group(2)
+        if name:
+            name = name.lower()
+            if match.group(1):
+                if stack and stack[-1][0] == name:
+                    stack.pop()
+            elif not atom.endswith('/>'):
+                stack.append((name, atom))
+        pos = match.end()
+
+    cut, opened = best_space or best_any or (len(text[:limit]), ())
+    head = text[:cut] + ''.join(f'</{name}>' for name, _ in reversed(opened))
+    return head, ''.join(tag for _, tag in opened) + text[cut:]
+
+
+def split_message(lines: Iterable[str], header: str = '', limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Разложить строки по сообщениям не длиннее limit, не разрывая строку.
+
+    header ставится в начало первого сообщения как есть (перевод строки после
+    него — часть header). Строка длиннее limit (такого почти не бывает) режется
+    по пробелу или границе тега, не ломая HTML-разметку.
+    """
+    chunks: list[str] = []
+    current = [header] if header else []
+    size = len(header)
+    # Нужен ли перевод строки перед следующей строкой
+    sep = 0
+    for line in lines:
+        if len(line) > limit:
+            if current:
+                chunks.append(''.join(current))
+            while len(line) > limit:
+                head, line = _cut_html(line, limit)
+                chunks.append(head)
+            current, size, sep = [], 0, 0
+            if not line:
+                continue
+        if size + sep + len(line) > limit:
+            chunks.append(''.join(current))
+            current, size, sep = [], 0, 0
+        if sep:
+            current.append('\n')
+        current.append(line)
+        size += sep + len(line)
+        sep = 1
+    if current:
+        chunks.append(''.join(current))
+    return chunks
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from config import ANSWER_CACHE_TTL, ANSWER_WRONG_MAX_AGE
+from services.api import api_get
+
+logger = logging.getLogger(__name__)
+
+# Итог локальной проверки текста участника
+NO_TASK = 'no_task'      # у команды нет станции с ответами — это просто сообщение
+WRONG = 'wrong'          # ответ точно неверный
+CANDIDATE = 'candidate'  # похоже на правильный ответ — подтверждаем на бэкенде
+
+
+def normalize_answer(text: str) -> str:
+    """Та же нормализация, что и на бэкенде: trim + lowercase."""
+    return text.strip().lower()
+
+
+@dataclass(frozen=True)
+class AnswerSnapshot:
+    """Допустимые ответы текущей станции одной команды."""
+    team_id: str | None
+    clue_index: int | None
+    version: str | None
+    answers: frozenset
+    fetched_at: float
+
+
+class AnswerMatcher:
+    """Кэш ответов станций по командам для быстрой локальной проверки.
+
+    Неверные ответы и обычные сообщения отсекаются без похода на бэкенд, а
+    правильный (по версии кэша) ответ всё равно подтверждается через check-answer.
+    Снимок команды сбрасывается по TTL, после того как команда прошла станцию, и
+    когда бэкенд не согласился с кэшем. Участники одной команды ждут одну загрузку.
+
+    Станцию может сменить и организатор. Пока бот получает события бэкенда (live),
+    такая смена сразу сбрасывает снимок; без них «неверно» по снимку старше
+    wrong_max_age не говорится — ответы сначала перечитываются.
+    """
+
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL, wrong_max_age: float = ANSWER_WRONG_MAX_AGE):
+        self.ttl = ttl
+        self.wrong_max_age = wrong_max_age
+        self.live = False
+        self._teams: dict[str, AnswerSnapshot] = {}
+        # telegram_id -> снимок; у участников без команды снимок без team_id
+        self._users: dict[int, AnswerSnapshot] = {}
+        # Загрузки в полёте: по команде, а пока команда участника неизвестна — по telegram_id
+        self._loading: dict = {}
+
+    def _age(self, snapshot: AnswerSnapshot) -> float:
+        return time.monotonic() - snapshot.fetched_at
+
+    def _cached(self, telegram_id: int) -> AnswerSnapshot | None:
+        snap = self._users.get(telegram_id)
+        if snap is not None and snap.team_id is not None:
+            # Снимок команды мог обновиться через другого участника
+            snap = self._teams.get(snap.team_id)
+        return snap
+
+    async def snapshot(self, telegram_id: int, max_age: float | None = None) -> AnswerSnapshot | None:
+        snap = self._cached(telegram_id)
+        if snap is not None and self._age(snap) < (self.ttl if max_age is None else max_age):
+            return snap
+
+        known = self._users.get(telegram_id)
+        key = known.team_id if known is not None and known.team_id is not None else ('user', telegram_id)
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.create_task(self._load(telegram_id))
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        try:
+            snap = await asyncio.shield(task)
+        except Exception as e:
+            logger.warning("Не удалось загрузить ответы станции: %s", e)
+            return None
+        if snap is not None and known is None:
+            self._users[telegram_id] = snap
+        return snap
+
+    async def _load(self, telegram_id: int) -> AnswerSnapshot | None:
+        result = await api_get('answers', {'telegram_id': telegram_id})
+        if not isinstance(result, dict) or result.get('error'):
+            return None
+
+        snap = AnswerSnapshot(
+            team_id=result.get('team_id'),
+            clue_index=result.get('clue_index'),
+            version=result.get('version'),
+            answers=frozenset(result.get('answers') or ()),
+            fetched_at=time.monotonic(),
+        )
+        self._users[telegram_id] = snap
+        if snap.team_id is not None:
+            self._teams[snap.team_id] = snap
+        return snap
+
+    async def classify(self, telegram_id: int, text: str) -> str:
+        snap = await self.snapshot(telegram_id)
+        if snap is not None and not self.live and self._age(snap) >= self.wrong_max_age:
+            if snap.answers and normalize_answer(text) not in snap.answers:
+                # Станцию могли сменить без нашего ведома — «неверно» только по свежему снимку
+                snap = await self.snapshot(telegram_id, max_age=self.wrong_max_age)
+        if snap is None:
+            # Кэш недоступен — пусть решает бэкенд
+            return CANDIDATE
+        if not snap.answers:
+            return NO_TASK
+        if normalize_answer(text) in snap.answers:
+            return CANDIDATE
+        return WRONG
+
+    def confirmed(self, telegram_id: int, result: dict, checked_at: float):
+        """Учесть ответ check-answer на CANDIDATE, отправленный в момент checked_at (monotonic).
+
+        Кэш считал ответ верным, значит любой ответ бэкенда — либо станция пройдена,
+        либо кэш с бэкендом разошёлся. Сбрасывается только снимок, загруженный до
+        проверки: его уже могли перечитать по запросу другого участника команды.
+        """
+        if result.get('error'):
+            # Бэкенд не ответил — о станции ничего нового не известно
+            return
+        snap = self._cached(telegram_id)
+        if snap is None or snap.fetched_at > checked_at:
+            return
+        if snap.team_id is not None:
+            self.invalidate_team(snap.team_id)
+        else:
+            self._users.pop(telegram_id, None)
+
+    def set_live(self, live: bool):
+        """Включить или выключить доверие к событиям бэкенда о смене станций."""
+        if live and not self.live:
+            # Пока событий не было, станции могли смениться — снимки больше не годятся
+            self._teams.clear()
+            self._users.clear()
+        self.live = live
+
+    def invalidate_team(self, team_id: str | None):
+        if team_id is not None:
+            self._teams.pop(team_id, None)
+
+    def invalidate_user(self, telegram_id: int):
+        snap = self._users.pop(telegram_id, None)
+        if snap is not None:
+            self.invalidate_team(snap.team_id)
+
+
+answer_matcher = AnswerMatcher()
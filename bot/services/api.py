@@ -1,26 +1,317 @@
+import asyncio
+import logging
+import random
+import time
+
 import aiohttp
-from config import API_URL, API_SECRET_KEY
+from config import (
+    API_CACHE_SIZE,
+    API_URL,
+    API_SECRET_KEY,
+    BACKEND_POOL_LIMIT,
+    BACKEND_POOL_LIMIT_PER_HOST,
+    BACKEND_KEEPALIVE_TIMEOUT,
+    BACKEND_TIMEOUT,
+    BACKEND_CONNECT_TIMEOUT,
+    BACKEND_MAX_IN_FLIGHT,
+    BACKEND_RETRIES,
+    BACKEND_RETRY_BACKOFF,
+    BACKEND_BREAKER_THRESHOLD,
+    BACKEND_BREAKER_COOLDOWN,
+)
+from services.cache import TTLCache
+from services.metrics import BACKEND_DURATION, BACKEND_ERRORS, BACKEND_IN_FLIGHT, BACKEND_RETRIES_TOTAL, counter, gauge
+
+logger = logging.getLogger(__name__)
 
 HEADERS = {
     'Content-Type': 'application/json',
     'X-Api-Key': API_SECRET_KEY,
 }
 
+# Ответ клиента, когда бэкенд не ответил вовремя или предохранитель разомкнут
+BACKEND_UNAVAILABLE = 'backend_unavailable'
+
+# Сколько секунд на эндпоинт в целом, вместе с повторами (остальные — BACKEND_TIMEOUT)
+DEADLINES = {
+    'location': 3,
+    'locations': 10,
+    'answers': 3,
+    'check-answer': 5,
+    'voting/vote': 5,
+    'song/search': 15,
+}
+
+# POST-запросы, которые безопасно повторить: повтор лишь перезапишет ту же позицию
+RETRYABLE_POSTS = {'location', 'locations'}
+
+
+class CircuitBreaker:
+    """Предохранитель: после threshold неудач подряд cooldown секунд сразу отвечает отказом.
+
+    По истечении паузы пропускается один пробный запрос: успех замыкает цепь,
+    неудача снова размыкает её ещё на cooldown секунд.
+    """
+
+    def __init__(self, threshold: int = BACKEND_BREAKER_THRESHOLD, cooldown: float = BACKEND_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._probe_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self.cooldown:
+            return False
+        # Пробный запрос один; если он завис или был отменён, через cooldown пускаем следующий
+        if self._probe_at is not None and now - self._probe_at < self.cooldown:
+            return False
+        self._probe_at = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+        self._probe_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_at = None
+        if self._opened_at is not None or self.failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning("Бэкенд недоступен: %d ошибок подряд, запросы временно отклоняются", self.failures)
+            self._opened_at = time.monotonic()
+
+
+class BackendError(Exception):
+    """Сбой, после которого запрос можно повторить (сеть, таймаут, 5xx)."""
+
+
+class BackendClient:
+    """Долгоживущий HTTP-клиент к Node.js бэкенду с пулом keep-alive соединений.
+
+    Каждый вызов укладывается в дедлайн эндпоинта, безопасные запросы повторяются
+    с экспоненциальной задержкой и джиттером, а при лежащем бэкенде предохранитель
+    сразу возвращает {'error': BACKEND_UNAVAILABLE} вместо ожидания таймаутов.
+    """
+
+    def __init__(
+        self,
+        base_url: str = API_URL,
+        limit: int = BACKEND_POOL_LIMIT,
+        limit_per_host: int = BACKEND_POOL_LIMIT_PER_HOST,
+        keepalive_timeout: float = BACKEND_KEEPALIVE_TIMEOUT,
+        timeout: float = BACKEND_TIMEOUT,
+        connect_timeout: float = BACKEND_CONNECT_TIMEOUT,
+        max_in_flight: int = BACKEND_MAX_IN_FLIGHT,
+        retries: int = BACKEND_RETRIES,
+        retry_backoff: float = BACKEND_RETRY_BACKOFF,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.default_deadline = timeout
+        # Общее время запроса ограничивает дедлайн эндпоинта в _request, здесь — только подключение
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker()
+        # Лишние запросы ждут слота в пределах своего дедлайна, а не копятся без конца
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Сессия создаётся лениво — внутри работающего event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=HEADERS,
+            )
+        return self._session
+
+    def url(self, endpoint: str) -> str:
+        return f"{self.base_url}/api/bot/{endpoint}"
+
+    async def _attempt(self, method: str, endpoint: str, **kwargs) -> dict:
+        BACKEND_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, self.url(endpoint), **kwargs) as resp:
+                try:
+                    result = await resp.json(content_type=None)
+                except ValueError:
+                    result = None
+                if resp.status >= 500:
+                    raise BackendError(f"HTTP {resp.status}")
+                if result is None:
+                    # Бэкенд жив, но ответил не JSON (например, HTML-страницей прокси)
+                    BACKEND_ERRORS.inc(method=method, endpoint=endpoint, kind='bad_response')
+                    logger.warning(f"API non-JSON response [{resp.status}] {endpoint}")
+                    return {'error': 'bad_response', 'status': resp.status}
+                if resp.status >= 400:
+                    BACKEND_ERRORS.inc(method=method, endpoint=endpoint, kind=str(resp.status))
+                    logger.warning(f"API error [{resp.status}] {endpoint}: {result}")
+                return result
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise BackendError(type(e).__name__) from e
+        finally:
+            BACKEND_DURATION.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+            BACKEND_IN_FLIGHT.dec()
+
+    async def _request(self, method: str, endpoint: str, retry: bool, **kwargs) -> dict:
+        budget = DEADLINES.get(endpoint, self.default_deadline)
+        # Очередь за слотом — перегрузка самого бота, а не сбой бэкенда: предохранитель её
+        # не считает, а дедлайн эндпоинта отсчитывается с момента, когда слот получен
+        slot_deadline = time.monotonic() + budget
+        deadline = None
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                BACKEND_ERRORS.inc(method=method, endpoint=endpoint, kind='circuit_open')
+                return {'error': BACKEND_UNAVAILABLE}
+
+            try:
+                async with asyncio.timeout(max(0.0, (deadline or slot_deadline) - time.monotonic())):
+                    await self._slots.acquire()
+            except TimeoutError:
+                BACKEND_ERRORS.inc(method=method, endpoint=endpoint, kind='slot_wait')
+                logger.warning(f"API {method} {endpoint}: не дождались слота BACKEND_MAX_IN_FLIGHT")
+                return {'error': BACKEND_UNAVAILABLE}
+            if deadline is None:
+                deadline = time.monotonic() + budget
+            try:
+                async with asyncio.timeout(max(0.0, deadline - time.monotonic())):
+                    result = await self._attempt(method, endpoint, **kwargs)
+            except (BackendError, TimeoutError) as e:
+                self.breaker.record_failure()
+                kind = str(e) if isinstance(e, BackendError) else 'deadline'
+                BACKEND_ERRORS.inc(method=method, endpoint=endpoint, kind=kind)
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._slots.release()
+
+            delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if not retry or attempt >= self.retries or time.monotonic() + delay >= deadline:
+                logger.warning(f"API {method} {endpoint}: бэкенд не ответил (попыток: {attempt + 1})")
+                return {'error': BACKEND_UNAVAILABLE}
+            attempt += 1
+            BACKEND_RETRIES_TOTAL.inc(endpoint=endpoint)
+            await asyncio.sleep(delay)
+
+    async def post(self, endpoint: str, data: dict) -> dict:
+        """POST request to Node.js backend API."""
+        return await self._request('POST', endpoint, endpoint in RETRYABLE_POSTS, json=data)
+
+    async def get(self, endpoint: str, params: dict = None) -> dict:
+        """GET request to Node.js backend API."""
+        return await self._request('GET', endpoint, True, params=params)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_client: BackendClient | None = None
+
+# Сколько секунд можно отдавать ответ GET-эндпоинта из кэша
+CACHE_TTLS = {
+    'leaderboard': 10,
+    'voting/active': 5,
+    'voting/candidates': 30,
+    'songs': 30,
+    'profile': 15,
+}
+
+# Какие закэшированные чтения устаревают после записи: (эндпоинт, только для этого telegram_id)
+INVALIDATES = {
+    'register': [('profile', True), ('leaderboard', False), ('voting/candidates', False)],
+    'profile/name': [('profile', False), ('leaderboard', False), ('voting/candidates', False)],
+    'song': [('songs', True), ('profile', True)],
+    'photo': [('profile', True)],
+    'photo/batch': [('profile', True)],
+    'message': [('profile', True)],
+    'voting/vote': [('profile', True)],
+}
+
+cache = TTLCache(maxsize=API_CACHE_SIZE)
+
+gauge('bot_api_cache_entries', 'Записей в кэше ответов бэкенда', function=lambda: len(cache))
+counter(
+    'bot_api_cache_lookups_total', 'Обращения к кэшу ответов бэкенда', ('result',),
+    function=lambda: {'hit': cache.hits, 'miss': cache.misses},
+)
+gauge(
+    'bot_backend_circuit_open', 'Предохранитель клиента бэкенда разомкнут (1) или замкнут (0)',
+    function=lambda: int(_client is not None and _client.breaker.is_open),
+)
+
+
+def set_client(client: BackendClient):
+    """Назначить общий клиент (создаётся в main.py при старте)."""
+    global _client
+    _client = client
+
+
+def get_client() -> BackendClient:
+    global _client
+    if _client is None:
+        _client = BackendClient()
+    return _client
+
+
+def _cache_key(endpoint: str, params: dict | None) -> tuple:
+    return (endpoint, tuple(sorted((params or {}).items())))
+
+
+def _cacheable(result) -> bool:
+    return not (isinstance(result, dict) and result.get('error'))
+
+
+def invalidate(endpoint: str, telegram_id: int | None = None):
+    """Сбросить кэш эндпоинта целиком или только для одного участника."""
+    def matches(key: tuple) -> bool:
+        if key[0] != endpoint:
+            return False
+        return telegram_id is None or ('telegram_id', telegram_id) in key[1]
+    cache.invalidate(matches)
+
 
 async def api_post(endpoint: str, data: dict) -> dict:
     """POST request to Node.js backend API."""
-    url = f"{API_URL}/api/bot/{endpoint}"
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=data, headers=HEADERS) as resp:
-            result = await resp.json()
-            if resp.status >= 400:
-                print(f"API error [{resp.status}] {endpoint}: {result}")
-            return result
+    result = await get_client().post(endpoint, data)
+    for read_endpoint, per_user in INVALIDATES.get(endpoint, ()):
+        invalidate(read_endpoint, data.get('telegram_id') if per_user else None)
+    return result
 
 
 async def api_get(endpoint: str, params: dict = None) -> dict:
-    """GET request to Node.js backend API."""
-    url = f"{API_URL}/api/bot/{endpoint}"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params, headers=HEADERS) as resp:
-            return await resp.json()
+    """GET request to Node.js backend API (с кэшем для эндпоинтов из CACHE_TTLS)."""
+    ttl = CACHE_TTLS.get(endpoint)
+    if ttl is None:
+        return await get_client().get(endpoint, params)
+    return await cache.get_or_load(
+        _cache_key(endpoint, params),
+        ttl,
+        lambda: get_client().get(endpoint, params),
+        cacheable=_cacheable,
+    )
@@ -0,0 +1,111 @@
+"""Апдейты, накопившиеся в Telegram, пока бот был выключен.
+
+После перезапуска getUpdates отдаёт весь хвост: сотни устаревших правок live-location
+и повторные нажатия одних и тех же кнопок. Перед запуском polling бот сам выбирает
+хвост до конца и оставляет только то, что ещё имеет смысл обработать.
+"""
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from config import BACKLOG_POLICY, BACKLOG_MAX_AGE
+from services.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# Сколько апдейтов запрашивать за раз (максимум Bot API)
+FETCH_LIMIT = 100
+
+
+def update_time(update: Update) -> float | None:
+    """Когда апдейт появился в Telegram (для правок — время правки)."""
+    inner = update.event
+    date = getattr(inner, 'edit_date', None) or getattr(inner, 'date', None)
+    if date is None:
+        return None
+    return date if isinstance(date, (int, float)) else date.timestamp()
+
+
+def is_stale(update: Update, max_age: float = BACKLOG_MAX_AGE, now: float | None = None) -> bool:
+    if max_age <= 0:
+        return False
+    sent_at = update_time(update)
+    return sent_at is not None and (now or time.time()) - sent_at > max_age
+
+
+def callback_key(update: Update) -> tuple | None:
+    """Повторное нажатие той же кнопки в том же сообщении даёт тот же ключ."""
+    query = update.callback_query
+    if query is None:
+        return None
+    message_id = query.message.message_id if query.message else query.inline_message_id
+    return query.from_user.id, message_id, query.data
+
+
+def collapse(updates: list[Update], max_age: float = BACKLOG_MAX_AGE, now: float | None = None) -> list[Update]:
+    """Отбросить устаревшее и повторы, от геопозиции оставить последнюю точку участника.
+
+    Порядок оставшихся апдейтов сохраняется.
+    """
+    now = now or time.time()
+    # telegram_id -> update_id последней геопозиции
+    newest_location: dict[int, int] = {}
+    for update in updates:
+        message = update.message or update.edited_message
+        if message is not None and message.location and message.from_user:
+            newest_location[message.from_user.id] = update.update_id
+
+    kept = []
+    seen_callbacks: set = set()
+    for update in updates:
+        if is_stale(update, max_age, now):
+            BACKLOG.inc(action='stale')
+            continue
+        message = update.message or update.edited_message
+        if message is not None and message.location and message.from_user:
+            if newest_location[message.from_user.id] != update.update_id:
+                BACKLOG.inc(action='collapsed')
+                continue
+        key = callback_key(update)
+        if key is not None:
+            if key in seen_callbacks:
+                BACKLOG.inc(action='duplicate')
+                continue
+            seen_callbacks.add(key)
+        BACKLOG.inc(action='kept')
+        kept.append(update)
+    return kept
+
+
+async def take_backlog(bot: Bot, allowed_updates: list, policy: str = BACKLOG_POLICY) -> list[Update]:
+    """Забрать из Telegram всё, что накопилось, и подтвердить получение.
+
+    Возвращает апдейты, которые стоит обработать: при policy='collapse' — после collapse(),
+    при 'skip' — ничего. При 'keep' хвост не трогается и достаётся обычному polling.
+    """
+    if policy == 'keep':
+        return []
+
+    updates: list[Update] = []
+    offset = None
+    while True:
+        batch = await bot.get_updates(offset=offset, limit=FETCH_LIMIT, timeout=0, allowed_updates=allowed_updates)
+        if not batch:
+            break
+        updates.extend(batch)
+        offset = batch[-1].update_id + 1
+    # Последний запрос с offset подтвердил всё полученное — polling начнёт с чистого листа
+
+    if policy == 'skip':
+        BACKLOG.inc(len(updates), action='skipped')
+        kept = []
+    else:
+        kept = collapse(updates)
+    if updates:
+        logger.info("Накопилось апдейтов: %d, к обработке: %d", len(updates), len(kept))
+    return kept
+
+
+BACKLOG = counter('bot_backlog_updates_total', 'Апдейты, накопившиеся до запуска бота', ('action',))
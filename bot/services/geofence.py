@@ -0,0 +1,183 @@
+"""Геозоны станций: бот сам замечает, когда участник пришёл на станцию или ушёл с неё.
+
+Станции активного квеста (координаты и радиус) кладутся в сетку: точка проецируется
+на плоскость, ячейка сетки не меньше самого большого радиуса, а станция записывается
+во все ячейки, которые задевает её круг. Проверка точки — одна ячейка и пара станций
+в ней, то есть O(1) на каждое обновление live-location. На бэкенд уходят только
+переходы «вошёл» / «вышел», а не каждая точка.
+"""
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from config import GEOFENCE_ENABLED, GEOFENCE_EXIT_MARGIN_M, GEOFENCE_REFRESH
+from services.api import BACKEND_UNAVAILABLE, api_get, api_post
+from services.location import distance_m
+from services.metrics import counter, gauge
+from services.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+# Метров в градусе широты
+M_PER_DEG = 111320
+
+ENTER = 'enter'
+EXIT = 'exit'
+
+
+@dataclass(frozen=True)
+class Station:
+    index: int
+    lat: float
+    lng: float
+    radius: float
+
+
+class GeofenceGrid:
+    """Сетка ячеек со станциями; станции одного квеста лежат в пределах одного города."""
+
+    def __init__(self, stations: list[Station]):
+        self.stations = stations
+        self._cells: dict[tuple[int, int], list[Station]] = {}
+        if not stations:
+            self.cell = 1.0
+            self._kx = M_PER_DEG
+            return
+        # Равнопромежуточная проекция вокруг средней широты — на масштабе города точности хватает
+        mean_lat = sum(s.lat for s in stations) / len(stations)
+        self._kx = M_PER_DEG * math.cos(math.radians(mean_lat))
+        self.cell = max(max(s.radius for s in stations) + GEOFENCE_EXIT_MARGIN_M, 1.0)
+        for station in stations:
+            reach = station.radius + GEOFENCE_EXIT_MARGIN_M
+            x, y = self._project(station.lat, station.lng)
+            for cx in range(self._cell_of(x - reach), self._cell_of(x + reach) + 1):
+                for cy in range(self._cell_of(y - reach), self._cell_of(y + reach) + 1):
+                    self._cells.setdefault((cx, cy), []).append(station)
+
+    def _project(self, lat: float, lng: float) -> tuple[float, float]:
+        return lng * self._kx, lat * M_PER_DEG
+
+    def _cell_of(self, value: float) -> int:
+        return math.floor(value / self.cell)
+
+    def nearby(self, lat: float, lng: float) -> list[Station]:
+        """Станции, в чью зону (с запасом на выход) может попадать точка."""
+        x, y = self._project(lat, lng)
+        return self._cells.get((self._cell_of(x), self._cell_of(y)), [])
+
+
+class GeofenceEngine:
+    """Следит, в какой геозоне находится каждый участник, и сообщает бэкенду о переходах.
+
+    Вход — когда точка внутри радиуса станции, выход — только когда она дальше
+    радиуса плюс GEOFENCE_EXIT_MARGIN_M: разброс GPS на границе не даёт череды
+    ложных «вошёл/вышел».
+    """
+
+    def __init__(self, refresh: float = GEOFENCE_REFRESH, exit_margin: float = GEOFENCE_EXIT_MARGIN_M):
+        self.refresh = refresh
+        self.exit_margin = exit_margin
+        self.grid = GeofenceGrid([])
+        self.version: str | None = None
+        # telegram_id -> индексы станций, в чьих зонах участник сейчас
+        self._inside: dict[int, frozenset[int]] = {}
+        self._task: asyncio.Task | None = None
+        self._sending: set[asyncio.Task] = set()
+
+    async def load(self):
+        result = await api_get('geofences')
+        if not isinstance(result, dict) or result.get('error'):
+            logger.warning("Геозоны станций не загружены: %s", result.get('error') if isinstance(result, dict) else result)
+            return
+        if result.get('version') == self.version:
+            return
+        stations = [
+            Station(s['index'], float(s['lat']), float(s['lng']), float(s['radius']))
+            for s in result.get('stations') or ()
+        ]
+        self.grid = GeofenceGrid(stations)
+        self.version = result.get('version')
+        # Станции поменялись — прежние «внутри» больше ничего не значат
+        self._inside.clear()
+        logger.info("Геозоны: станций %d, ячейка %.0f м", len(stations), self.grid.cell)
+
+    def observe(self, telegram_id: int, lat: float, lng: float):
+        """Проверить свежую точку участника; о переходах сообщить бэкенду в фоне."""
+        if not self.grid.stations:
+            return
+        events = self.check(telegram_id, lat, lng)
+        if events:
+            task = asyncio.create_task(self._send(events))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    def check(self, telegram_id: int, lat: float, lng: float) -> list[dict]:
+        before = self._inside.get(telegram_id, frozenset())
+        inside = set()
+        for station in self.grid.nearby(lat, lng):
+            distance = distance_m(lat, lng, station.lat, station.lng)
+            # Уже внутри — держим до выхода за радиус с запасом
+            limit = station.radius + self.exit_margin if station.index in before else station.radius
+            if distance <= limit:
+                inside.add(station.index)
+        # Станции из before, которых нет среди соседних ячеек, точно остались далеко позади
+        after = frozenset(inside)
+        if after == before:
+            return []
+        if after:
+            self._inside[telegram_id] = after
+        else:
+            self._inside.pop(telegram_id, None)
+
+        at = int(time.time() * 1000)
+        events = [
+            {'telegram_id': telegram_id, 'station': index, 'type': ENTER, 'at': at}
+            for index in sorted(after - before)
+        ] + [
+            {'telegram_id': telegram_id, 'station': index, 'type': EXIT, 'at': at}
+            for index in sorted(before - after)
+        ]
+        for event in events:
+            TRANSITIONS.inc(type=event['type'])
+        return events
+
+    async def _send(self, events: list[dict]):
+        result = await api_post('geofence', {'events': events})
+        if result.get('error') == BACKEND_UNAVAILABLE:
+            await outbox.put('geofence', {'events': events})
+        elif result.get('error'):
+            logger.warning("Бэкенд не принял %d событий геозон: %s", len(events), result['error'])
+
+    def start(self):
+        if GEOFENCE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # Квест могут поменять или передвинуть станции — перечитываем периодически
+        while True:
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Ошибка загрузки геозон")
+            await asyncio.sleep(self.refresh)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+
+TRANSITIONS = counter('bot_geofence_transitions_total', 'Входы и выходы участников в геозоны станций', ('type',))
+
+geofences = GeofenceEngine()
+
+gauge('bot_geofence_stations', 'Станции с геозонами', function=lambda: len(geofences.grid.stations))
+gauge('bot_geofence_inside', 'Участники внутри геозон станций', function=lambda: len(geofences._inside))
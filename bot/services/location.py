@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import math
+import time
+
+from config import (
+    LOCATION_MIN_DISTANCE_M,
+    LOCATION_MIN_INTERVAL,
+    LOCATION_MAX_SILENCE,
+    LOCATION_FLUSH_INTERVAL,
+    LOCATION_BATCH_SIZE,
+)
+from services.api import BACKEND_UNAVAILABLE, api_post
+from services.metrics import gauge
+from services.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000
+
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Расстояние между двумя точками по формуле гаверсинусов, в метрах."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class LocationAggregator:
+    """Копит live-location обновления и раз в несколько секунд отправляет их пачкой.
+
+    Для каждого telegram_id хранится только последняя точка. Точка уходит на бэкенд,
+    если участник сдвинулся хотя бы на min_distance метров и с прошлой отправки прошло
+    не меньше min_interval секунд. Если участник стоит на месте, позиция всё равно
+    переотправляется раз в max_silence секунд, чтобы трансляция не считалась потерянной.
+    """
+
+    def __init__(
+        self,
+        min_distance: float = LOCATION_MIN_DISTANCE_M,
+        min_interval: float = LOCATION_MIN_INTERVAL,
+        max_silence: float = LOCATION_MAX_SILENCE,
+        flush_interval: float = LOCATION_FLUSH_INTERVAL,
+        batch_size: int = LOCATION_BATCH_SIZE,
+    ):
+        self.min_distance = min_distance
+        self.min_interval = min_interval
+        self.max_silence = max_silence
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # telegram_id -> (lat, lng, monotonic time, unix time ms)
+        self._pending: dict[int, tuple[float, float, float, int]] = {}
+        self._last_sent: dict[int, tuple[float, float, float]] = {}
+        self._task: asyncio.Task | None = None
+
+    def submit(self, telegram_id: int, lat: float, lng: float):
+        """Запомнить свежую точку участника (предыдущая неотправленная затирается)."""
+        self._pending[telegram_id] = (lat, lng, time.monotonic(), int(time.time() * 1000))
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def mark_sent(self, telegram_id: int, lat: float, lng: float):
+        """Отметить точку, отправленную на бэкенд в обход агрегатора."""
+        self._pending.pop(telegram_id, None)
+        self._last_sent[telegram_id] = (lat, lng, time.monotonic())
+
+    def _is_due(self, telegram_id: int, lat: float, lng: float, now: float) -> bool | None:
+        """True — отправить, False — подождать, None — выбросить как дубль."""
+        last = self._last_sent.get(telegram_id)
+        if last is None:
+            return True
+        last_lat, last_lng, sent_at = last
+        elapsed = now - sent_at
+        if elapsed < self.min_interval:
+            return False
+        if elapsed >= self.max_silence:
+            return True
+        if distance_m(last_lat, last_lng, lat, lng) < self.min_distance:
+            return None
+        return True
+
+    def _collect(self) -> list[dict]:
+        now = time.monotonic()
+        batch = []
+        for telegram_id, (lat, lng, _, at) in list(self._pending.items()):
+            due = self._is_due(telegram_id, lat, lng, now)
+            if due is False:
+                continue
+            del self._pending[telegram_id]
+            if due is None:
+                continue
+            self._last_sent[telegram_id] = (lat, lng, now)
+            batch.append({'telegram_id': telegram_id, 'lat': lat, 'lng': lng, 'at': at})
+        return batch
+
+    async def flush(self, force: bool = False):
+        """Отправить накопленные точки одним или несколькими bulk-запросами."""
+        if force:
+            # При остановке отправляем всё, что ещё не ушло, без учёта интервалов
+            for telegram_id in self._pending:
+                self._last_sent.pop(telegram_id, None)
+        batch = self._collect()
+        for i in range(0, len(batch), self.batch_size):
+            chunk = batch[i:i + self.batch_size]
+            try:
+                result = await api_post('locations', {'locations': chunk})
+            except Exception as e:
+                result = {'error': str(e)}
+            if result.get('error') == BACKEND_UNAVAILABLE:
+                # Бэкенд лежит — точки переживут простой в outbox
+                logger.warning("Бэкенд недоступен, %d геопозиций отложено в outbox", len(chunk))
+                for item in chunk:
+                    await outbox.put('location', item)
+            elif result.get('error'):
+                logger.warning("Не удалось отправить %d геопозиций: %s", len(chunk), result['error'])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Ошибка при отправке геопозиций")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(force=True)
+
+
+aggregator = LocationAggregator()
+
+gauge('bot_location_pending', 'Геопозиции, ожидающие отправки', function=lambda: aggregator.pending)
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiogram.types import Message
+
+from config import MEDIA_GROUP_WINDOW
+
+logger = logging.getLogger(__name__)
+
+AlbumCallback = Callable[[list[Message]], Awaitable]
+
+
+class MediaGroupCollector:
+    """Собирает сообщения одного альбома (media_group_id), которые Telegram шлёт отдельными апдейтами.
+
+    Хендлер не ждёт: сообщение просто кладётся в группу, а таймер после window секунд
+    тишины отдаёт весь альбом в callback одним списком. Каждое новое фото альбома
+    перезапускает таймер.
+    """
+
+    def __init__(self, window: float = MEDIA_GROUP_WINDOW):
+        self.window = window
+        # (chat_id, media_group_id) -> (сообщения, callback, таймер)
+        self._groups: dict[tuple, tuple[list[Message], AlbumCallback, asyncio.TimerHandle]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def add(self, message: Message, callback: AlbumCallback):
+        key = (message.chat.id, message.media_group_id)
+        group = self._groups.get(key)
+        messages = group[0] if group else []
+        if group:
+            group[2].cancel()
+        messages.append(message)
+        timer = asyncio.get_running_loop().call_later(self.window, self._complete, key)
+        self._groups[key] = (messages, callback, timer)
+
+    def _complete(self, key: tuple):
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        messages, callback, _ = group
+        messages.sort(key=lambda m: m.message_id)
+        task = asyncio.create_task(callback(messages))
+        self._tasks.add(task)
+        task.add_done_callback(self._finish)
+
+    def _finish(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Ошибка при обработке альбома", exc_info=task.exception())
+
+    async def stop(self):
+        """Отдать в обработку все недособранные альбомы и дождаться их."""
+        for key, (_, _, timer) in list(self._groups.items()):
+            timer.cancel()
+            self._complete(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+media_groups = MediaGroupCollector()
@@ -0,0 +1,199 @@
+"""Простые метрики в формате Prometheus и HTTP-эндпоинт /metrics для них."""
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), function: Callable | None = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values: dict[tuple, float] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, '') for n in self.labelnames)
+
+    def samples(self):
+        if self.function is not None:
+            # Значение считается в момент сбора: функция возвращает число или {labels: число}
+            value = self.function()
+            if isinstance(value, dict):
+                for key, v in value.items():
+                    key = key if isinstance(key, tuple) else (key,)
+                    yield self.name, _labels(self.labelnames, key), v
+            else:
+                yield self.name, '', value
+            return
+        for key, value in self._values.items():
+            yield self.name, _labels(self.labelnames, key), value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, labels, value in self.samples():
+            lines.append(f'{name}{labels} {value:g}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам..., +Inf, сумма]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def totals(self) -> dict[tuple, tuple[int, float]]:
+        """Число наблюдений и их сумма для каждого набора меток."""
+        return {key: (sum(series[:-1]), series[-1]) for key, series in self._series.items()}
+
+    def samples(self):
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                yield f'{self.name}_bucket', _labels(self.labelnames, key, f'le="{le}"'), cumulative
+            yield f'{self.name}_count', _labels(self.labelnames, key), cumulative
+            yield f'{self.name}_sum', _labels(self.labelnames, key), series[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                logger.exception("Не удалось собрать метрику %s", metric.name)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple = (), function: Callable | None = None) -> Counter:
+    """Счётчик; с function значение читается из счётчика самого объекта — оно только растёт."""
+    return REGISTRY.register(Counter(name, documentation, labelnames, function))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple = (), function: Callable | None = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, function))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# ---- Метрики бота ----
+
+UPDATES = counter('bot_updates_total', 'Полученные апдейты по типу', ('type',))
+UPDATES_IN_FLIGHT = gauge('bot_updates_in_flight', 'Апдейты в обработке')
+UPDATE_LAG = histogram(
+    'bot_update_lag_seconds', 'Задержка между отправкой сообщения в Telegram и началом обработки',
+    ('type',), LAG_BUCKETS,
+)
+HANDLER_DURATION = histogram('bot_handler_duration_seconds', 'Время работы хендлера', ('handler',))
+HANDLER_IN_FLIGHT = gauge('bot_handler_in_flight', 'Хендлеры в работе', ('handler',))
+HANDLER_ERRORS = counter('bot_handler_errors_total', 'Исключения в хендлерах', ('handler',))
+BACKEND_DURATION = histogram(
+    'bot_backend_request_duration_seconds', 'Время запроса к бэкенду', ('method', 'endpoint'),
+)
+BACKEND_IN_FLIGHT = gauge('bot_backend_in_flight', 'Запросы к бэкенду в работе')
+BACKEND_ERRORS = counter('bot_backend_errors_total', 'Ошибки запросов к бэкенду', ('method', 'endpoint', 'kind'))
+BACKEND_RETRIES_TOTAL = counter('bot_backend_retries_total', 'Повторы запросов к бэкенду', ('endpoint',))
+
+
+# ---- HTTP-эндпоинт ----
+
+_runner: web.AppRunner | None = None
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type='text/plain', charset='utf-8')
+
+
+async def start_server(host: str, port: int):
+    global _runner
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host, port).start()
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+
+
+async def stop_server():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
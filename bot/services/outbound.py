@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Awaitable
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+from config import (
+    OUTBOUND_GLOBAL_RATE,
+    OUTBOUND_CHAT_INTERVAL,
+    OUTBOUND_GROUP_INTERVAL,
+    OUTBOUND_MAX_RETRIES,
+)
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+# Чем меньше число, тем раньше запрос получит слот глобального лимита
+PRIORITY_INTERACTIVE = 0  # ответы на нажатия inline-кнопок
+PRIORITY_EDIT = 1         # редактирование уже отправленных сообщений
+PRIORITY_DEFAULT = 2      # обычные сообщения
+
+
+def method_priority(method: TelegramMethod) -> int:
+    if isinstance(method, AnswerCallbackQuery):
+        return PRIORITY_INTERACTIVE
+    if type(method).__name__.startswith('Edit'):
+        return PRIORITY_EDIT
+    return PRIORITY_DEFAULT
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Планировщик исходящих запросов бота к Telegram (request-middleware сессии).
+
+    Держит общий лимит ~30 запросов в секунду и не чаще одного сообщения в секунду
+    в один чат (в группу — раз в group_interval). Слоты общего лимита раздаются по
+    приоритету: ответы на callback-кнопки идут раньше информационных сообщений.
+    На 429 (RetryAfter) чат ставится на паузу и запрос повторяется сам, вместо того
+    чтобы падать в хендлер.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_GLOBAL_RATE,
+        chat_interval: float = OUTBOUND_CHAT_INTERVAL,
+        group_interval: float = OUTBOUND_GROUP_INTERVAL,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+    ):
+        self.global_rate = global_rate
+        self.chat_interval = chat_interval
+        self.group_interval = group_interval
+        self.max_retries = max_retries
+        self._tokens = global_rate
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pacer: asyncio.Task | None = None
+        # chat_id -> момент, с которого в чат можно отправить следующее сообщение
+        self._chat_next: dict[Any, float] = {}
+        self.retries = 0
+
+    # ---- Лимит на чат ----
+
+    async def _chat_slot(self, chat_id: Any):
+        interval = self.group_interval if isinstance(chat_id, int) and chat_id < 0 else self.chat_interval
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        # Слот бронируется сразу — запросы в один чат уходят в порядке вызова
+        self._chat_next[chat_id] = slot + interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    # ---- Общий лимит ----
+
+    def _refill(self, now: float):
+        if now < self._paused_until:
+            return
+        start = max(self._refilled_at, self._paused_until)
+        self._tokens = min(self.global_rate, self._tokens + (now - start) * self.global_rate)
+        self._refilled_at = now
+
+    async def _global_slot(self, priority: int):
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pacer is None or self._pacer.done():
+            self._pacer = asyncio.create_task(self._pace())
+        await future
+
+    async def _pace(self):
+        while self._waiters:
+            now = time.monotonic()
+            self._refill(now)
+            while self._waiters and self._tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    self._tokens -= 1
+                    future.set_result(None)
+            if self._waiters:
+                delay = max(self._paused_until - now, 1 / self.global_rate)
+                await asyncio.sleep(delay)
+
+    def _pause(self, chat_id: Any, retry_after: float):
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self._paused_until = max(self._paused_until, until)
+            self._tokens = 0
+        else:
+            self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0.0), until)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None and not isinstance(method, AnswerCallbackQuery):
+            # getUpdates, setWebhook и прочие служебные запросы не лимитируем
+            return await make_request(bot, method)
+
+        priority = method_priority(method)
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._chat_slot(chat_id)
+            await self._global_slot(priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    "Telegram 429 на %s (чат %s), повтор через %s с",
+                    type(method).__name__, chat_id, e.retry_after,
+                )
+                self._pause(chat_id, e.retry_after)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+
+_background: set[asyncio.Task] = set()
+
+
+def send_later(coro: Awaitable):
+    """Отправить сообщение, не дожидаясь его в хендлере.
+
+    Для информационных ответов, результат которых хендлеру не нужен: ожидание
+    лимитов и повторы после 429 идут в фоне и не держат обработку апдейта.
+    """
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_finish_background)
+
+
+def _finish_background(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Не удалось отправить сообщение: %s", task.exception())
+
+
+async def drain(timeout: float = 5):
+    """Дождаться фоновых отправок перед закрытием сессии бота."""
+    if _background:
+        await asyncio.wait(set(_background), timeout=timeout)
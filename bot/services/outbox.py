@@ -0,0 +1,254 @@
+"""Очередь записей на бэкенд, переживающая его падение и перезапуск бота."""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from config import OUTBOX_PATH, OUTBOX_RETRY_INTERVAL, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ENTRIES
+from services.api import BACKEND_UNAVAILABLE, api_post
+from services.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+# Геопозиции отправляются одной пачкой: важна только последняя точка участника
+BATCHED = {'location': 'locations'}
+
+# Сколько подтверждений копится в журнале, прежде чем он переписывается начисто
+COMPACT_AFTER = 1000
+
+
+@dataclass
+class Entry:
+    seq: int
+    endpoint: str
+    data: dict
+    at: int  # unix time ms, когда участник это прислал
+
+
+class Outbox:
+    """Журнал отложенных записей: JSONL-файл, в который только дописывают.
+
+    Строка {"seq", "endpoint", "data", "at"} — запись в очереди,
+    строка {"ack": [seq, ...]} — записи, которые бэкенд уже принял.
+    При старте журнал перечитывается, неподтверждённые записи отправляются заново:
+    у каждого участника строго по порядку, геопозиции — общей пачкой через /locations.
+    """
+
+    def __init__(
+        self,
+        retry_interval: float = OUTBOX_RETRY_INTERVAL,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        max_entries: int = OUTBOX_MAX_ENTRIES,
+    ):
+        self.retry_interval = retry_interval
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.path: str | None = None
+        self._entries: dict[int, Entry] = {}
+        self._users: Counter = Counter()
+        self._seq = 0
+        self._acked_since_compact = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        # Файл пишется из одного потока, чтобы не блокировать event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbox')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def pending_for(self, telegram_id) -> bool:
+        return self._users[telegram_id] > 0
+
+    # ---- файл ----
+
+    def _load(self) -> list[Entry]:
+        entries: dict[int, Entry] = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Недописанная строка после аварийной остановки
+                    continue
+                if 'ack' in record:
+                    for seq in record['ack']:
+                        entries.pop(seq, None)
+                else:
+                    entries[record['seq']] = Entry(record['seq'], record['endpoint'], record['data'], record['at'])
+        return list(entries.values())
+
+    def _append(self, records: list[dict]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, entries: list[Entry]):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for e in entries:
+                f.write(json.dumps({'seq': e.seq, 'endpoint': e.endpoint, 'data': e.data, 'at': e.at}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    async def _io(self, func, *args):
+        if self.path is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ---- очередь ----
+
+    def _add(self, entry: Entry):
+        self._entries[entry.seq] = entry
+        self._users[entry.data.get('telegram_id')] += 1
+
+    async def put(self, endpoint: str, data: dict) -> bool:
+        """Сохранить запись на диск; False — очередь переполнена."""
+        if len(self._entries) >= self.max_entries:
+            logger.error("Outbox переполнен (%d записей), %s не сохранён", len(self._entries), endpoint)
+            return False
+        self._seq += 1
+        entry = Entry(self._seq, endpoint, data, int(time.time() * 1000))
+        self._add(entry)
+        await self._io(self._append, [{'seq': entry.seq, 'endpoint': endpoint, 'data': data, 'at': entry.at}])
+        QUEUED.inc(endpoint=endpoint)
+        return True
+
+    async def _ack(self, entries: list[Entry]):
+        for entry in entries:
+            if self._entries.pop(entry.seq, None) is not None:
+                telegram_id = entry.data.get('telegram_id')
+                self._users[telegram_id] -= 1
+                if self._users[telegram_id] <= 0:
+                    del self._users[telegram_id]
+        self._acked_since_compact += len(entries)
+        if not self._entries or self._acked_since_compact >= COMPACT_AFTER:
+            self._acked_since_compact = 0
+            await self._io(self._rewrite, list(self._entries.values()))
+        else:
+            await self._io(self._append, [{'ack': [e.seq for e in entries]}])
+
+    # ---- повторная отправка ----
+
+    async def _replay_batched(self, endpoint: str, entries: list[Entry]) -> bool:
+        latest: dict = {}
+        for e in entries:
+            latest[e.data.get('telegram_id')] = {**e.data, 'at': e.data.get('at', e.at)}
+        items = list(latest.values())
+        for i in range(0, len(items), self.batch_size):
+            result = await api_post(BATCHED[endpoint], {BATCHED[endpoint]: items[i:i + self.batch_size]})
+            if result.get('error') == BACKEND_UNAVAILABLE:
+                return False
+            if result.get('error'):
+                logger.warning("Outbox: бэкенд отклонил пачку %s: %s", endpoint, result['error'])
+        REPLAYED.inc(len(entries), endpoint=endpoint)
+        await self._ack(entries)
+        return True
+
+    async def _replay_user(self, entries: list[Entry]) -> bool:
+        for entry in entries:
+            result = await api_post(entry.endpoint, entry.data)
+            if result.get('error') == BACKEND_UNAVAILABLE:
+                return False
+            if result.get('error'):
+                # Бэкенд ответил, но запись не принял — повтор ничего не изменит
+                logger.warning("Outbox: %s #%d отклонён бэкендом: %s", entry.endpoint, entry.seq, result['error'])
+                DROPPED.inc(endpoint=entry.endpoint)
+            else:
+                REPLAYED.inc(endpoint=entry.endpoint)
+            await self._ack([entry])
+        return True
+
+    async def replay(self) -> bool:
+        """Отправить всё, что накопилось; True — очередь опустела."""
+        async with self._lock:
+            if not self._entries:
+                return True
+            batched: dict[str, list[Entry]] = {}
+            per_user: dict = {}
+            for entry in list(self._entries.values()):
+                if entry.endpoint in BATCHED:
+                    batched.setdefault(entry.endpoint, []).append(entry)
+                else:
+                    per_user.setdefault(entry.data.get('telegram_id'), []).append(entry)
+
+            start = time.perf_counter()
+            before = len(self._entries)
+            results = [await self._replay_batched(endpoint, entries) for endpoint, entries in batched.items()]
+            # Участники независимы друг от друга — их очереди идут параллельно
+            results += await asyncio.gather(*(self._replay_user(entries) for entries in per_user.values()))
+            sent = before - len(self._entries)
+            if sent:
+                logger.info("Outbox: отправлено %d записей за %.2f с", sent, time.perf_counter() - start)
+            return all(results) and not self._entries
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            # Пока предохранитель разомкнут, replay упрётся в быстрый отказ первой же записи
+            if not self._entries:
+                continue
+            try:
+                await self.replay()
+            except Exception:
+                logger.exception("Ошибка при отправке outbox")
+
+    async def start(self, path: str | None = OUTBOX_PATH):
+        self.path = path
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            for entry in await self._io(self._load):
+                self._add(entry)
+                self._seq = max(self._seq, entry.seq)
+            if self._entries:
+                logger.info("Outbox: %d неотправленных записей с прошлого запуска", len(self._entries))
+                await self._io(self._rewrite, list(self._entries.values()))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+outbox = Outbox()
+
+QUEUED = counter('bot_outbox_queued_total', 'Записи, отложенные в outbox', ('endpoint',))
+REPLAYED = counter('bot_outbox_replayed_total', 'Записи из outbox, принятые бэкендом', ('endpoint',))
+DROPPED = counter('bot_outbox_dropped_total', 'Записи из outbox, отклонённые бэкендом', ('endpoint',))
+gauge('bot_outbox_pending', 'Записи в outbox, ожидающие отправки', function=lambda: len(outbox))
+
+
+async def post_or_queue(endpoint: str, data: dict) -> dict:
+    """Записать на бэкенд, а если он недоступен — в outbox.
+
+    Пока у участника есть отложенные записи, новые встают за ними в очередь,
+    чтобы бэкенд получил их в том порядке, в каком они были отправлены.
+    Отложенная запись возвращает {'queued': True}.
+
+    Запрос, упёршийся в дедлайн, бэкенд мог уже выполнить, поэтому повтор должен быть
+    безопасным: фото и сообщения несут message_id из Telegram, и бэкенд по нему не
+    создаёт вторую запись, а песню повторно не даёт добавить проверка на дубликат.
+    """
+    if not outbox.pending_for(data.get('telegram_id')):
+        result = await api_post(endpoint, data)
+        if result.get('error') != BACKEND_UNAVAILABLE:
+            return result
+    if await outbox.put(endpoint, data):
+        return {'queued': True}
+    return {'error': BACKEND_UNAVAILABLE}
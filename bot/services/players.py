@@ -0,0 +1,309 @@
+"""Read model участников и команд, которую бот держит сам по событиям бэкенда.
+
+Бэкенд и так рассылает по Socket.IO всё, что меняется в участниках и командах
+(для админки). Бот подписывается на тот же поток, стартует со снимка GET /api/bot/snapshot
+и дальше обновляет компактный индекс telegram_id → команда, станция, жизни — поэтому
+«Мой статус» и проверка «не в команде» обходятся без запросов к бэкенду.
+Пока поток не подключён, индексу не доверяем (ready = False) и хендлеры идут на бэкенд.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field, replace
+
+from config import API_URL, BACKEND_EVENTS_ENABLED, BACKEND_EVENTS_RESYNC
+from services.answers import answer_matcher
+from services.api import get_client
+from services.metrics import counter, gauge
+from services.ranking import RankIndex
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Player:
+    telegram_id: int
+    user_id: str
+    first_name: str = ''
+    username: str = ''
+    team_id: str | None = None
+    lives: int = 1
+    level: int = 1
+    is_active: bool = True
+
+
+@dataclass
+class TeamInfo:
+    id: str
+    name: str = ''
+    clue_index: int = 0
+    finished: bool = False
+    members: set[int] = field(default_factory=set)
+
+
+def _id(value) -> str | None:
+    """ObjectId приходит строкой, а в populate-полях — документом с _id."""
+    if isinstance(value, dict):
+        value = value.get('_id')
+    return str(value) if value else None
+
+
+def display_name(player: Player) -> str:
+    return player.first_name or player.username or '???'
+
+
+class PlayerIndex:
+    """telegram_id → Player и team_id → TeamInfo, обновляются по событиям бэкенда.
+
+    Рядом — рейтинг активных участников (RankIndex), он меняется вместе с players.
+    """
+
+    def __init__(self):
+        self.players: dict[int, Player] = {}
+        self.ranking = RankIndex()
+        self.teams: dict[str, TeamInfo] = {}
+        self.quest_title: str | None = None
+        self.clues_total = 0
+        self.connected = False
+        self.loaded = False
+
+    @property
+    def ready(self) -> bool:
+        return self.connected and self.loaded
+
+    def get(self, telegram_id: int) -> Player | None:
+        return self.players.get(telegram_id) if self.ready else None
+
+    def team(self, team_id: str | None) -> TeamInfo | None:
+        return self.teams.get(team_id) if team_id else None
+
+    def load(self, snapshot: dict):
+        self.players.clear()
+        self.ranking.clear()
+        self.teams.clear()
+        for t in snapshot.get('teams') or ():
+            self._team(t)
+        for u in snapshot.get('users') or ():
+            self._user(u)
+        quest = snapshot.get('quest') or {}
+        self.quest_title = quest.get('title')
+        self.clues_total = quest.get('clues_total', 0)
+        self.loaded = True
+
+    # ---- применение событий ----
+
+    def _put(self, player: Player):
+        self.players[player.telegram_id] = player
+        if player.is_active:
+            self.ranking.set(player.telegram_id, player.lives, player.level)
+        else:
+            self.ranking.discard(player.telegram_id)
+
+    def _drop(self, telegram_id: int):
+        self.players.pop(telegram_id, None)
+        self.ranking.discard(telegram_id)
+
+    def _team(self, doc: dict) -> TeamInfo | None:
+        team_id = _id(doc.get('_id') or doc.get('id'))
+        if team_id is None:
+            return None
+        team = self.teams.get(team_id)
+        if team is None:
+            team = self.teams[team_id] = TeamInfo(team_id)
+        team.name = doc.get('name', team.name)
+        if 'current_clue_index' in doc and doc['current_clue_index'] != team.clue_index:
+            team.clue_index = doc['current_clue_index']
+            team.finished = False
+        # В снимке — флаг finished, в событиях команды — дата finished_at
+        if 'finished' in doc:
+            team.finished = bool(doc['finished'])
+        elif 'finished_at' in doc:
+            team.finished = doc['finished_at'] is not None
+        return team
+
+    def _move(self, telegram_id: int, team_id: str | None):
+        player = self.players.get(telegram_id)
+        if player is not None and player.team_id != team_id:
+            # Ответы кэшируются по команде участника — она сменилась
+            answer_matcher.invalidate_user(telegram_id)
+        old = self.team(player.team_id) if player else None
+        if old is not None:
+            old.members.discard(telegram_id)
+        new = self.team(team_id)
+        if new is not None:
+            new.members.add(telegram_id)
+
+    def _user(self, doc: dict):
+        telegram_id = doc.get('telegram_id')
+        if telegram_id is None:
+            return
+        telegram_id = int(telegram_id)
+        if isinstance(doc.get('team_id'), dict):
+            self._team(doc['team_id'])
+        player = self.players.get(telegram_id) or Player(telegram_id, _id(doc.get('_id') or doc.get('user_id')) or '')
+        changes = {}
+        for key in ('first_name', 'lives', 'level', 'is_active'):
+            if key in doc:
+                changes[key] = doc[key]
+        if 'telegram_username' in doc:
+            changes['username'] = doc['telegram_username']
+        if 'team_id' in doc:
+            team_id = _id(doc['team_id'])
+            self._move(telegram_id, team_id)
+            changes['team_id'] = team_id
+        self._put(replace(player, **changes))
+
+    def _team_members(self, doc: dict):
+        team = self._team(doc)
+        if team is None or 'members' not in doc:
+            return
+        members = {int(m['telegram_id']) for m in doc['members'] if isinstance(m, dict) and 'telegram_id' in m}
+        for telegram_id in team.members - members:
+            player = self.players.get(telegram_id)
+            if player is not None and player.team_id == team.id:
+                self._put(replace(player, team_id=None))
+        team.members.clear()
+        for m in doc['members']:
+            if isinstance(m, dict) and 'telegram_id' in m:
+                self._user({**m, 'team_id': team.id})
+
+    def apply(self, event: str, payload: dict):
+        if event in ('new_user', 'user_updated', 'location_update'):
+            self._user(payload)
+        elif event == 'new_message':
+            self._user(payload.get('user') or {})
+        elif event == 'user_deleted':
+            user_id = _id(payload.get('_id'))
+            for telegram_id, player in list(self.players.items()):
+                if player.user_id == user_id:
+                    self._move(telegram_id, None)
+                    self._drop(telegram_id)
+        elif event in ('team_created', 'team_updated'):
+            self._team_members(payload)
+        elif event == 'teams_shuffled':
+            for player in list(self.players.values()):
+                self.players[player.telegram_id] = replace(player, team_id=None)
+            for team in self.teams.values():
+                team.members.clear()
+            for doc in payload:
+                self._team_members(doc)
+        elif event == 'team_deleted':
+            team = self.teams.pop(_id(payload.get('id')), None)
+            for telegram_id in team.members if team else ():
+                self._put(replace(self.players[telegram_id], team_id=None))
+        elif event in ('clue_sent', 'clue_approved'):
+            # clue_sent — организатор (пере)запустил квест команды с первой станции
+            team = self._team({
+                '_id': payload.get('team_id'), 'current_clue_index': payload.get('clue_index'), 'finished': False,
+            })
+            # Станция сменилась — кэш ответов команды больше не годится
+            answer_matcher.invalidate_team(team.id if team else None)
+        elif event == 'team_finished':
+            team = self._team({'_id': payload.get('team_id')})
+            if team is not None:
+                team.finished = True
+                answer_matcher.invalidate_team(team.id)
+
+
+# События Socket.IO бэкенда, которые меняют индекс
+EVENTS = (
+    'new_user', 'user_updated', 'user_deleted', 'location_update', 'new_message',
+    'team_created', 'team_updated', 'teams_shuffled', 'team_deleted',
+    'clue_sent', 'clue_approved', 'team_finished',
+)
+
+
+class BackendEvents:
+    """Подписка на Socket.IO бэкенда: снимок при каждом подключении, дальше — события."""
+
+    def __init__(self, index: PlayerIndex, url: str = API_URL, resync: float = BACKEND_EVENTS_RESYNC):
+        self.index = index
+        self.url = url
+        self.resync = resync
+        self._sio = None
+        self._task: asyncio.Task | None = None
+
+    async def _load_snapshot(self):
+        result = await get_client().get('snapshot')
+        if result.get('error'):
+            logger.warning("Снимок участников не загружен: %s", result['error'])
+            self.index.loaded = False
+            return
+        self.index.load(result)
+        logger.info("Read model: участников %d, команд %d", len(self.index.players), len(self.index.teams))
+
+    def _handler(self, event: str):
+        async def handle(payload):
+            EVENTS_TOTAL.inc(event=event)
+            try:
+                self.index.apply(event, payload)
+            except Exception:
+                logger.exception("Не удалось применить событие %s", event)
+        return handle
+
+    async def start(self):
+        if not BACKEND_EVENTS_ENABLED:
+            return
+        try:
+            import socketio
+        except ImportError:
+            logger.warning("python-socketio не установлен — бот работает без read model")
+            return
+
+        sio = self._sio = socketio.AsyncClient(reconnection=True, logger=False)
+
+        @sio.event
+        async def connect():
+            self.index.connected = True
+            # Смены станций снова приходят событиями — снимкам ответов можно верить дольше
+            answer_matcher.set_live(True)
+            # Пока были отключены, события могли пропасть — перечитываем снимок
+            await self._load_snapshot()
+
+        @sio.event
+        async def disconnect(*args):
+            self.index.connected = False
+            answer_matcher.set_live(False)
+
+        for event in EVENTS:
+            sio.on(event, self._handler(event))
+
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        # Первое подключение повторяем сами, дальше переподключается клиент
+        delay = 1.0
+        while not self._sio.connected:
+            try:
+                await self._sio.connect(self.url, transports=['websocket'])
+            except Exception as e:
+                logger.warning("Socket.IO бэкенда недоступен: %s, повтор через %.0f с", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        # Страховка от событий, которых бэкенд не рассылает (например, смена квеста)
+        while self.resync > 0:
+            await asyncio.sleep(self.resync)
+            if self.index.connected:
+                await self._load_snapshot()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._sio is not None:
+            await self._sio.disconnect()
+            self._sio = None
+        self.index.connected = False
+        answer_matcher.set_live(False)
+
+
+EVENTS_TOTAL = counter('bot_backend_events_total', 'События Socket.IO бэкенда', ('event',))
+
+players = PlayerIndex()
+backend_events = BackendEvents(players)
+
+gauge('bot_read_model_players', 'Участники в read model', function=lambda: len(players.players))
+gauge('bot_read_model_ready', 'Read model подключена к событиям бэкенда', function=lambda: int(players.ready))
@@ -0,0 +1,158 @@
+"""Рейтинг участников: декартово дерево (treap) с размерами поддеревьев.
+
+Ключ — (-lives, -level, telegram_id), то есть порядок таблицы лидеров бэкенда
+(sort({lives: -1, level: -1})) с детерминированным разрешением ничьих. Размер
+поддерева в каждом узле даёт место участника и k-го участника за O(log n),
+а изменение жизней или уровня — это удаление и вставка, тоже O(log n).
+"""
+import random
+from typing import Iterator
+
+RankKey = tuple[int, int, int]
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'left', 'right', 'size')
+
+    def __init__(self, key: RankKey):
+        self.key = key
+        self.priority = random.random()
+        self.left: _Node | None = None
+        self.right: _Node | None = None
+        self.size = 1
+
+
+def _size(node: _Node | None) -> int:
+    return node.size if node is not None else 0
+
+
+def _update(node: _Node) -> _Node:
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node: _Node | None, key: RankKey) -> tuple[_Node | None, _Node | None]:
+    """Разрезать на ключи < key и >= key."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        return _update(node), right
+    left, right = _split(node.left, key)
+    node.left = right
+    return left, _update(node)
+
+
+def _merge(left: _Node | None, right: _Node | None) -> _Node | None:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def rank_key(telegram_id: int, lives: int, level: int) -> RankKey:
+    return -lives, -level, telegram_id
+
+
+class RankIndex:
+    """Место участника, топ и соседи по рейтингу за O(log n)."""
+
+    def __init__(self):
+        self._root: _Node | None = None
+        # telegram_id -> текущий ключ в дереве
+        self._keys: dict[int, RankKey] = {}
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def __contains__(self, telegram_id: int) -> bool:
+        return telegram_id in self._keys
+
+    def clear(self):
+        self._root = None
+        self._keys.clear()
+
+    def set(self, telegram_id: int, lives: int, level: int):
+        key = rank_key(telegram_id, lives, level)
+        old = self._keys.get(telegram_id)
+        if old == key:
+            return
+        if old is not None:
+            self._remove(old)
+        self._keys[telegram_id] = key
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def discard(self, telegram_id: int):
+        key = self._keys.pop(telegram_id, None)
+        if key is not None:
+            self._remove(key)
+
+    def _remove(self, key: RankKey):
+        left, rest = _split(self._root, key)
+        # В rest ключ key — минимальный; отрезаем ровно его
+        _, right = _split(rest, (key[0], key[1], key[2] + 1))
+        self._root = _merge(left, right)
+
+    def rank(self, telegram_id: int) -> int | None:
+        """Место участника, начиная с 0, или None, если его нет в рейтинге."""
+        key = self._keys.get(telegram_id)
+        if key is None:
+            return None
+        node, position = self._root, 0
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif key > node.key:
+                position += _size(node.left) + 1
+                node = node.right
+            else:
+                return position + _size(node.left)
+        return None
+
+    def select(self, position: int) -> RankKey | None:
+        """Ключ участника на месте position (с 0)."""
+        node = self._root
+        while node is not None:
+            left = _size(node.left)
+            if position < left:
+                node = node.left
+            elif position > left:
+                position -= left + 1
+                node = node.right
+            else:
+                return node.key
+        return None
+
+    def range(self, start: int, stop: int) -> Iterator[tuple[int, int]]:
+        """(место, telegram_id) для мест [start, stop) — O(log n + k)."""
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        if start >= stop:
+            return
+        # Обход по порядку с пропуском поддеревьев левее start
+        stack: list[_Node] = []
+        node, skipped = self._root, 0
+        while node is not None:
+            left = _size(node.left)
+            if skipped + left < start:
+                skipped += left + 1
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+        position = start
+        while stack and position < stop:
+            node = stack.pop()
+            yield position, node.key[2]
+            position += 1
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
@@ -0,0 +1,54 @@
+import re
+
+from config import SONG_SEARCH_CACHE_SIZE, SONG_SEARCH_CACHE_TTL, SONG_SEARCH_LIMIT
+from services.api import api_post
+from services.cache import TTLCache
+from services.metrics import counter
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+# Не найденное тоже запоминаем, но ненадолго: участник может опечататься и сразу исправиться
+NOT_FOUND_TTL = 300
+
+search_cache = TTLCache(maxsize=SONG_SEARCH_CACHE_SIZE)
+
+counter(
+    'bot_song_search_cache_lookups_total', 'Обращения к кэшу поиска песен', ('result',),
+    function=lambda: {'hit': search_cache.hits, 'miss': search_cache.misses},
+)
+
+
+def normalize_query(query: str) -> str:
+    """Ключ кэша: регистр, ё/е, тире, знаки препинания и лишние пробелы не важны."""
+    query = query.casefold().replace('ё', 'е')
+    return ' '.join(_NON_WORD.sub(' ', query).split())
+
+
+async def search_tracks(query: str) -> dict:
+    """Найти песню через бэкенд: {'tracks': [...]} или {'error': ...}.
+
+    Одинаковые запросы разных участников (с точностью до normalize_query) обслуживаются
+    из общего кэша, а одновременные — одним запросом к бэкенду.
+    """
+    key = normalize_query(query)
+    if not key:
+        return {'error': 'not_found'}
+
+    async def load() -> dict:
+        result = await api_post('song/search', {'query': query, 'limit': SONG_SEARCH_LIMIT})
+        if result.get('error'):
+            return result
+        tracks = result.get('tracks') or ([result['track']] if result.get('track') else [])
+        if not tracks:
+            return {'error': 'not_found'}
+        return {'tracks': tracks}
+
+    result = await search_cache.get_or_load(
+        key,
+        SONG_SEARCH_CACHE_TTL,
+        load,
+        cacheable=lambda r: 'tracks' in r,
+    )
+    if result.get('error') == 'not_found' and search_cache.get(key) is None:
+        search_cache.set(key, result, NOT_FOUND_TTL)
+    return result
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_DB_PATH, FSM_FLUSH_INTERVAL, FSM_STATE_TTL
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+@dataclass
+class _Record:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    touched_at: float = field(default_factory=time.time)
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+def _key(key: StorageKey) -> str:
+    return ':'.join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id,
+        key.business_connection_id, key.destiny,
+    ))
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite: переживает перезапуск бота.
+
+    Чтения обслуживаются из памяти, изменения копятся и пишутся на диск одной
+    транзакцией раз в flush_interval секунд. Пустые состояния удаляются из базы,
+    а записи, которые не трогали дольше state_ttl секунд, вычищаются.
+    """
+
+    def __init__(
+        self,
+        path: str = FSM_DB_PATH,
+        flush_interval: float = FSM_FLUSH_INTERVAL,
+        state_ttl: float = FSM_STATE_TTL,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self._cache: dict[str, _Record] = {}
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task | None = None
+        # sqlite3 не любит работу из разных потоков — все запросы через один поток
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fsm-sqlite')
+        self._db: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(_SCHEMA)
+            self._db.commit()
+        return self._db
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # ---- Синхронная часть (выполняется в потоке sqlite) ----
+
+    def _load_sync(self, key: str) -> _Record | None:
+        row = self._connect().execute(
+            'SELECT state, data, updated_at FROM fsm WHERE key = ?', (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        state, data, updated_at = row
+        if time.time() - updated_at > self.state_ttl:
+            return None
+        return _Record(state=state, data=json.loads(data), touched_at=updated_at)
+
+    def _write_sync(self, upserts: list[tuple], deletes: list[tuple]):
+        db = self._connect()
+        with db:
+            if upserts:
+                db.executemany(
+                    'INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET state = excluded.state, '
+                    'data = excluded.data, updated_at = excluded.updated_at',
+                    upserts,
+                )
+            if deletes:
+                db.executemany('DELETE FROM fsm WHERE key = ?', deletes)
+
+    def _purge_sync(self, older_than: float) -> int:
+        db = self._connect()
+        with db:
+            return db.execute('DELETE FROM fsm WHERE updated_at < ?', (older_than,)).rowcount
+
+    # ---- Асинхронная часть ----
+
+    async def _record(self, key: StorageKey) -> _Record:
+        skey = _key(key)
+        record = self._cache.get(skey)
+        if record is None:
+            record = await self._run(self._load_sync, skey)
+            # Пока грузили, запись могли создать конкурентно
+            record = self._cache.setdefault(skey, record or _Record())
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record):
+        record.touched_at = time.time()
+        self._dirty.add(_key(key))
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        record = await self._record(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def flush(self):
+        """Записать накопленные изменения на диск."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        upserts, deletes = [], []
+        for skey in dirty:
+            record = self._cache.get(skey)
+            if record is None or record.empty:
+                deletes.append((skey,))
+                self._cache.pop(skey, None)
+            else:
+                data = json.dumps(record.data, ensure_ascii=False, separators=(',', ':'))
+                upserts.append((skey, record.state, data, record.touched_at))
+        try:
+            await self._run(self._write_sync, upserts, deletes)
+        except Exception:
+            # Не теряем изменения — попробуем в следующий раз
+            self._dirty |= dirty
+            raise
+
+    async def purge(self):
+        """Выкинуть из памяти и базы состояния, которые давно не трогали."""
+        now = time.time()
+        older_than = now - self.state_ttl
+        for skey, record in list(self._cache.items()):
+            if skey in self._dirty:
+                continue
+            # Пустые записи — это просто кэш промахов, держим их недолго
+            if record.touched_at < older_than or (record.empty and record.touched_at < now - 600):
+                del self._cache[skey]
+        removed = await self._run(self._purge_sync, older_than)
+        if removed:
+            logger.info("FSM: удалено %d устаревших состояний", removed)
+
+    async def _writer(self):
+        last_purge = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_purge > min(self.state_ttl, 600):
+                    last_purge = time.monotonic()
+                    await self.purge()
+            except Exception:
+                logger.exception("FSM: ошибка записи состояний")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=True)
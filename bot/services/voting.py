@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from config import OUTBOX_RETRY_INTERVAL, VOTING_PAGE_SIZE, VOTE_BATCH_WINDOW, VOTE_BATCH_SIZE
+from services.api import BACKEND_UNAVAILABLE, api_get, api_post, invalidate
+from services.metrics import counter
+from services.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Candidate:
+    id: str
+    name: str
+    telegram_id: int | None
+    search_key: str
+
+
+@dataclass(frozen=True)
+class CandidatePage:
+    items: list[Candidate]
+    page: int
+    pages: int
+    total: int
+
+
+def _display_name(c: dict) -> str:
+    return c.get('first_name') or c.get('telegram_username') or str(c.get('telegram_id', '?'))
+
+
+# voting_id -> (сырой список из кэша api_get, подготовленные кандидаты)
+_prepared: dict[str, tuple[list, list[Candidate]]] = {}
+
+
+async def get_candidates(voting_id: str) -> list[Candidate] | None:
+    """Кандидаты голосования — один список на всех голосующих, None при ошибке бэкенда.
+
+    Список берётся из общего кэша api_get (ключ включает voting_id) и подготавливается
+    один раз на каждую его версию, а не копируется в FSM каждого участника.
+    """
+    raw = await api_get('voting/candidates', {'voting_id': voting_id})
+    if not isinstance(raw, list):
+        return None
+
+    prepared = _prepared.get(voting_id)
+    if prepared is not None and prepared[0] is raw:
+        return prepared[1]
+
+    candidates = [
+        Candidate(
+            id=str(c['_id']),
+            name=_display_name(c),
+            telegram_id=c.get('telegram_id'),
+            search_key=_display_name(c).casefold(),
+        )
+        for c in raw
+    ]
+    # Прошлые голосования больше не нужны
+    _prepared.clear()
+    _prepared[voting_id] = (raw, candidates)
+    return candidates
+
+
+def paginate(
+    candidates: list[Candidate],
+    page: int,
+    exclude_telegram_id: int | None = None,
+    query: str = '',
+    page_size: int = VOTING_PAGE_SIZE,
+) -> CandidatePage:
+    """Страница кандидатов без самого голосующего, с необязательным поиском по имени."""
+    query = query.casefold().strip()
+    matching = [
+        c for c in candidates
+        if c.telegram_id != exclude_telegram_id and (not query or query in c.search_key)
+    ]
+    pages = max(1, -(-len(matching) // page_size))
+    page = min(max(page, 0), pages - 1)
+    start = page * page_size
+    return CandidatePage(matching[start:start + page_size], page, pages, len(matching))
+
+
+class VoteBatcher:
+    """Принимает голоса без похода на бэкенд и отправляет их пачками через /voting/votes.
+
+    Кто уже голосовал в активном голосовании, бот помнит сам (при первом обращении
+    к голосованию список загружается с бэкенда), поэтому повторный голос отсекается
+    сразу, а нажатие кнопки подтверждается мгновенно.
+    """
+
+    def __init__(
+        self,
+        window: float = VOTE_BATCH_WINDOW,
+        batch_size: int = VOTE_BATCH_SIZE,
+        retry_interval: float = OUTBOX_RETRY_INTERVAL,
+    ):
+        self.window = window
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self._voting_id: str | None = None
+        # category -> telegram_id, уже проголосовавшие в текущем голосовании
+        self._voted: dict[str, set[int]] = {'best': set(), 'worst': set()}
+        self._loading: asyncio.Task | None = None
+        self._loaded = False
+        self._queue: list[dict] = []
+        self._flush_task: asyncio.Task | None = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def _load(self, voting_id: str):
+        result = await api_get('voting/voters')
+        if result.get('error') or result.get('voting_id') != voting_id:
+            return
+        for category in self._voted:
+            self._voted[category].update(result.get(category) or ())
+        self._loaded = True
+
+    async def prepare(self, voting_id: str):
+        """Загрузить, кто уже голосовал (один раз на голосование, одновременные вызовы ждут одну загрузку)."""
+        if voting_id != self._voting_id:
+            self._voting_id = voting_id
+            self._voted = {category: set() for category in self._voted}
+            self._loaded = False
+            self._loading = None
+        if self._loaded:
+            return
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.create_task(self._load(voting_id))
+        try:
+            await asyncio.shield(self._loading)
+        except Exception as e:
+            logger.warning("Не удалось загрузить список проголосовавших: %s", e)
+
+    def has_voted(self, voting_id: str, telegram_id: int, category: str) -> bool:
+        return voting_id == self._voting_id and telegram_id in self._voted[category]
+
+    def submit(self, voting_id: str, telegram_id: int, candidate_id: str, category: str) -> bool:
+        """Поставить голос в очередь; False — участник уже голосовал в этой категории."""
+        if voting_id != self._voting_id:
+            # prepare() не вызывали — проверку дублей оставляем бэкенду
+            self._voting_id = voting_id
+            self._voted = {c: set() for c in self._voted}
+            self._loaded = False
+        if telegram_id in self._voted[category]:
+            return False
+        self._voted[category].add(telegram_id)
+        self._queue.append({'telegram_id': telegram_id, 'candidate_id': candidate_id, 'category': category})
+        VOTES.inc(result='queued')
+        if len(self._queue) >= self.batch_size:
+            self._schedule(0)
+        else:
+            self._schedule(self.window)
+        return True
+
+    def _schedule(self, delay: float):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        # Отправка уже началась — голоса, пришедшие за это время, и повтор планируются заново
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Отправить накопленное; голоса, которые некуда деть, ждут следующей попытки в памяти."""
+        pending, self._queue = self._queue, []
+        retry = []
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                retry.extend(await self._send(batch))
+            except Exception:
+                logger.exception("Ошибка при отправке %d голосов", len(batch))
+                retry.extend(batch)
+        if retry:
+            # Голоса уже подтверждены участникам — не теряем их, а пробуем снова позже
+            self._queue = retry + self._queue
+            self._schedule(self.retry_interval)
+
+    async def _send(self, batch: list[dict]) -> list[dict]:
+        """Отправить пачку; вернуть голоса, которые не удалось ни отправить, ни отложить."""
+        result = await api_post('voting/votes', {'votes': batch})
+        if result.get('error') == BACKEND_UNAVAILABLE:
+            # Голоса уже подтверждены участникам — пусть переживут простой в outbox
+            retry = [vote for vote in batch if not await outbox.put('voting/vote', vote)]
+            VOTES.inc(len(batch) - len(retry), result='outbox')
+            return retry
+        if result.get('error'):
+            logger.warning("Бэкенд отклонил пачку из %d голосов: %s", len(batch), result['error'])
+            for vote in batch:
+                self._voted[vote['category']].discard(vote['telegram_id'])
+            VOTES.inc(len(batch), result='rejected')
+            return []
+
+        for item in result.get('results', []):
+            if item.get('ok'):
+                VOTES.inc(result='accepted')
+                invalidate('profile', item['telegram_id'])
+            elif item.get('error') == 'already_voted':
+                VOTES.inc(result='duplicate')
+            else:
+                # Голос не принят — даём участнику проголосовать ещё раз
+                logger.warning("Голос %s отклонён: %s", item, item.get('error'))
+                self._voted.get(item.get('category'), set()).discard(item.get('telegram_id'))
+                VOTES.inc(result='rejected')
+        return []
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        if self._flush_task is not None:
+            # flush() оставил голоса на повтор, а ждать уже некогда
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._queue:
+            logger.error("При остановке не отправлено %d голосов: бэкенд и outbox недоступны", len(self._queue))
+            VOTES.inc(len(self._queue), result='lost')
+            self._queue = []
+
+
+VOTES = counter('bot_votes_total', 'Голоса, принятые ботом, по итогу отправки', ('result',))
+
+vote_batcher = VoteBatcher()
@@ -0,0 +1,275 @@
+"""Многопроцессный режим: супервизор принимает апдейты и раздаёт их воркерам.
+
+Апдейт попадает в воркер по from_user.id, поэтому все апдейты одного участника
+обрабатываются одним процессом и по порядку — FSM-сценарии не ломаются,
+а разные участники обрабатываются на разных ядрах.
+"""
+import asyncio
+import hmac
+import logging
+import multiprocessing
+import secrets
+import signal
+import time
+
+from aiohttp import web
+from aiogram.exceptions import TelegramConflictError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from config import (
+    BOT_MODE,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBAPP_HOST,
+    WEBAPP_PORT,
+    BACKLOG_POLICY,
+)
+from services.backlog import take_backlog
+
+logger = logging.getLogger(__name__)
+
+POLLING_TIMEOUT = 30
+# Как часто супервизор проверяет, живы ли воркеры, и сколько перезапусков одного
+# воркера за RESTART_WINDOW секунд терпит, прежде чем остановиться сам
+WORKER_CHECK_INTERVAL = 1.0
+MAX_RESTARTS = 5
+RESTART_WINDOW = 60.0
+
+
+def update_user_id(update: dict) -> int:
+    """telegram_id автора апдейта (0, если его нет)."""
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if user and 'id' in user:
+            return user['id']
+        chat = event.get('chat')
+        if chat and 'id' in chat:
+            return chat['id']
+    return 0
+
+
+def shard_of(update: dict, workers: int) -> int:
+    return update_user_id(update) % workers
+
+
+# ---- Воркер ----
+
+def _worker_entry(index: int, queue: multiprocessing.Queue):
+    # Ctrl+C получает вся группа процессов — останавливает воркеры только супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(index, queue))
+
+
+async def _worker(index: int, queue: multiprocessing.Queue):
+    from main import create_bot, create_dispatcher, create_storage, start_services, stop_services
+
+    bot = create_bot()
+    dp = create_dispatcher(storage=create_storage(worker=index))
+    backend = await start_services(worker=index)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    loop = asyncio.get_running_loop()
+    tasks: set[asyncio.Task] = set()
+
+    async def process(update: dict):
+        # Порядок апдейтов участника соблюдает ConcurrencyLimitMiddleware диспетчера
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception("Воркер %d: ошибка обработки апдейта %s", index, update.get('update_id'))
+
+    logger.info("🤖 Воркер %d запущен", index)
+    try:
+        while True:
+            update = await loop.run_in_executor(None, queue.get)
+            if update is None:
+                break
+            task = asyncio.create_task(process(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await stop_services(backend)
+        await bot.session.close()
+        logger.info("Воркер %d остановлен", index)
+
+
+# ---- Супервизор ----
+
+class WorkerCrashLoop(RuntimeError):
+    """Воркер падает снова и снова — пусть перезапуском займётся оркестратор."""
+
+
+class Supervisor:
+    def __init__(self, workers: int):
+        self._ctx = multiprocessing.get_context('spawn')
+        self.queues = [self._ctx.Queue() for _ in range(workers)]
+        self.processes = [self._spawn(i) for i in range(workers)]
+        # Время перезапусков каждого воркера — для обнаружения цикла падений
+        self._restarts: list[list[float]] = [[] for _ in range(workers)]
+
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        return self._ctx.Process(
+            target=_worker_entry, args=(index, self.queues[index]), name=f'bot-worker-{index}', daemon=False,
+        )
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def check_workers(self):
+        """Перезапустить упавшие воркеры; WorkerCrashLoop — если воркер падает слишком часто."""
+        now = time.monotonic()
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            restarts = self._restarts[index] = [t for t in self._restarts[index] if now - t < RESTART_WINDOW]
+            if len(restarts) >= MAX_RESTARTS:
+                raise WorkerCrashLoop(
+                    f"воркер {index} упал {len(restarts) + 1} раз за {RESTART_WINDOW:.0f} с (код {process.exitcode})"
+                )
+            logger.error("Воркер %d завершился (код %s), перезапускаю", index, process.exitcode)
+            restarts.append(now)
+            # Очередь упавшего процесса могла остаться с захваченной блокировкой — берём новую;
+            # апдейты, которые в ней ждали, уже никто бы не обработал
+            self.queues[index] = self._ctx.Queue()
+            self.processes[index] = self._spawn(index)
+            self.processes[index].start()
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            self.check_workers()
+
+    def route(self, update: dict):
+        self.queues[shard_of(update, len(self.queues))].put(update)
+
+    async def stop(self):
+        for queue in self.queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join)
+
+
+async def _poll(bot, supervisor: Supervisor, allowed_updates: list):
+    await bot.delete_webhook()
+    # Накопившийся хвост — без устаревших геопозиций и повторных нажатий
+    for update in await take_backlog(bot, allowed_updates):
+        supervisor.route(update.model_dump(mode='json', exclude_none=True))
+
+    offset = None
+    backoff = 1.0
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=POLLING_TIMEOUT,
+                allowed_updates=allowed_updates,
+                request_timeout=POLLING_TIMEOUT + 10,
+            )
+        except TelegramRetryAfter as e:
+            logger.warning("getUpdates: Telegram просит подождать %d с", e.retry_after)
+            await asyncio.sleep(e.retry_after)
+            continue
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning("getUpdates: %s, повтор через %.0f с", e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            continue
+        except TelegramConflictError as e:
+            # Апдейты забирает другой экземпляр бота — ждём, пока он остановится
+            logger.error("getUpdates: %s, повтор через %.0f с", e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            continue
+        except Exception:
+            # Без цикла опроса супервизор перестаёт получать апдейты — не выходим из него
+            logger.exception("getUpdates: непредвиденная ошибка, повтор через %.0f с", backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+            continue
+        backoff = 1.0
+        for update in updates:
+            offset = update.update_id + 1
+            supervisor.route(update.model_dump(mode='json', exclude_none=True))
+
+
+async def _serve_webhook(bot, supervisor: Supervisor, allowed_updates: list) -> web.AppRunner | None:
+    if not WEBHOOK_BASE_URL:
+        logger.error("WEBHOOK_BASE_URL не задан! Укажи публичный адрес бота в .env файле.")
+        return None
+
+    secret = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+        if not hmac.compare_digest(token, secret):
+            return web.Response(status=401)
+        supervisor.route(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_PATH, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+
+    await bot.set_webhook(
+        url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=secret,
+        allowed_updates=allowed_updates,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        drop_pending_updates=BACKLOG_POLICY == 'skip',
+    )
+    return runner
+
+
+async def run_supervisor(workers: int):
+    from main import ALLOWED_UPDATES, create_bot
+
+    supervisor = Supervisor(workers)
+    supervisor.start()
+
+    bot = create_bot()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = None
+    poller = None
+    watchdog = None
+    try:
+        if BOT_MODE == 'webhook':
+            runner = await _serve_webhook(bot, supervisor, ALLOWED_UPDATES)
+            if runner is None:
+                return
+            logger.info(f"🤖 Бот запущен (webhook mode, воркеров: {workers})")
+        else:
+            poller = asyncio.create_task(_poll(bot, supervisor, ALLOWED_UPDATES))
+            logger.info(f"🤖 Бот запущен (polling mode, воркеров: {workers})")
+
+        # Без живого воркера его доля участников осталась бы без ответов, а очередь росла бы
+        watchdog = asyncio.create_task(supervisor.watch())
+        waiter = asyncio.create_task(stop.wait())
+        watched = {waiter, watchdog} | ({poller} if poller else set())
+        await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        for task in (watchdog, poller):
+            if task is not None and task.done():
+                task.result()
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+        if poller is not None:
+            poller.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        await supervisor.stop()
+        await bot.session.close()